@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+from facts_cache import get_hostname
+from utils import iter_concurrently
+from resilience import guarded_poll
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../reports')
+
+
+def select_hosts(hosts, locations=None, device_types=None, vendors=None):
+    """Hosts matching every given inventory filter; a filter left empty matches everything."""
+    def wanted(value, allowed):
+        return not allowed or str(value).lower() in {a.lower() for a in allowed}
+    return [host for host in hosts
+            if wanted(host.get('location'), locations) and wanted(host.get('device_type'), device_types)
+            and wanted(host.get('vendor'), vendors)]
+
+
+def _reply_text(reply):
+    """Printable text of a CLI or RPC reply, whether text, XML element or JSON dict."""
+    if isinstance(reply, (dict, list)):
+        return json.dumps(reply, indent=2, sort_keys=True)
+    if isinstance(reply, bool) or reply is None:
+        return str(reply)
+    if isinstance(reply, str):
+        return reply
+    if len(reply) == 0:
+        return (reply.text or '').strip()  # <output> wrapper of a text CLI reply
+    from lxml import etree
+    return etree.tostring(reply, encoding='unicode', pretty_print=True).strip()
+
+
+def run_on_device(dev, command=None, rpc=None, rpc_args=None, output_format='text'):
+    """Run one CLI command or RPC on a connected device, always fresh, and return its output text."""
+    if command:
+        return _reply_text(dev.rpc.cli(command, format=output_format))
+    options = ({'format': output_format},) if output_format != 'xml' else ()
+    return _reply_text(getattr(dev.rpc, rpc.replace('-', '_'))(*options, **(rpc_args or {})))
+
+
+def output_key(text):
+    """Grouping key: outputs that differ only in trailing whitespace or blank lines are the same."""
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()[:12]
+
+
+def run_adhoc(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts,
+              command=None, rpc=None, rpc_args=None, output_format='text', group=False, max_workers=64):
+    """Run a command across devices concurrently, streaming each result to the terminal and a JSONL file.
+
+    With group set, each distinct output is printed once, the first time it arrives; later devices with
+    the same output print one line, and a summary lists the devices behind every distinct output.
+
+    Returns:
+        str: Path of the reports/adhoc_<timestamp>.jsonl file.
+    """
+    if not command and not rpc:
+        print("Nothing to run: give a CLI command or an RPC name.")
+        return None
+    connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
+    if not connections:
+        print("No devices connected for the ad-hoc command.")
+        return None
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    output_file = os.path.join(REPORT_DIR, f"adhoc_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+    what = command or rpc
+    groups = {}  # output key -> {'number', 'output', 'hosts'}
+    failed = []
+    started = time.monotonic()
+
+    def run(dev):
+        began = time.monotonic()
+        output = run_on_device(dev, command, rpc, rpc_args, output_format)
+        return output, round(time.monotonic() - began, 3)
+
+    print(f"\nRunning '{what}' on {len(connections)} devices")
+    try:
+        with open(output_file, 'w') as jsonl:
+            # Results are handled here, in arrival order, while other devices are still running
+            for dev, result, error in iter_concurrently(connections, lambda dev: guarded_poll(dev, run),
+                                                        max_workers=max_workers):
+                host_name = get_hostname(dev, host_lookup)
+                record = {'time': datetime.now().isoformat(timespec='seconds'), 'host_name': host_name,
+                          'host_ip': dev.hostname, 'command': what}
+                if error is not None:
+                    record.update(status='failed', error=str(error))
+                    failed.append(host_name)
+                    print(f"\n=== {host_name} ({dev.hostname}): FAILED - {error}")
+                else:
+                    output, duration = result
+                    record.update(status='ok', duration_s=duration, output=output)
+                    if group:
+                        key = output_key(output)
+                        entry = groups.get(key)
+                        if entry is None:
+                            entry = groups[key] = {'number': len(groups) + 1, 'output': output, 'hosts': []}
+                            print(f"\n=== {host_name} ({dev.hostname}) [output #{entry['number']}]\n{output}")
+                        else:
+                            print(f"=== {host_name} ({dev.hostname}): same as output #{entry['number']}")
+                        entry['hosts'].append(host_name)
+                        record['group'] = entry['number']
+                    else:
+                        print(f"\n=== {host_name} ({dev.hostname})\n{output}")
+                jsonl.write(json.dumps(record) + "\n")
+                jsonl.flush()
+    finally:
+        disconnect_from_hosts(connections)
+
+    if group and groups:
+        print(f"\n{len(groups)} distinct outputs:")
+        for entry in sorted(groups.values(), key=lambda e: -len(e['hosts'])):
+            print(f"  #{entry['number']}: {len(entry['hosts'])} devices - {', '.join(sorted(entry['hosts']))}")
+    if failed:
+        print(f"Failed on {len(failed)} devices: {', '.join(sorted(failed))}")
+    print(f"'{what}' answered by {len(connections) - len(failed)} of {len(connections)} devices in "
+          f"{time.monotonic() - started:.1f} s; results in {output_file}")
+    return output_file
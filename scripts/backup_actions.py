@@ -1,64 +1,95 @@
 import os
 from datetime import datetime
+from facts_cache import get_hostname
+from rpc_cache import cached_rpc
+from event_log import log_event
+from utils import run_concurrently
+
+def backup_config(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, transport='rpc',
+                  log=print):
+    """Backup device configurations to the backups folder.
+
+    transport='archive' copies the compressed committed config file instead of pulling text over NETCONF.
+    transport='stream' pulls the text but writes the raw reply payload straight to <host>_<date>.cfg.gz
+    through background writer threads, hashing it on the way; the reply is never parsed into a tree.
+    Progress messages go to log, print() by default.
+    """
+    if transport == 'archive':
+        from config_archive import backup_config_archives
+        return backup_config_archives(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts,
+                                      log=log)
 
-def backup_config(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts):
-    """Backup device configurations to the backups folder."""
     backup_dir = os.path.join(os.path.dirname(__file__), '../backups')
     os.makedirs(backup_dir, exist_ok=True)  # Create if it doesn’t exist
 
     connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
     if not connections:
-        print("No devices connected for backup.")
+        log("No devices connected for backup.")
         return
 
     date_str = datetime.now().strftime('%Y%m%d')
     host_lookup = {h['ip_address']: h['host_name'] for h in hosts}  # Map IP to host_name
-    for dev in connections:
-        try:
-            config = dev.rpc.get_config(options={'format': 'text'})
-            config_text = config.text
-            host_name = host_lookup.get(dev.hostname, dev.hostname)  # Fallback to IP if not found
-            filename = f"{host_name}_{date_str}.cfg"
-            filepath = os.path.join(backup_dir, filename)
-            with open(filepath, 'w') as f:
-                f.write(config_text)
-            print(f"Configuration backed up for {host_name} to {filepath}")
-        except Exception as error:
-            print(f"Failed to backup {dev.hostname}: {error}")
+    writer = None
+    if transport == 'stream':
+        from backup_stream import BackupWriter, stream_config
+        writer = BackupWriter()
+
+    def backup(dev):
+        if writer is not None:
+            host_name = get_hostname(dev, host_lookup)
+            filepath = os.path.join(backup_dir, f"{host_name}_{date_str}.cfg.gz")
+            return host_name, stream_config(dev, writer, filepath, 'text')
+        config = cached_rpc(dev, 'get_config', options={'format': 'text'})
+        config_text = config.text
+        host_name = get_hostname(dev, host_lookup)  # Fallback to cached device hostname
+        filename = f"{host_name}_{date_str}.cfg"
+        filepath = os.path.join(backup_dir, filename)
+        with open(filepath, 'w') as f:
+            f.write(config_text)
+        log_event('backup', device=dev.hostname, host_name=host_name, path=filepath, bytes=len(config_text))
+        return host_name, filepath
+
+    # Devices are backed up in parallel under the shared adaptive limiter
+    streamed = []
+    for dev, saved, error in run_concurrently(connections, backup):
+        if error is None and writer is not None:
+            streamed.append((dev, saved))  # Still being compressed and written in the background
+        elif error is None:
+            log(f"Configuration backed up for {saved[0]} to {saved[1]}")
+        else:
+            log_event('failure', device=dev.hostname, stage='backup', error=str(error))
+            log(f"Failed to backup {dev.hostname}: {error}")
 
     disconnect_from_hosts(connections)
+    if writer is not None:
+        writer.close()
+        for dev, (host_name, future) in streamed:
+            try:
+                saved = future.result()
+            except Exception as error:
+                log_event('failure', device=dev.hostname, stage='backup', error=str(error))
+                log(f"Failed to write backup of {dev.hostname}: {error}")
+                continue
+            log_event('backup', device=dev.hostname, host_name=host_name, path=saved['path'], bytes=saved['bytes'],
+                      compressed_bytes=saved['compressed_bytes'], sha256=saved['sha256'])
+            log(f"Configuration backed up for {host_name} to {saved['path']} (sha256 {saved['sha256'][:12]})")
 
-def capture_device_baseline(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts):
-    """Capture a device baseline similar to 'request support information'."""
-    backup_dir = os.path.join(os.path.dirname(__file__), '../backups')
-    os.makedirs(backup_dir, exist_ok=True)
+def capture_device_baseline(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts,
+                            executor=None, log=print):
+    """Capture a device baseline similar to 'request support information'.
+
+    An optional HybridExecutor parses replies and writes files in its process pool.
+    Progress messages go to log, print() by default.
+    """
+    from collection_engine import collect, write_results
 
     connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
     if not connections:
-        print("No devices connected for baseline capture.")
+        log("No devices connected for baseline capture.")
         return
 
-    date_str = datetime.now().strftime('%Y%m%d')
-    host_lookup = {h['ip_address']: h['host_name'] for h in hosts}  # Map IP to host_name
-    for dev in connections:
-        try:
-            baseline = ""
-            config = dev.rpc.get_config(options={'format': 'text'})
-            baseline += "=== Configuration ===\n" + config.text + "\n\n"
-            sys_info = dev.rpc.cli('show version', format='text')
-            baseline += "=== System Version ===\n" + sys_info.text + "\n\n"
-            intf_status = dev.rpc.cli('show interfaces terse', format='text')
-            baseline += "=== Interface Status ===\n" + intf_status.text + "\n\n"
-            route_info = dev.rpc.cli('show route summary', format='text')
-            baseline += "=== Routing Summary ===\n" + route_info.text + "\n"
-
-            host_name = host_lookup.get(dev.hostname, dev.hostname)  # Fallback to IP if not found
-            filename = f"{host_name}_{date_str}_baseline.txt"
-            filepath = os.path.join(backup_dir, filename)
-            with open(filepath, 'w') as f:
-                f.write(baseline)
-            print(f"Baseline captured for {host_name} to {filepath}")
-        except Exception as error:
-            print(f"Failed to capture baseline for {dev.hostname}: {error}")
+    # Commands come from the 'device_baseline' profile in data/collection_profiles.yml
+    results = collect(connections, hosts, ['device_baseline'], executor=executor, log=log)
+    write_results(results, 'device_baseline', executor=executor, log=log)
 
     disconnect_from_hosts(connections)
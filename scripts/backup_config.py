@@ -12,29 +12,34 @@ except ModuleNotFoundError as e:
     sys.exit(1)
 
 from utils import load_yaml
+from facts_cache import get_hostname
+from backup_stream import BackupWriter, stream_config
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 if SCRIPT_DIR not in sys.path:
     sys.path.insert(0, SCRIPT_DIR)
 
-def backup_device_config(dev, backup_dir, timestamp):
+def backup_device_config(dev, backup_dir, timestamp, writer):
+    """Back up the JSON and set forms of the configuration as <hostname>_<timestamp>.json.gz / .set.gz.
+
+    Each reply payload goes from the NETCONF session to the writer as it is, with no JSON objects or
+    lxml tree in between. The lock is only held while the replies are read; compression and disk
+    writes finish in the writer's background threads.
+
+    Returns:
+        list: Futures of the saved files (path, sha256, sizes); empty if the backup failed.
+    """
+    saved = []
     try:
-        hostname = dev.facts.get('hostname', dev._hostname if dev._hostname else 'unknown_host')
+        hostname = get_hostname(dev)
         print(f"Backing up configuration for {hostname} ({dev._hostname})")
         config = Config(dev)
         config.lock()
-        json_config = config.rpc.get_config(options={'format': 'json'})
-        json_filename = os.path.join(backup_dir, f"{hostname}_{timestamp}.json")
-        with open(json_filename, 'w') as json_file:
-            import json
-            json.dump(json_config, json_file, indent=4)
-        print(f"Saved JSON backup: {json_filename}")
-        set_config = config.rpc.get_config(options={'format': 'set'})
-        set_filename = os.path.join(backup_dir, f"{hostname}_{timestamp}.set")
-        with open(set_filename, 'w') as set_file:
-            set_file.write(set_config.text)
-        print(f"Saved set backup: {set_filename}")
+        for config_format in ('json', 'set'):
+            filename = os.path.join(backup_dir, f"{hostname}_{timestamp}.{config_format}.gz")
+            saved.append(stream_config(dev, writer, filename, config_format))
         config.unlock()
+        return saved
     except LockError as e:
         print(f"Failed to lock config for {dev._hostname}: {e}")
     except UnlockError as e:
@@ -46,6 +51,7 @@ def backup_device_config(dev, backup_dir, timestamp):
                 config.unlock()
         except Exception as unlock_error:
             print(f"Error unlocking config for {dev._hostname}: {unlock_error}")
+    return saved
 
 def main():
     yaml_file = os.path.join(SCRIPT_DIR, "../data/hosts_data.yml")
@@ -73,10 +79,19 @@ def main():
         print(f"Created backup directory: {backup_dir}")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    writer = BackupWriter()  # The next device is read while the previous one is still being written
+    pending = []
     for dev in connections:
-        backup_device_config(dev, backup_dir, timestamp)
+        pending.extend(backup_device_config(dev, backup_dir, timestamp, writer))
 
     disconnect_from_hosts(connections)
+    writer.close()
+    for future in pending:
+        try:
+            saved = future.result()
+            print(f"Saved backup: {saved['path']} ({saved['bytes']} bytes, sha256 {saved['sha256'][:12]})")
+        except Exception as e:
+            print(f"Failed to write backup: {e}")
     print("\nAll connections closed.")
 
 if __name__ == "__main__":
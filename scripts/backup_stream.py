@@ -0,0 +1,228 @@
+import os
+import gzip
+import queue
+import hashlib
+import threading
+from concurrent.futures import Future
+from xml.parsers import expat
+from utils import raw_rpc_xml
+
+FEED_CHUNK = 1024 * 1024   # Reply characters handed to the XML scanner at a time
+BATCH_BYTES = 256 * 1024   # Payload bytes collected before one hand-off to the writer
+MAX_PENDING = 64           # Batches queued per writer thread before device threads wait (bounds memory)
+
+# Element holding the configuration in a get-configuration reply, per format; JSON is the reply's own text
+PAYLOAD_TAGS = {'text': {'configuration-text'}, 'set': {'configuration-set'}, 'json': None}
+
+
+class BackupStream:
+    """One file being written by a BackupWriter; data is queued, never written by the caller."""
+
+    def __init__(self, writer, path):
+        self.path = path
+        self.result = Future()  # -> {'path', 'sha256', 'bytes', 'compressed_bytes'}
+        self._queue = writer._assign()
+        self._closed = False
+
+    def write(self, data):
+        self._queue.put((self, 'data', data))
+
+    def close(self):
+        """Finish the file; result resolves once it has been renamed into place."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put((self, 'close', None))
+        return self.result
+
+    def abort(self):
+        """Drop everything written so far; an existing file at path is left as it was."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put((self, 'abort', None))
+
+
+class BackupWriter:
+    """Background threads that gzip, hash and atomically store streamed backups.
+
+    Device threads only scan replies and queue payload bytes. Compression, hashing and disk writes
+    happen here, and zlib and hashlib release the GIL while they work. Each stream stays on one
+    thread, so its bytes are written in order. Streams are spread over the threads in turn.
+    Each file is written as <path>.part and renamed over path only once complete.
+    """
+
+    def __init__(self, threads=2, max_pending=MAX_PENDING, compresslevel=6):
+        self.compresslevel = compresslevel
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(threads)]
+        self._next = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, args=(q,), name='backup-writer', daemon=True)
+                         for q in self._queues]
+        for thread in self._threads:
+            thread.start()
+
+    def _assign(self):
+        with self._lock:
+            self._next = (self._next + 1) % len(self._queues)
+            return self._queues[self._next]
+
+    def open(self, path):
+        """Start a new file; returns a BackupStream to write payload bytes to."""
+        return BackupStream(self, path)
+
+    def _run(self, pending):
+        files = {}  # stream -> [raw file, gzip file, sha256, uncompressed bytes]
+        while True:
+            stream, action, data = pending.get()
+            if stream is None:
+                return
+            if stream.result.done():
+                continue  # Failed or aborted earlier; the rest of its batches are dropped
+            try:
+                state = files.get(stream)
+                if state is None and action != 'abort':
+                    raw = open(f"{stream.path}.part", 'wb')
+                    state = files[stream] = [raw, gzip.GzipFile(fileobj=raw, mode='wb',
+                                                                compresslevel=self.compresslevel),
+                                             hashlib.sha256(), 0]
+                if action == 'data':
+                    state[1].write(data)
+                    state[2].update(data)
+                    state[3] += len(data)
+                elif action == 'close':
+                    del files[stream]
+                    state[1].close()
+                    compressed = state[0].tell()
+                    state[0].close()
+                    os.replace(f"{stream.path}.part", stream.path)
+                    stream.result.set_result({'path': stream.path, 'sha256': state[2].hexdigest(),
+                                              'bytes': state[3], 'compressed_bytes': compressed})
+                else:
+                    self._discard(files.pop(stream, None), stream)
+            except Exception as error:
+                self._discard(files.pop(stream, None), stream)
+                if not stream.result.done():
+                    stream.result.set_exception(error)
+
+    @staticmethod
+    def _discard(state, stream):
+        if state is not None:
+            state[0].close()
+        if os.path.exists(f"{stream.path}.part"):
+            os.remove(f"{stream.path}.part")
+        if not stream.result.done():
+            stream.result.cancel()
+
+    def close(self):
+        """Finish every queued write and stop the threads."""
+        for pending in self._queues:
+            pending.put((None, None, None))
+        for thread in self._threads:
+            thread.join()
+
+
+class _PayloadScanner:
+    """expat handlers that pass the payload text of a reply on in batches, building no tree.
+
+    payload_tags names the elements whose text is the payload; None means the reply element's own
+    text (JSON replies). <rpc-error>s of severity error are collected instead of raised, so the
+    caller can abort the stream once the reply has been scanned.
+    """
+
+    def __init__(self, emit, payload_tags):
+        self.emit = emit
+        self.payload_tags = payload_tags
+        self.depth = 0
+        self.inside = 0  # Depth of the payload element being read, 0 outside it
+        self.batch = []
+        self.batch_bytes = 0
+        self.written = 0
+        self.error = None   # [severity, message] while inside an <rpc-error>
+        self.errors = []
+        self.error_field = None
+
+    def start(self, name, attrs):
+        self.depth += 1
+        tag = name.rpartition(':')[2]
+        if tag == 'rpc-error':
+            self.error = ['error', '']
+        elif self.error is not None and tag in ('error-severity', 'error-message'):
+            self.error_field = tag
+        elif not self.inside and self.payload_tags and tag in self.payload_tags:
+            self.inside = self.depth
+
+    def end(self, name):
+        tag = name.rpartition(':')[2]
+        if tag == 'rpc-error' and self.error is not None:
+            if self.error[0].strip() == 'error':
+                self.errors.append(self.error[1].strip() or 'rpc-error')
+            self.error = None
+        self.error_field = None
+        if self.inside == self.depth:
+            self.inside = 0
+        self.depth -= 1
+
+    def data(self, text):
+        if self.error is not None:
+            if self.error_field == 'error-severity':
+                self.error[0] = text
+            elif self.error_field == 'error-message':
+                self.error[1] += text
+            return
+        if self.inside or (self.payload_tags is None and self.depth == 1):
+            data = text.encode('utf-8')
+            self.batch.append(data)
+            self.batch_bytes += len(data)
+            if self.batch_bytes >= BATCH_BYTES:
+                self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.emit(b''.join(self.batch))
+            self.written += self.batch_bytes
+            self.batch, self.batch_bytes = [], 0
+
+
+def stream_reply(raw, stream, payload_tags):
+    """Scan a raw reply document and send its payload text to a BackupStream, then close the stream.
+
+    The reply is fed to expat FEED_CHUNK characters at a time and the payload leaves in BATCH_BYTES
+    batches, so no element tree is built and no copy of the whole payload is made.
+
+    Returns:
+        Future: The stream's result.
+    Raises:
+        RuntimeError: The reply carried rpc-errors or no payload; the stream is aborted.
+    """
+    scanner = _PayloadScanner(stream.write, payload_tags)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = 64 * 1024
+    parser.StartElementHandler = scanner.start
+    parser.EndElementHandler = scanner.end
+    parser.CharacterDataHandler = scanner.data
+    try:
+        for offset in range(0, len(raw), FEED_CHUNK):
+            parser.Parse(raw[offset:offset + FEED_CHUNK], False)
+        parser.Parse(b'', True)
+        scanner.flush()
+        if scanner.errors:
+            raise RuntimeError("; ".join(scanner.errors))
+        if not scanner.written:
+            raise RuntimeError("Reply carried no configuration")
+    except Exception:
+        stream.abort()
+        raise
+    return stream.close()
+
+
+def stream_config(dev, writer, path, config_format='text'):
+    """Fetch the configuration in one format and stream it to path through the writer.
+
+    The reply goes straight from the NETCONF session to the scanner. PyEZ never turns it into an lxml
+    tree or a JSON object, and the text is not re-encoded for the file.
+
+    Returns:
+        Future: Resolves to {'path', 'sha256', 'bytes', 'compressed_bytes'} once the file is in place.
+    """
+    raw = raw_rpc_xml(dev, 'get_configuration', attrs={'format': config_format})
+    return stream_reply(raw, writer.open(path), PAYLOAD_TAGS[config_format])
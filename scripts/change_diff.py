@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from route_table import RouteTable
+
+CHANGES_DIR = os.path.join(SCRIPT_DIR, '../changes')
+BASELINE_DIR = os.path.join(SCRIPT_DIR, '../baselines')
+REPORT_DIR = os.path.join(SCRIPT_DIR, '../reports')
+
+# baselines/<host>/<host>_<YYYYmmdd_HHMMSS>_baseline.json as written by baseline.save_baseline
+_BASELINE_RE = re.compile(r'^(?P<host>.+)_(?P<ts>\d{8}_\d{6})_baseline\.json$')
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+# What a post-change baseline may differ by before a section fails
+TOLERANCES = {
+    'routes_removed': 0,         # Routes that may disappear (a changed next-hop counts as removed)
+    'routes_added': None,        # None: any number of new routes is accepted
+    'optics_db': 2.0,            # Allowed rx/tx power drift per interface, in dB
+    'descriptions_changed': None,
+}
+
+SECTIONS = ('routing_table', 'ospf_neighbors', 'bgp_peers', 'interface_descriptions', 'optics')
+
+
+def load_change_hosts(change_number, changes_dir=CHANGES_DIR):
+    """Return the host dicts (host_name, host_ip, function) listed in changes/<CHG>/<CHG>_CI.yml."""
+    ci_file = os.path.join(changes_dir, change_number, f"{change_number}_CI.yml")
+    with open(ci_file, 'r') as f:
+        ci_data = yaml.safe_load(f) or {}
+    hosts = []
+    for group in (ci_data.get('hosts') or {}).values():
+        hosts.extend(group or [])
+    return hosts
+
+
+def find_baselines(host_name, start=None, end=None, baseline_dir=BASELINE_DIR):
+    """Pick the (pre, post) baseline files of a host.
+
+    With a change window, pre is the last baseline at or before start and post the last one at or after end;
+    a one-sided window uses its one bound for both. Post must be later than pre, so one file is never
+    compared with itself. Without a window, the two most recent baselines are used. Either may be None
+    when no file qualifies.
+    """
+    captures = []
+    for path in glob.glob(os.path.join(baseline_dir, host_name, f"{glob.escape(host_name)}_*_baseline.json")):
+        match = _BASELINE_RE.match(os.path.basename(path))
+        if match and match['host'] == host_name:
+            captures.append((datetime.strptime(match['ts'], '%Y%m%d_%H%M%S'), path))
+    captures.sort()
+    if start is None and end is None:
+        if len(captures) < 2:
+            return None, captures[-1][1] if captures else None
+        return captures[-2][1], captures[-1][1]
+    pre = [(ts, path) for ts, path in captures if ts <= (start or end)]
+    pre_ts = pre[-1][0] if pre else None
+    post = [path for ts, path in captures if ts >= (end or start) and (pre_ts is None or ts > pre_ts)]
+    return (pre[-1][1] if pre else None), (post[-1] if post else None)
+
+
+def _items(value):
+    """Baseline sections hold a list, or a string such as 'No BGP peers' when there is nothing."""
+    return value if isinstance(value, list) else []
+
+
+def _number(value):
+    match = _NUMBER_RE.search(str(value)) if value is not None else None
+    return float(match.group()) if match else None
+
+
+def diff_routing_table(pre, post, tolerances):
+    before = RouteTable.from_records(_items(pre.get('general_info', {}).get('routing_table')))
+    after = RouteTable.from_records(_items(post.get('general_info', {}).get('routing_table')))
+    added, removed = before.diff(after)
+    details = [f"- {line}" for line in removed.format_lines()] + [f"+ {line}" for line in added.format_lines()]
+    passed = ((tolerances['routes_removed'] is None or len(removed) <= tolerances['routes_removed']) and
+              (tolerances['routes_added'] is None or len(added) <= tolerances['routes_added']))
+    return passed, f"{len(before)} -> {len(after)} routes, {len(added)} added, {len(removed)} removed", details
+
+
+def _diff_sessions(before, after, healthy):
+    """Compare keyed session states; a session that was healthy must still be healthy."""
+    details, failed = [], False
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        if old == new:
+            continue
+        if old in healthy and new not in healthy:
+            failed = True
+        details.append(f"{key}: {old or 'absent'} -> {new or 'absent'}")
+    return not failed, details
+
+
+def diff_ospf_neighbors(pre, post, tolerances):
+    before = {n['neighbor_address']: n['state'] for n in _items(pre.get('ospf', {}).get('neighbors'))}
+    after = {n['neighbor_address']: n['state'] for n in _items(post.get('ospf', {}).get('neighbors'))}
+    passed, details = _diff_sessions(before, after, healthy={'Full'})
+    return passed, f"{len(before)} -> {len(after)} neighbors, {len(details)} changed", details
+
+
+def diff_bgp_peers(pre, post, tolerances):
+    before = {p['peer_address']: p['state'] for p in _items(pre.get('bgp', {}).get('summary'))}
+    after = {p['peer_address']: p['state'] for p in _items(post.get('bgp', {}).get('summary'))}
+    passed, details = _diff_sessions(before, after, healthy={'Established'})
+    return passed, f"{len(before)} -> {len(after)} peers, {len(details)} changed", details
+
+
+def diff_interface_descriptions(pre, post, tolerances):
+    before = pre.get('interfaces', {}).get('descriptions')
+    after = post.get('interfaces', {}).get('descriptions')
+    before = before if isinstance(before, dict) else {}
+    after = after if isinstance(after, dict) else {}
+    details = [f"{name}: '{before.get(name, 'absent')}' -> '{after.get(name, 'absent')}'"
+               for name in sorted(set(before) | set(after)) if before.get(name) != after.get(name)]
+    limit = tolerances['descriptions_changed']
+    return limit is None or len(details) <= limit, f"{len(details)} descriptions changed", details
+
+
+def diff_optics(pre, post, tolerances):
+    def levels(baseline):
+        return {x['interface']: (_number(x.get('rx_power_dbm')), _number(x.get('tx_power_dbm')))
+                for x in _items(baseline.get('general_info', {}).get('transceivers'))}
+    before, after = levels(pre), levels(post)
+    details, failed = [], False
+    for name in sorted(set(before) | set(after)):
+        if name not in after:
+            failed = True
+            details.append(f"{name}: optic missing after change")
+            continue
+        for label, old, new in zip(('rx', 'tx'), before.get(name, (None, None)), after[name]):
+            if old is None or new is None:
+                continue
+            if abs(new - old) > tolerances['optics_db']:
+                failed = True
+                details.append(f"{name} {label}: {old} -> {new} dBm")
+    return not failed, f"{len(after)} optics, {len(details)} outside +/-{tolerances['optics_db']} dB", details
+
+
+DIFFERS = {
+    'routing_table': diff_routing_table,
+    'ospf_neighbors': diff_ospf_neighbors,
+    'bgp_peers': diff_bgp_peers,
+    'interface_descriptions': diff_interface_descriptions,
+    'optics': diff_optics,
+}
+
+
+def diff_host(task):
+    """Diff every section of one host's pre/post baselines (runs in a worker process).
+
+    Args:
+        task (tuple): (host dict, pre path, post path, tolerances).
+    Returns:
+        dict: host_name, host_ip, files, passed and per-section results.
+    """
+    host, pre_file, post_file, tolerances = task
+    result = {'host_name': host['host_name'], 'host_ip': host.get('host_ip'),
+              'pre': pre_file, 'post': post_file, 'sections': {}}
+    if not pre_file or not post_file:
+        result['passed'] = False
+        missing = [label for label, path in (('pre-change', pre_file), ('post-change', post_file)) if not path]
+        result['error'] = f"missing {' and '.join(missing)} baseline"
+        return result
+    with open(pre_file, 'r') as f:
+        pre = json.load(f)
+    with open(post_file, 'r') as f:
+        post = json.load(f)
+    for section in SECTIONS:
+        try:
+            passed, summary, details = DIFFERS[section](pre, post, tolerances)
+        except Exception as error:
+            passed, summary, details = False, f"diff failed: {error}", []
+        result['sections'][section] = {'passed': passed, 'summary': summary, 'details': details}
+    result['passed'] = all(section['passed'] for section in result['sections'].values())
+    return result
+
+
+def compare_change(change_number, start=None, end=None, tolerances=None, max_workers=None):
+    """Diff pre/post baselines of every CI host of a change in parallel.
+
+    Returns:
+        list: diff_host results in CI order.
+    """
+    tolerances = dict(TOLERANCES, **(tolerances or {}))
+    tasks = [(host,) + find_baselines(host['host_name'], start, end) + (tolerances,)
+             for host in load_change_hosts(change_number)]
+    if not tasks:
+        return []
+    # Baseline loading and route diffs are CPU-bound, so each host is diffed in its own process
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(diff_host, tasks, chunksize=max(1, len(tasks) // 64)))
+
+
+def write_report(change_number, results, report_dir=REPORT_DIR):
+    """Write one pass/fail report for the change; returns its path."""
+    os.makedirs(report_dir, exist_ok=True)
+    report_file = os.path.join(report_dir, f"{change_number}_diff_{datetime.now():%Y%m%d_%H%M%S}.txt")
+    failed = [r for r in results if not r['passed']]
+    lines = [f"Pre/post change comparison for {change_number}\n",
+             f"Overall: {'FAIL' if failed else 'PASS'} ({len(results) - len(failed)}/{len(results)} hosts passed)\n",
+             "=" * 50 + "\n"]
+    for result in results:
+        lines.append(f"\n{result['host_name']} ({result['host_ip']}): {'PASS' if result['passed'] else 'FAIL'}\n")
+        if 'error' in result:
+            lines.append(f"  {result['error']}\n")
+            continue
+        lines.append(f"  pre:  {os.path.basename(result['pre'])}\n  post: {os.path.basename(result['post'])}\n")
+        for section, outcome in result['sections'].items():
+            lines.append(f"  [{'PASS' if outcome['passed'] else 'FAIL'}] {section}: {outcome['summary']}\n")
+            lines.extend(f"      {detail}\n" for detail in outcome['details'])
+    with open(report_file, 'w') as f:
+        f.writelines(lines)
+    return report_file
+
+
+def main():
+    """Compare pre- and post-change baselines for every host of a change."""
+    parser = argparse.ArgumentParser(description='Pre/post change baseline comparison')
+    parser.add_argument('change', help='Change number, e.g. CHG0123456')
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        help='Change window start; pre baseline is the last one before it')
+    parser.add_argument('--end', type=datetime.fromisoformat,
+                        help='Change window end; post baseline is the last one after it')
+    parser.add_argument('--optics-db', type=float, default=TOLERANCES['optics_db'],
+                        help='Allowed optics power drift in dB')
+    parser.add_argument('--routes-removed', type=int, default=TOLERANCES['routes_removed'],
+                        help='Routes allowed to disappear per host')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    started = datetime.now()
+    try:
+        results = compare_change(args.change, args.start, args.end, max_workers=args.workers,
+                                 tolerances={'optics_db': args.optics_db, 'routes_removed': args.routes_removed})
+    except FileNotFoundError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    report_file = write_report(args.change, results)
+    failed = sum(1 for r in results if not r['passed'])
+    for result in results:
+        print(f"{result['host_name']:<24} {'PASS' if result['passed'] else 'FAIL'}")
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"{args.change}: {'FAIL' if failed else 'PASS'} - {len(results) - failed}/{len(results)} hosts passed "
+          f"in {elapsed:.2f} s; report saved to {report_file}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
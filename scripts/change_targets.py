@@ -0,0 +1,201 @@
+import os
+import csv
+import sys
+import argparse
+import yaml
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from utils import load_yaml, merge_host_data
+
+CHANGES_DIR = os.path.join(SCRIPT_DIR, '../changes')
+INVENTORY_FILE = os.path.join(SCRIPT_DIR, '../data/inventory.yml')
+
+# CSV headers accepted for each CI field
+_COLUMNS = {
+    'host_name': ('host_name', 'hostname', 'name', 'ci', 'ci_name'),
+    'host_ip': ('host_ip', 'ip_address', 'ip', 'address'),
+    'function': ('function', 'role'),
+    'group': ('group', 'type', 'device_type'),
+}
+
+# CI file group for each inventory device_type
+_GROUPS = {'router': 'routers', 'switch': 'switches', 'firewall': 'firewalls'}
+
+
+class InventoryIndex:
+    """Look up inventory hosts by host name (case-insensitive) or management IP."""
+
+    def __init__(self, hosts):
+        self.by_name = {}
+        self.by_ip = {}
+        for host in hosts:
+            self.by_name.setdefault(host['host_name'].lower(), host)
+            self.by_ip.setdefault(host['ip_address'], host)
+
+    def find(self, host_name=None, host_ip=None):
+        """Return the inventory host matching the name, else the IP, else None."""
+        if host_name and host_name.strip().lower() in self.by_name:
+            return self.by_name[host_name.strip().lower()]
+        if host_ip:
+            return self.by_ip.get(host_ip.strip())
+        return None
+
+    def resolve(self, entries):
+        """Split CI entries into (resolved inventory hosts, unresolved entries), dropping duplicates.
+
+        Args:
+            entries (list): Dicts with host_name and/or host_ip.
+        """
+        resolved, unresolved, seen = [], [], set()
+        for entry in entries:
+            host = self.find(entry.get('host_name'), entry.get('host_ip'))
+            if host is None:
+                unresolved.append(entry)
+            elif host['ip_address'] not in seen:
+                seen.add(host['ip_address'])
+                resolved.append(host)
+        return resolved, unresolved
+
+
+def _normalize(row, group=None):
+    """Map a CSV/YAML row onto host_name/host_ip/function/group, whatever its column names."""
+    lowered = {str(key).strip().lower(): value for key, value in row.items() if value not in (None, '')}
+    entry = {}
+    for field, names in _COLUMNS.items():
+        for name in names:
+            if name in lowered:
+                entry[field] = str(lowered[name]).strip()
+                break
+    if group and 'group' not in entry:
+        entry['group'] = group
+    return entry
+
+
+def read_ci_file(path):
+    """Read CI entries from a CSV file, a list YAML file or an existing <CHG>_CI.yml.
+
+    Returns:
+        list: Entry dicts with host_name and/or host_ip, plus function/group when given.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', newline='') as f:
+            return [_normalize(row) for row in csv.DictReader(f)]
+    data = load_yaml(path)
+    if data is None:
+        return []
+    if isinstance(data, dict):
+        hosts = data.get('hosts', data)
+        if isinstance(hosts, dict):
+            # CI file layout: hosts grouped as routers/switches/...
+            return [_normalize(row, group) for group, rows in hosts.items() for row in rows or []]
+        data = hosts
+    return [_normalize(row) if isinstance(row, dict) else {'host_name': str(row)} for row in data or []]
+
+
+def load_ci(change_number, changes_dir=CHANGES_DIR):
+    """Return (CI data, path) of changes/<CHG>/<CHG>_CI.yml; data is None if the file does not exist."""
+    ci_file = os.path.join(changes_dir, change_number, f"{change_number}_CI.yml")
+    if not os.path.exists(ci_file):
+        return None, ci_file
+    with open(ci_file, 'r') as f:
+        return yaml.safe_load(f) or {}, ci_file
+
+
+def import_ci(change_number, paths, inventory_hosts, replace=False, changes_dir=CHANGES_DIR):
+    """Bulk-import CI lists into changes/<CHG>/<CHG>_CI.yml, resolving every entry against the inventory.
+
+    Entries are merged into an existing CI file unless replace is set. Names and IPs of resolved entries
+    are taken from the inventory so the file matches what the actions connect to; unresolved entries are
+    written as given and reported.
+
+    Returns:
+        tuple: (CI file path, resolved host count, unresolved entries).
+    """
+    index = InventoryIndex(inventory_hosts)
+    entries = [entry for path in paths for entry in read_ci_file(path)]
+    existing, ci_file = load_ci(change_number, changes_dir)
+    if existing and not replace:
+        entries = read_ci_file(ci_file) + entries
+
+    groups, seen, unresolved, resolved = {}, set(), [], 0
+    for entry in entries:
+        host = index.find(entry.get('host_name'), entry.get('host_ip'))
+        key = host['ip_address'] if host else entry.get('host_ip') or entry.get('host_name')
+        if key in seen:
+            continue
+        seen.add(key)
+        if host is None:
+            # Kept in the file as given so nothing already recorded for the change is lost
+            unresolved.append(entry)
+            host = {'host_name': entry.get('host_name'), 'ip_address': entry.get('host_ip')}
+        else:
+            resolved += 1
+        group = entry.get('group') or _GROUPS.get(host.get('device_type'), 'routers')
+        groups.setdefault(group, []).append({
+            'function': entry.get('function') or host.get('device_type', 'unknown'),
+            'host_ip': host['ip_address'],
+            'host_name': host['host_name']
+        })
+
+    os.makedirs(os.path.dirname(ci_file), exist_ok=True)
+    with open(ci_file, 'w') as f:
+        yaml.safe_dump({'servicenow_change_number': change_number, 'hosts': groups}, f, default_flow_style=False)
+    return ci_file, resolved, unresolved
+
+
+def load_change_targets(change_number, hosts, changes_dir=CHANGES_DIR):
+    """Resolve a change's CI hosts against the given host list (e.g. merge_host_data hosts).
+
+    Returns:
+        tuple: (hosts in scope, unresolved CI entries).
+    Raises:
+        FileNotFoundError: When the change has no CI file.
+    """
+    ci_data, ci_file = load_ci(change_number, changes_dir)
+    if ci_data is None:
+        raise FileNotFoundError(f"No CI file for {change_number} at {ci_file}")
+    return InventoryIndex(hosts).resolve(read_ci_file(ci_file))
+
+
+def main():
+    """Import CI lists into a change, or show which inventory hosts a change targets."""
+    parser = argparse.ArgumentParser(description='Change CI import and targeting')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Bulk-import CSV/YAML CI lists into changes/<CHG>/')
+    import_parser.add_argument('change', help='Change number, e.g. CHG0123456')
+    import_parser.add_argument('files', nargs='+', help='CSV (host_name/host_ip/function columns) or YAML files')
+    import_parser.add_argument('--replace', action='store_true', help='Replace the existing CI list instead of merging')
+    import_parser.add_argument('--strict', action='store_true', help='Fail if any entry is not in the inventory')
+    show_parser = subparsers.add_parser('show', help='List the inventory hosts a change targets')
+    show_parser.add_argument('change', help='Change number, e.g. CHG0123456')
+    args = parser.parse_args()
+
+    inventory = merge_host_data(INVENTORY_FILE)
+    if not inventory:
+        print("Failed to load inventory. Exiting.")
+        sys.exit(1)
+    change_number = args.change.strip().upper()
+
+    if args.command == 'import':
+        ci_file, count, unresolved = import_ci(change_number, args.files, inventory['hosts'], replace=args.replace)
+        for entry in unresolved:
+            print(f"Not in inventory: {entry.get('host_name', '')} {entry.get('host_ip', '')}".rstrip())
+        print(f"{count} hosts written to {ci_file}, {len(unresolved)} unresolved")
+        sys.exit(1 if unresolved and args.strict else 0)
+
+    try:
+        hosts, unresolved = load_change_targets(change_number, inventory['hosts'])
+    except FileNotFoundError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    for host in hosts:
+        print(f"{host['host_name']:<24} {host['ip_address']:<16} {host['location']:<8} {host['device_type']}")
+    for entry in unresolved:
+        print(f"Not in inventory: {entry.get('host_name', '')} {entry.get('host_ip', '')}".rstrip())
+    print(f"{len(hosts)} hosts in scope for {change_number}")
+
+if __name__ == "__main__":
+    main()
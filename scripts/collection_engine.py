@@ -0,0 +1,250 @@
+import os
+import json
+from datetime import datetime
+from utils import load_yaml, run_concurrently, raw_rpc_reply
+from rpc_cache import cached_rpc, cached_cli
+from facts_cache import get_device_facts, get_hostname
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_FILE = os.path.join(SCRIPT_DIR, '../data/collection_profiles.yml')
+
+_profiles = None  # Profiles loaded from PROFILES_FILE, kept for the life of the process
+
+
+def load_profiles(path=PROFILES_FILE, reload=False):
+    """Load collection profiles from YAML and return them keyed by profile name."""
+    global _profiles
+    if _profiles is None or reload:
+        data = load_yaml(path)
+        if not data or 'profiles' not in data:
+            raise ValueError(f"No 'profiles' defined in '{path}'")
+        _profiles = data['profiles']
+    return _profiles
+
+
+def profile_matches(profile, host):
+    """Return True if the host's inventory device_type and vendor satisfy the profile's match block."""
+    for field, allowed in (profile.get('match') or {}).items():
+        if field in host and host[field] not in allowed:
+            return False
+    return True
+
+
+def call_key(check):
+    """Identity of the RPC behind a check; checks with equal keys share one fetch."""
+    if check.get('facts'):
+        return ('facts',)
+    if check.get('chunked'):
+        return ('chunked', (check.get('args') or {}).get('table', 'inet.0'))
+    if 'rpc' in check:
+        return ('rpc', check['rpc'], json.dumps(check.get('args') or {}, sort_keys=True))
+    if 'command' in check:
+        return ('cli', check['command'], check.get('format', 'text'))
+    raise ValueError(f"Check '{check.get('name')}' has no rpc, command or facts source")
+
+
+def _fetch(dev, check, fresh, executor=None):
+    if check.get('facts'):
+        return get_device_facts(dev)
+    if check.get('chunked'):
+        # Route tables: streamed and split into ranges when large; yields a RouteTable, not an RPC reply
+        from route_fetch import fetch_route_table
+        return fetch_route_table(dev, (check.get('args') or {}).get('table', 'inet.0'), executor=executor)
+    if executor is not None and 'rpc' in check and 'parser' in check:
+        # Raw reply bytes for the process pool, which cannot take lxml trees; these skip the RPC cache
+        return raw_rpc_reply(dev, check['rpc'], **(check.get('args') or {})).getbuffer()
+    if 'rpc' in check:
+        return cached_rpc(dev, check['rpc'], fresh=fresh, **(check.get('args') or {}))
+    return cached_cli(dev, check['command'], format=check.get('format', 'text'), fresh=fresh)
+
+
+def _value(check, reply):
+    """Turn a reply into the value stored for a check."""
+    if check.get('facts'):
+        return {key: reply.get(key, 'Unknown') for key in ('hostname', 'model', 'version', 'serial_number')}
+    if 'parser' in check:
+        from baseline import PARSERS
+        return PARSERS[check['parser']](reply)
+    return reply.text
+
+
+def collect_device(dev, host, profile_names, fresh=False, executor=None, log=print):
+    """Run the named profiles against one device, fetching each distinct RPC once.
+
+    Given a HybridExecutor, parsed checks are fetched as raw replies and parsed in its process pool.
+
+    Returns:
+        dict: profile name -> {'data': collected values, 'errors': check name -> message}.
+    """
+    profiles = load_profiles()
+    selected = [(name, profiles[name]) for name in profile_names if profile_matches(profiles[name], host)]
+
+    # Deduplicate RPCs across every selected profile before touching the device
+    replies = {}
+    for _, profile in selected:
+        for check in profile['checks']:
+            key = call_key(check)
+            if key in replies:
+                continue
+            try:
+                replies[key] = _fetch(dev, check, fresh, executor)
+            except Exception as error:
+                replies[key] = error
+
+    # Raw replies go to the pool all at once, so this device's parsers run side by side
+    parsing = {}
+    for _, profile in selected:
+        for check in profile['checks']:
+            key = call_key(check)
+            if isinstance(replies[key], memoryview) and (key, check['parser']) not in parsing:
+                from hybrid_executor import parse_reply
+                parsing[key, check['parser']] = executor.submit(parse_reply, replies[key], check['parser'])
+
+    results = {}
+    for name, profile in selected:
+        data, errors = {}, {}
+        for check in profile['checks']:
+            target = data.setdefault(check['section'], {}) if 'section' in check else data
+            reply = replies[call_key(check)]
+            try:
+                if isinstance(reply, Exception):
+                    raise reply
+                if isinstance(reply, memoryview):
+                    target[check['name']] = parsing[call_key(check), check['parser']].result()
+                else:
+                    target[check['name']] = _value(check, reply)
+            except Exception as error:
+                errors[check['name']] = str(error)
+                if 'section' in check:
+                    target['error'] = str(error)
+                log(f"Failed to collect {check['name']} for {dev._hostname}: {error}")
+        results[name] = {'data': data, 'errors': errors}
+    return results
+
+
+def collect(connections, hosts, profile_names, max_workers=64, fresh=False, executor=None, log=print):
+    """Run the named profiles across all connected devices concurrently.
+
+    Devices are polled on threads; an optional HybridExecutor takes the parsing off them (see collect_device).
+    Failures are reported through log, print() by default.
+
+    Returns:
+        list: One dict per device with host_name, host_ip and per-profile results.
+    """
+    load_profiles()  # Fail fast on a broken profiles file before any RPC is sent
+    host_by_ip = {h['ip_address']: h for h in hosts}
+    host_lookup = {ip: h['host_name'] for ip, h in host_by_ip.items()}
+
+    def run(dev):
+        return collect_device(dev, host_by_ip.get(dev._hostname, {}), profile_names, fresh=fresh, executor=executor,
+                              log=log)
+
+    results = []
+    for dev, profiles, error in run_concurrently(connections, run, max_workers=max_workers):
+        record = {'host_name': get_hostname(dev, host_lookup), 'host_ip': dev._hostname, 'profiles': profiles or {}}
+        if error:
+            record['error'] = str(error)
+            log(f"Failed to run collection on {dev._hostname}: {error}")
+        results.append(record)
+    return results
+
+
+def evaluate(check, value):
+    """Apply a check's 'expect' rule: pass if any item's field starts with the expected text."""
+    expect = check['expect']
+    items = value if isinstance(value, list) else []
+    passed = any(str(item.get(expect['field'], '')).startswith(expect['startswith']) for item in items)
+    return passed, expect['pass'] if passed else expect['fail']
+
+
+def _write_sections(record, result, output_dir, date_str, profile, executor=None):
+    filepath = os.path.join(output_dir, f"{record['host_name']}_{date_str}_baseline.txt")
+    sections = [f"=== {check['title']} ===\n{result['data'][check['name']]}\n"
+                for check in profile['checks'] if check['name'] in result['data']]
+    with open(filepath, 'w') as f:
+        f.write("\n".join(sections))
+    return filepath
+
+
+def _write_baseline(record, result, output_dir, date_str, profile, executor=None):
+    from baseline import save_baseline
+    return save_baseline(result['data'], record['host_name'], record['host_ip'], output_dir, date_str, executor)
+
+
+def _write_verification(record, result, output_dir, date_str, profile, executor=None):
+    lines = []
+    for check in profile['checks']:
+        if check['name'] in result['errors']:
+            label = check.get('expect', {}).get('error', f"{check['name']} verification failed")
+            lines.append(f"{record['host_name']} ({record['host_ip']}): {label} - {result['errors'][check['name']]}")
+        elif 'expect' in check:
+            _, message = evaluate(check, result['data'][check['name']])
+            lines.append(f"{record['host_name']} ({record['host_ip']}): {message}")
+    return lines
+
+
+# Output pipeline: every profile's results are written by exactly one of these writers
+WRITERS = {
+    'sections': (_write_sections, '../backups', '%Y%m%d'),
+    'baseline': (_write_baseline, '../baselines', '%Y%m%d_%H%M%S'),
+    'verification': (_write_verification, None, None),
+}
+
+
+def write_results(results, profile_name, executor=None, log=print):
+    """Write collected results of one profile through its configured output writer.
+
+    Given a HybridExecutor, baselines are serialized in its process pool, several devices at a time.
+    Progress messages go to log, print() by default.
+
+    Returns:
+        list: Writer return values (file paths, or result lines for verification).
+    """
+    profile = load_profiles()[profile_name]
+    writer, output_dir, date_format = WRITERS[profile.get('output', 'sections')]
+    if output_dir:
+        output_dir = os.path.join(SCRIPT_DIR, output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    date_str = datetime.now().strftime(date_format) if date_format else None
+
+    pending = []
+    for record in results:
+        result = record['profiles'].get(profile_name)
+        if result is None:
+            if 'error' not in record:  # Collection failures were reported by collect()
+                # E.g. non-Juniper inventory hosts; say so, so the reduced scope is visible
+                log(f"Skipped {profile_name} for {record['host_name']}: not selected by match {profile.get('match')}")
+            continue
+        if profile.get('output') == 'sections' and result['errors']:
+            log(f"Failed to capture baseline for {record['host_name']}: {result['errors']}")
+            continue
+        pending.append((len(pending), record, result))
+
+    def write(item):
+        _, record, result = item
+        return writer(record, result, output_dir, date_str, profile, executor=executor)
+
+    if executor is None:
+        outcomes = []
+        for item in pending:
+            try:
+                outcomes.append((item, write(item), None))
+            except Exception as error:
+                outcomes.append((item, None, error))
+    else:
+        # Threads only wait on the pool here; results are put back in input order below
+        outcomes = sorted(run_concurrently(pending, write, max_workers=executor.processes, adaptive=False),
+                          key=lambda outcome: outcome[0][0])
+
+    written = []
+    for (_, record, _), output, error in outcomes:
+        if error is not None:
+            log(f"Failed to write {profile_name} for {record['host_name']}: {error}")
+            continue
+        if writer is _write_sections:
+            log(f"Baseline captured for {record['host_name']} to {output}")
+        if isinstance(output, list):
+            written.extend(output)
+        else:
+            written.append(output)
+    return written
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+import socketserver
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from utils import merge_host_data, get_template_env
+from connect_to_hosts import connect_to_hosts, disconnect_from_hosts
+from rpc_cache import rpc_cache
+from concurrency import limiter
+
+ACTIONS = ['backup', 'baseline', 'bgp_verification', 'ospf_verification', 'route_snapshot', 'command']
+
+
+class SessionPool:
+    """Keep one warm NETCONF session per device and reopen it when it drops."""
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self._sessions = {}
+        self._stale = {}  # host_ip -> session opened with old credentials, closed on the next get()
+        self._lock = threading.Lock()
+
+    def set_credentials(self, username, password):
+        """Use new credentials from now on.
+
+        Sessions opened with the old ones may be in use by their DeviceWorker, so they are only marked
+        stale here and closed when that worker next asks for its session.
+        """
+        with self._lock:
+            if (username, password) == (self.username, self.password):
+                return
+            self.username, self.password = username, password
+            self._stale.update(self._sessions)
+            self._sessions.clear()
+
+    def get(self, host_ip):
+        """Return a connected Device for host_ip, or None if the device is unreachable."""
+        with self._lock:
+            stale = self._stale.pop(host_ip, None)
+            dev = self._sessions.get(host_ip)
+        if stale is not None:
+            disconnect_from_hosts([stale])  # Its worker is the caller, so the previous task is done with it
+        if dev is not None and dev.connected:
+            return dev
+        connections = connect_to_hosts(username=self.username, password=self.password, host_ips=[host_ip])
+        if not connections:
+            return None
+        with self._lock:
+            self._sessions[host_ip] = connections[0]
+        return connections[0]
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values()) + list(self._stale.values())
+            self._sessions.clear()
+            self._stale.clear()
+        disconnect_from_hosts(sessions)
+
+
+class DeviceWorker(threading.Thread):
+    """Run queued tasks for a single device one at a time (per-device serialization)."""
+
+    def __init__(self, host_ip, daemon_state):
+        super().__init__(name=f"worker-{host_ip}", daemon=True)
+        self.host_ip = host_ip
+        self.state = daemon_state
+        self.tasks = queue.Queue()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            action, params, results = task
+            results.put(self.state.execute(self.host_ip, action, params))
+
+
+class CollectorDaemon:
+    """Holds the loaded inventory, compiled templates, warm sessions and per-device queues."""
+
+    def __init__(self, inventory_file, config_file):
+        self.inventory_file = inventory_file
+        self.config_file = config_file
+        self.workers = {}
+        self._workers_lock = threading.Lock()
+        self.pool = None
+        self.load()
+
+    def load(self):
+        """(Re)load inventory and credentials, and warm the template environment.
+
+        Changed credentials replace the warm sessions, which were opened with the old ones.
+        """
+        merged_data = merge_host_data(self.inventory_file, self.config_file)
+        if not merged_data:
+            raise RuntimeError("Failed to merge host data.")
+        self.username = merged_data.get('username')
+        self.password = merged_data.get('password')
+        self.hosts = merged_data.get('hosts', [])
+        self.tables = merged_data.get('tables', ['inet.0'])
+        self.host_by_ip = {h['ip_address']: h for h in self.hosts}
+        self.host_by_name = {h['host_name']: h for h in self.hosts}
+        env = get_template_env()
+        for template_name in env.list_templates(extensions=['j2']):
+            env.get_template(template_name)  # Compile once, reused by every render
+        if self.pool is None:
+            self.pool = SessionPool(self.username, self.password)
+        else:
+            self.pool.set_credentials(self.username, self.password)
+
+    def resolve_hosts(self, targets):
+        """Map host names or IPs to inventory IPs; no targets means every host."""
+        if not targets:
+            return list(self.host_by_ip)
+        resolved = []
+        for target in targets:
+            if target in self.host_by_ip:
+                resolved.append(target)
+            elif target in self.host_by_name:
+                resolved.append(self.host_by_name[target]['ip_address'])
+        return resolved
+
+    def submit(self, action, host_ips, params):
+        """Queue action on every device's worker and return the queue results arrive on."""
+        results = queue.Queue()
+        for host_ip in host_ips:
+            with self._workers_lock:
+                worker = self.workers.get(host_ip)
+                if worker is None:
+                    worker = DeviceWorker(host_ip, self)
+                    self.workers[host_ip] = worker
+                    worker.start()
+            worker.tasks.put((action, params, results))
+        return results
+
+    def execute(self, host_ip, action, params):
+        """Run one action against one device on its warm session and return a result record.
+
+        The action's progress messages are collected and returned to the API client as 'output'.
+        """
+        host_name = self.host_by_ip.get(host_ip, {}).get('host_name', host_ip)
+        started = datetime.now()
+        output = []
+
+        def log(message):
+            output.append(f"{message}\n")
+
+        result = {'host_name': host_name, 'host_ip': host_ip, 'action': action}
+        try:
+            dev = self.pool.get(host_ip)
+            if dev is None:
+                result.update(status='failed', error='not connected')
+            else:
+                result.update(status='ok', result=self._run_action(dev, host_ip, host_name, action, params, log))
+        except Exception as error:
+            result.update(status='failed', error=str(error))
+        result['output'] = "".join(output)
+        result['duration_s'] = round((datetime.now() - started).total_seconds(), 3)
+        return result
+
+    def _run_action(self, dev, host_ip, host_name, action, params, log):
+        # The actions accept connect/disconnect callables, so hand them the warm session
+        # and a no-op disconnect instead of opening a fresh one per request.
+        def warm_connect(**kwargs):
+            return [dev]
+
+        def keep_open(connections):
+            return None
+
+        common = dict(username=self.username, password=self.password, host_ips=[host_ip],
+                      hosts=self.hosts, connect_to_hosts=warm_connect, disconnect_from_hosts=keep_open)
+        if action == 'backup':
+            from backup_actions import backup_config
+            backup_config(**common, transport=params.get('transport', 'rpc'), log=log)
+            return None
+        if action == 'baseline':
+            from backup_actions import capture_device_baseline
+            capture_device_baseline(**common, log=log)
+            return None
+        if action == 'bgp_verification':
+            from monitoring_actions import verify_bgp
+            return verify_bgp(dev, host_name, fresh=params.get('fresh', False), log=log)
+        if action == 'ospf_verification':
+            from monitoring_actions import verify_ospf
+            return verify_ospf(dev, host_name, fresh=params.get('fresh', False), log=log)
+        if action == 'route_snapshot':
+            from route_monitor import capture_routing_tables, save_routing_tables
+            routing_dir = os.path.join(SCRIPT_DIR, '../routing')
+            os.makedirs(routing_dir, exist_ok=True)
+            dev.tables = params.get('tables') or self.tables
+            tables = capture_routing_tables(dev, host_name, routing_dir, raise_errors=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            return save_routing_tables(tables, host_name, routing_dir, timestamp)
+        if action == 'command':
+            command = params.get('command')
+            if not command:
+                raise ValueError("'command' is required for the command action")
+            return dev.rpc.cli(command, format='text').text
+        raise ValueError(f"Unknown action '{action}'")
+
+    def shutdown(self):
+        with self._workers_lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.tasks.put(None)
+        self.pool.close_all()
+
+
+class CollectorRequestHandler(BaseHTTPRequestHandler):
+    """Local API: GET /health, GET /hosts, POST /reload, POST /jobs (streams NDJSON results)."""
+
+    daemon_state = None  # Set on the server class before serving
+
+    def log_message(self, format, *args):
+        # Unix-socket clients have no address tuple, so log without one
+        sys.stderr.write(f"[{datetime.now():%H:%M:%S}] {format % args}\n")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.daemon_state
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'hosts': len(state.hosts), 'workers': len(state.workers),
+                                  'rpc_cache': rpc_cache.stats(), 'concurrency': limiter.stats()})
+        elif self.path == '/hosts':
+            self._send_json(200, [{k: h.get(k) for k in ('host_name', 'ip_address', 'location', 'device_type', 'vendor')}
+                                  for h in state.hosts])
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        state = self.server.daemon_state
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as error:
+            self._send_json(400, {'error': f"Invalid JSON: {error}"})
+            return
+
+        if self.path == '/reload':
+            try:
+                state.load()
+                self._send_json(200, {'status': 'reloaded', 'hosts': len(state.hosts)})
+            except RuntimeError as error:
+                self._send_json(500, {'error': str(error)})
+            return
+        if self.path != '/jobs':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+
+        action = request.get('action')
+        if action not in ACTIONS:
+            self._send_json(400, {'error': f"'action' must be one of {ACTIONS}"})
+            return
+        host_ips = state.resolve_hosts(request.get('hosts'))
+        if not host_ips:
+            self._send_json(400, {'error': 'No matching hosts'})
+            return
+
+        results = state.submit(action, host_ips, request)
+        # Stream one JSON line per device as soon as its task finishes
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        for _ in host_ips:
+            self.wfile.write((json.dumps(results.get()) + "\n").encode())
+            self.wfile.flush()
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+
+def main():
+    """Start the collector daemon on a local TCP port or Unix socket."""
+    parser = argparse.ArgumentParser(description='Collector daemon with warm device sessions')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind the HTTP API to')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port for the HTTP API')
+    parser.add_argument('--socket', help='Serve on this Unix socket path instead of TCP')
+    parser.add_argument('--warm', action='store_true', help='Open sessions to every host at startup')
+    args = parser.parse_args()
+
+    state = CollectorDaemon(os.path.join(SCRIPT_DIR, "../data/inventory.yml"),
+                            os.path.join(SCRIPT_DIR, "../data/hosts_data.yml"))
+    if args.warm:
+        for host_ip in state.host_by_ip:
+            state.pool.get(host_ip)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, CollectorRequestHandler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), CollectorRequestHandler)
+        where = f"http://{args.host}:{args.port}"
+    server.daemon_state = state
+
+    print(f"Collector daemon serving {len(state.hosts)} hosts on {where}. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nCollector daemon stopped by user.")
+    finally:
+        server.server_close()
+        state.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Errors that mean the device or its NETCONF/SSH service is struggling, as opposed to a bad request
+_OVERLOAD_ERRORS = ('Timeout', 'ConnectError', 'ConnectionError', 'ConnectRefused', 'SSHException',
+                    'TimeoutError', 'socket', 'EOFError')
+
+CPU_SAMPLE_INTERVAL = 30  # Seconds between routing-engine CPU samples of one device
+
+
+def is_overload_error(error):
+    """True for timeouts and connection failures; RPC syntax or permission errors are not load signals."""
+    return any(name in type(error).__name__ or name in type(error).__module__ for name in _OVERLOAD_ERRORS)
+
+
+def sample_re_cpu(dev):
+    """Routing-engine CPU utilisation in percent (100 - idle), or None if it cannot be read."""
+    try:
+        reply = dev.rpc.get_route_engine_information()
+    except Exception:
+        return None
+    idle = [int(e.text) for e in reply.iter('cpu-idle') if e.text and e.text.strip().isdigit()]
+    return 100 - min(idle) if idle else None  # Busiest RE when there are two
+
+
+class _Window:
+    """AIMD state of one limit: grows by one per window of good completions, halves on overload."""
+
+    def __init__(self, limit, min_limit, max_limit):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.last_decrease = 0.0
+
+    def increase(self):
+        self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def decrease(self, now, cooldown):
+        # At most one cut per cooldown, so one burst of slow replies does not collapse the limit
+        if now - self.last_decrease >= cooldown:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self.last_decrease = now
+
+    def has_room(self):
+        return self.in_flight < int(self.limit)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limits for device operations, one global and one per device.
+
+    Every operation runs inside slot(device). Fast, successful operations raise the limits additively;
+    timeouts, connection errors, latency above the target or a busy routing engine cut them by half.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, per_device_initial=2, per_device_max=4,
+                 latency_target=5.0, cpu_high=80, cpu_low=50, cooldown=2.0):
+        self.latency_target = latency_target  # Seconds an operation may take before it counts as slow
+        self.cpu_high = cpu_high              # RE CPU (%) at which a device's limit is cut
+        self.cpu_low = cpu_low                # RE CPU (%) below which a device's limit may grow
+        self.cooldown = cooldown
+        self.enabled = True
+        self._global = _Window(initial, min_limit, max_limit)
+        self._device_args = (per_device_initial, 1, per_device_max)
+        self._devices = {}
+        self._cpu = {}      # device -> (sampled at, cpu %)
+        self._condition = threading.Condition()
+        self._held = threading.local()  # Per thread: [device, seconds paused] of each slot it is inside
+        self._stats = {'completed': 0, 'overloads': 0, 'slow': 0, 'cpu_throttles': 0, 'waits': 0}
+
+    def _device(self, device):
+        window = self._devices.get(device)
+        if window is None:
+            window = self._devices[device] = _Window(*self._device_args)
+        return window
+
+    def acquire(self, device):
+        """Block until both the global and the device limit have room."""
+        with self._condition:
+            window = self._device(device)
+            waited = False
+            while self.enabled and not (self._global.has_room() and window.has_room()):
+                waited = True
+                self._condition.wait()
+            self._stats['waits'] += waited
+            self._global.in_flight += 1
+            window.in_flight += 1
+
+    def release(self, device, latency, error=None):
+        """Return a slot and feed the outcome of the operation into both limits."""
+        now = time.monotonic()
+        with self._condition:
+            window = self._device(device)
+            self._global.in_flight -= 1
+            window.in_flight -= 1
+            self._stats['completed'] += 1
+            if error is not None and is_overload_error(error):
+                self._stats['overloads'] += 1
+                self._global.decrease(now, self.cooldown)
+                window.decrease(now, self.cooldown)
+            elif latency > self.latency_target:
+                self._stats['slow'] += 1
+                window.decrease(now, self.cooldown)
+                if latency > 2 * self.latency_target:
+                    self._global.decrease(now, self.cooldown)
+            elif error is None:
+                self._global.increase()
+                cpu = self._cpu.get(device)
+                if cpu is None or cpu[1] is None or cpu[1] < self.cpu_low:
+                    window.increase()
+            self._condition.notify_all()
+
+    def report_cpu(self, device, cpu):
+        """Record a routing-engine CPU sample; a busy RE pins the device to its minimum."""
+        if cpu is None:
+            return
+        with self._condition:
+            self._cpu[device] = (time.monotonic(), cpu)
+            if cpu >= self.cpu_high:
+                self._stats['cpu_throttles'] += 1
+                window = self._device(device)
+                window.limit = window.min_limit
+
+    def maybe_sample_cpu(self, dev):
+        """Sample a connected device's RE CPU if its last sample is older than CPU_SAMPLE_INTERVAL."""
+        device = getattr(dev, '_hostname', None)
+        if device is None or not hasattr(dev, 'rpc'):
+            return
+        with self._condition:
+            sampled = self._cpu.get(device)
+            if sampled and time.monotonic() - sampled[0] < CPU_SAMPLE_INTERVAL:
+                return
+            self._cpu[device] = (time.monotonic(), sampled[1] if sampled else None)  # Claim the sample
+        self.report_cpu(device, sample_re_cpu(dev))
+
+    @contextmanager
+    def slot(self, device):
+        """Run the enclosed device operation under the limits and report its latency and outcome."""
+        self.acquire(device)
+        held = self._held.__dict__.setdefault('slots', [])
+        entry = [device, 0.0]
+        held.append(entry)
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as caught:
+            error = caught
+            raise
+        finally:
+            held.remove(entry)
+            # Time spent in pause() is neither load on the device nor on the global limit
+            self.release(device, time.monotonic() - started - entry[1], error)
+
+    def pause(self, seconds):
+        """Sleep with the calling thread's slots handed back, e.g. during a retry backoff, then retake them."""
+        held = list(self._held.__dict__.get('slots', ()))
+        if held:
+            with self._condition:
+                for device, _ in held:
+                    self._global.in_flight -= 1
+                    self._device(device).in_flight -= 1
+                self._condition.notify_all()
+        started = time.monotonic()
+        time.sleep(seconds)
+        for entry in held:
+            self.acquire(entry[0])
+        paused = time.monotonic() - started
+        for entry in held:
+            entry[1] += paused
+
+    def stats(self):
+        """Counters plus the current global limit and the device limits below their starting value."""
+        with self._condition:
+            throttled = {device: round(w.limit, 1) for device, w in self._devices.items()
+                         if w.limit < self._device_args[0]}
+            return dict(self._stats, global_limit=round(self._global.limit, 1),
+                        in_flight=self._global.in_flight, throttled_devices=throttled)
+
+
+# Limiter shared by every device operation in this process
+limiter = AdaptiveLimiter()
+
+
+def device_key(item):
+    """Limiter key for a Device object or a host IP string."""
+    return getattr(item, '_hostname', None) or str(item)
@@ -0,0 +1,111 @@
+import os
+import gzip
+from datetime import datetime
+from facts_cache import get_hostname
+from utils import run_concurrently
+
+# Committed configuration as Junos stores it, already gzip-compressed
+REMOTE_CONFIG_ARCHIVE = '/config/juniper.conf.gz'
+
+
+def open_sftp(dev):
+    """Open an SFTP channel on the NETCONF session's SSH transport; no second login is needed."""
+    import paramiko
+    # ncclient keeps the paramiko transport of the NETCONF session
+    return paramiko.SFTPClient.from_transport(dev._conn._session._transport)
+
+
+def _download(dev, remote_path, local_path):
+    """Copy remote_path to local_path, preferring SFTP over the session's existing SSH transport."""
+    try:
+        sftp = open_sftp(dev)
+        try:
+            sftp.get(remote_path, local_path)
+        finally:
+            sftp.close()
+    except Exception as sftp_error:
+        # Fall back to PyEZ SCP when the device has no SFTP subsystem
+        from jnpr.junos.utils.scp import SCP
+        try:
+            with SCP(dev) as scp:
+                scp.get(remote_path, local_path=local_path)
+        except Exception as scp_error:
+            raise RuntimeError(f"SFTP failed ({sftp_error}); SCP failed ({scp_error})")
+
+
+def fetch_config_archive(dev, host_name, backup_dir, date_str, remote_path=REMOTE_CONFIG_ARCHIVE):
+    """Transfer the compressed committed config of one device and store it still compressed.
+
+    Returns:
+        str: Path of the stored .conf.gz file.
+    """
+    filepath = os.path.join(backup_dir, f"{host_name}_{date_str}.conf.gz")
+    tmp_path = f"{filepath}.part"
+    try:
+        _download(dev, remote_path, tmp_path)
+        with open(tmp_path, 'rb') as archive:
+            if archive.read(2) != b'\x1f\x8b':
+                raise RuntimeError(f"{remote_path} is not a gzip archive")
+        os.replace(tmp_path, filepath)  # Only complete transfers replace an existing backup
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return filepath
+
+
+def read_config_archive(path):
+    """Yield configuration lines from a stored archive, decompressing only as far as they are read."""
+    with gzip.open(path, 'rt', encoding='utf-8', errors='replace') as archive:
+        for line in archive:
+            yield line.rstrip('\n')
+
+
+def read_config_section(path, section):
+    """Return one top-level stanza (e.g. 'interfaces') from an archive without decompressing the rest.
+
+    Returns:
+        str or None: The stanza text, or None if the section is not present.
+    """
+    lines = []
+    depth = 0
+    for line in read_config_archive(path):
+        stripped = line.strip()
+        if not lines:
+            if depth == 0 and stripped.split(' ', 1)[0] == section and stripped.endswith('{'):
+                lines.append(line)
+                depth = 1
+            else:
+                depth += stripped.count('{') - stripped.count('}')
+            continue
+        lines.append(line)
+        depth += stripped.count('{') - stripped.count('}')
+        if depth == 0:
+            return "\n".join(lines)  # Stop reading; the rest of the archive stays compressed
+    return "\n".join(lines) if lines else None
+
+
+def backup_config_archives(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts,
+                           remote_path=REMOTE_CONFIG_ARCHIVE, max_workers=64, log=print):
+    """Backup device configurations by copying their compressed config archive in parallel."""
+    backup_dir = os.path.join(os.path.dirname(__file__), '../backups')
+    os.makedirs(backup_dir, exist_ok=True)
+
+    connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
+    if not connections:
+        log("No devices connected for backup.")
+        return
+
+    date_str = datetime.now().strftime('%Y%m%d')
+    host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+
+    def transfer(dev):
+        return fetch_config_archive(dev, get_hostname(dev, host_lookup), backup_dir, date_str, remote_path)
+
+    for dev, filepath, error in run_concurrently(connections, transfer, max_workers=max_workers):
+        if error:
+            log(f"Failed to backup {dev.hostname}: {error}")
+        else:
+            log(f"Configuration archive backed up for {dev.hostname} to {filepath} "
+                  f"({os.path.getsize(filepath)} bytes compressed)")
+
+    disconnect_from_hosts(connections)
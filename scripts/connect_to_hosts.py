@@ -1,45 +1,76 @@
 from jnpr.junos import Device  # PyEZ’s Device class for Junos device connections
 from typing import List  # For type hints to improve code clarity
+import time  # For timing connection setup
+from event_log import log_event  # Structured events, written by a background thread
+from utils import run_concurrently  # Adaptive parallel execution
+from resilience import guarded_call, CircuitOpenError  # Retries and per-device circuit breakers
+
+def _open_device(host_ip: str, username: str, password: str) -> Device:
+    """Open one NETCONF session; raises on failure."""
+    # Create a PyEZ with host_ip and authentication details
+    dev = Device(
+        # Host IP address provided from the list
+        host=host_ip,
+        # SSH username
+        user=username,
+        # SSH password
+        password=password,
+        # Default SSH port
+        port=22,
+        # Skip PyEZ facts gathering; facts_cache serves hostname/model/version
+        gather_facts=False
+    )
+    # Attempt to open an SSH connection to the device
+    started = time.monotonic()
+    dev.open()
+    log_event('connect', device=host_ip, duration_s=round(time.monotonic() - started, 3))
+    return dev
 
 def connect_to_hosts(username: str, password: str, host_ips: List[str]) -> List[Device]:
     """Connect to all Junos hosts listed in the provided list of host IPs.
 
+    Sessions are opened in parallel; how many at once is decided by the shared adaptive limiter.
+    Timeouts are retried with backoff, and hosts whose circuit breaker is open are skipped.
+
     Args:
         username (str): SSH username for device authentication.
         password (str): SSH password for device authentication.
         host_ips (list): List of host IPs to connect to.
 
     Returns:
-        list: List of PyEZ Device objects for successfully connected hosts.
+        list: List of PyEZ Device objects for successfully connected hosts, in host_ips order.
     """
-    # Initialize an empty list to store Device objects
-    connections = []
-
-    # Iterate over host ips in the provides list
-    for host_ip in host_ips:
-        try:
-            # Create a PyEZ with host_ip and authentication details
-            dev = Device(
-                # Host IP address provided from the list
-                host=host_ip,
-                # SSH username
-                user=username,
-                # SSH password
-                password=password,
-                # Default SSH port
-                port=22
-            )
-
-            # Attempt to open an SSH connection to the device
-            dev.open()
+    opened = {}
+    # Transient failures are retried with backoff; known-dead hosts are skipped until a probe succeeds
+    connect = lambda ip: guarded_call(ip, lambda: _open_device(ip, username, password))
+    for host_ip, dev, error in run_concurrently(list(host_ips), connect):
+        if error is None:
             # Print success message with the host IP
             print(f"Connected to {host_ip}")
-            # Add connected device to the list
-            connections.append(dev)
-        except Exception as error:
+            opened[host_ip] = dev
+        elif isinstance(error, CircuitOpenError):
+            log_event('skipped', device=host_ip, stage='connect', reason=str(error))
+            print(f"Skipping {host_ip}: {error}")
+        else:
             # Print failure message if connection fails (e.g., timeout, authentication error)
+            log_event('failure', device=host_ip, stage='connect', error=str(error))
             print(f"Failed to connect to {host_ip}: {error}")
-    return connections
+    # Keep the caller's order so output and reports stay stable between runs
+    return [opened[host_ip] for host_ip in host_ips if host_ip in opened]
+
+def open_sessions(host_ip: str, username: str, password: str, count: int) -> List[Device]:
+    """Open extra NETCONF sessions to one device, e.g. to fetch parts of a large table in parallel.
+
+    Sessions that fail to open are left out, so fewer than count may be returned.
+    """
+    sessions = []
+    for _, dev, error in run_concurrently(range(count), lambda _: guarded_call(
+            host_ip, lambda: _open_device(host_ip, username, password)), adaptive=False):
+        if error is None:
+            sessions.append(dev)
+        else:
+            print(f"Failed to open an extra session to {host_ip}: {error}")
+    return sessions
 
 def disconnect_from_hosts(connections: List[Device]):
     """Close all connections to the hosts.
@@ -0,0 +1,272 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import argparse
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from utils import locked_file
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(SCRIPT_DIR, '../logs')
+EVENT_FILE = os.path.join(LOG_DIR, 'events.jsonl')
+INDEX_FILE = os.path.join(LOG_DIR, 'events.index.jsonl')
+
+MAX_BYTES = 20 * 1024 * 1024  # Rotate the active file at this size...
+MAX_AGE = 24 * 3600           # ...or once it is this old, whichever comes first
+RETENTION = 60                # Compressed files kept before the oldest is deleted
+
+_logger = logging.getLogger('network_events')
+_logger.propagate = False
+_listener = None
+_context = {}
+_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format an event record as one JSON object per line."""
+
+    def format(self, record):
+        event = {'time': datetime.fromtimestamp(record.created).isoformat(sep=' ', timespec='milliseconds'),
+                 'event': record.getMessage()}
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, default=str)
+
+
+class IndexedRotatingHandler(RotatingFileHandler):
+    """Size/age-rotated JSON-lines file; rotated files are gzip-compressed and summarized in an index.
+
+    Each rotated file gets a uniquely named archive (events-<first event time>.jsonl.gz) and one index
+    line with its time range, devices (IPs and host names) and change numbers, so queries open only
+    relevant archives. The summary covers the whole file: events left in it by earlier runs are read back on open, and
+    the file's age is that of its first event.
+
+    Several processes (e.g. job_queue workers) may log to the same file. Writes and rotation take turns
+    under a file lock, and a process whose file was rotated by another follows it to the new file.
+    """
+
+    def __init__(self, filename, max_bytes=MAX_BYTES, max_age=MAX_AGE, retention=RETENTION):
+        super().__init__(filename, maxBytes=max_bytes, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        self.retention = retention
+        self._stem = os.path.splitext(self.baseFilename)[0]  # .../events -> events-<time>.jsonl.gz, events.index.jsonl
+        self._file = None  # (device, inode) of the file the summary describes
+        self._reset_summary()
+        self._load_summary()
+
+    def _current_file(self):
+        try:
+            stat = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _reset_summary(self):
+        self._summary = {'start': None, 'end': None, 'devices': set(), 'changes': set(), 'count': 0}
+
+    def _account(self, created, fields):
+        summary = self._summary
+        summary['start'] = summary['start'] or created
+        summary['end'] = created
+        summary['count'] += 1
+        for key in ('device', 'host_name'):  # Queries may name a device by either
+            if fields.get(key):
+                summary['devices'].add(fields[key])
+        if fields.get('change'):
+            summary['changes'].add(fields['change'])
+
+    def _load_summary(self):
+        """Summarize events already in the active file, e.g. appended by an earlier run or another process."""
+        self._file = self._current_file()
+        if self._file is None:
+            return
+        with open(self.baseFilename, 'r', encoding='utf-8', errors='replace') as events:
+            for line in events:
+                try:
+                    event = json.loads(line)
+                    created = datetime.fromisoformat(event['time']).timestamp()
+                except (ValueError, KeyError, TypeError):
+                    continue  # Torn last line of a crashed run
+                self._account(created, event)
+
+    def emit(self, record):
+        with locked_file(self.baseFilename):
+            if self._current_file() != self._file:
+                # Rotated or created by another process: stop writing to the removed file
+                if self.stream:
+                    self.stream.close()
+                    self.stream = None
+                self._reset_summary()
+                self._load_summary()
+            super().emit(record)
+            self._account(record.created, getattr(record, 'fields', {}))
+            self._file = self._current_file()
+
+    def shouldRollover(self, record):
+        if self._summary['count'] and time.time() - self._summary['start'] >= self.max_age:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        # Other processes append to the file too, so the index is built from the file itself
+        self._reset_summary()
+        self._load_summary()
+        summary = self._summary
+        if summary['count'] and os.path.exists(self.baseFilename):
+            archive = f"{self._stem}-{datetime.fromtimestamp(summary['start']):%Y%m%d_%H%M%S_%f}.jsonl.gz"
+            with open(self.baseFilename, 'rb') as source, gzip.open(archive, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(self.baseFilename)
+            with open(f"{self._stem}.index.jsonl", 'a') as index:
+                index.write(json.dumps({'file': os.path.basename(archive), 'start': summary['start'],
+                                        'end': summary['end'], 'count': summary['count'],
+                                        'devices': sorted(summary['devices']),
+                                        'changes': sorted(summary['changes'])}) + "\n")
+            self._prune()
+        self._reset_summary()
+
+    def _prune(self):
+        archives = sorted(glob.glob(f"{glob.escape(self._stem)}-*.jsonl.gz"))
+        for archive in archives[:-self.retention] if self.retention else []:
+            os.remove(archive)
+
+
+def start(filename=EVENT_FILE):
+    """Start the background writer thread (called automatically by log_event)."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        handler = IndexedRotatingHandler(os.path.abspath(filename))
+        handler.setFormatter(JsonLinesFormatter())
+        events = queue.SimpleQueue()
+        _logger.addHandler(QueueHandler(events))
+        _logger.setLevel(logging.INFO)
+        # The listener thread does all file I/O; callers only enqueue
+        _listener = QueueListener(events, handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(stop)
+
+
+def stop():
+    """Flush queued events and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+        _listener = None
+
+
+def set_context(**fields):
+    """Attach fields (e.g. change='CHG0123456') to every subsequent event; None removes a field."""
+    for key, value in fields.items():
+        if value is None:
+            _context.pop(key, None)
+        else:
+            _context[key] = value
+
+
+def log_event(event, **fields):
+    """Queue a structured event such as 'connect', 'rpc', 'diff', 'commit' or 'failure'.
+
+    Never blocks on disk: the record is handed to the background writer thread.
+    """
+    if _listener is None:
+        start()
+    _logger.info(event, extra={'fields': dict(_context, **fields)})
+
+
+def _matches(event, device, change, name, since, until):
+    if device and device not in (event.get('device'), event.get('host_name')):
+        return False
+    if change and event.get('change') != change:
+        return False
+    if name and event.get('event') != name:
+        return False
+    if since and event.get('time', '') < since:
+        return False
+    if until and event.get('time', '') > until:
+        return False
+    return True
+
+
+def query(device=None, change=None, event=None, since=None, until=None, log_dir=LOG_DIR):
+    """Yield events matching the filters, using the index to skip archives that cannot match.
+
+    Args:
+        device (str): Device IP, or host name for events that carry one (backups, diffs, logs).
+        change (str): Change number, e.g. 'CHG0123456'.
+        event (str): Event name, e.g. 'commit'.
+        since (datetime): Earliest event time.
+        until (datetime): Latest event time.
+    """
+    since_ts = since.timestamp() if since else None
+    until_ts = until.timestamp() if until else None
+    since_str = since.isoformat(sep=' ') if since else None
+    until_str = until.isoformat(sep=' ') if until else None
+
+    files = []
+    index_file = os.path.join(log_dir, os.path.basename(INDEX_FILE))
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as index:
+            for line in index:
+                entry = json.loads(line)
+                if device and device not in entry['devices']:
+                    continue
+                if change and change not in entry['changes']:
+                    continue
+                if (since_ts and entry['end'] < since_ts) or (until_ts and entry['start'] > until_ts):
+                    continue
+                path = os.path.join(log_dir, entry['file'])
+                if os.path.exists(path):
+                    files.append(path)
+    active = os.path.join(log_dir, os.path.basename(EVENT_FILE))
+    if os.path.exists(active):
+        files.append(active)
+
+    for path in files:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial line from a crash
+                if _matches(record, device, change, event, since_str, until_str):
+                    yield record
+
+
+def main():
+    """Query the structured event log."""
+    parser = argparse.ArgumentParser(description='Query the structured event log')
+    parser.add_argument('--device', help='Device IP or host name')
+    parser.add_argument('--change', help='Change number, e.g. CHG0123456')
+    parser.add_argument('--event', help='Event name: connect, rpc, diff, commit, failure, ...')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='Start time, e.g. 2025-04-09T18:00')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='End time')
+    args = parser.parse_args()
+
+    count = 0
+    for record in query(device=args.device, change=args.change, event=args.event, since=args.since, until=args.until):
+        sys.stdout.write(json.dumps(record) + "\n")
+        count += 1
+    print(f"{count} events", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
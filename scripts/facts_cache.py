@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import threading
+from utils import update_json_file
+
+# On-disk facts cache, keyed by host IP
+FACTS_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../cache/facts_cache.json')
+DEFAULT_TTL = 24 * 3600  # Seconds before cached facts are re-validated against the device
+
+_cache = None
+_lock = threading.Lock()
+
+
+def _load_cache():
+    """Load the facts cache from disk once per process."""
+    global _cache
+    if _cache is None:
+        try:
+            with open(FACTS_CACHE_FILE, 'r') as cache_file:
+                _cache = json.load(cache_file)
+        except FileNotFoundError:
+            _cache = {}
+        except (json.JSONDecodeError, OSError) as error:
+            print(f"Warning: Ignoring unreadable facts cache '{FACTS_CACHE_FILE}': {error}")
+            _cache = {}
+    return _cache
+
+
+def _update_cache(update):
+    """Apply update(cache) to the file under its cross-process lock, then keep the result in memory.
+
+    The file is re-read first, so entries saved by other processes (job workers, the daemon) are kept.
+    """
+    global _cache
+    _cache = update_json_file(FACTS_CACHE_FILE, update)
+
+
+def _text(reply, xpath, default='Unknown'):
+    found = reply.xpath(xpath)
+    return found[0].text.strip() if found and found[0].text else default
+
+
+def fetch_facts(dev):
+    """Fetch hostname, model, version and serial number with two RPCs instead of full PyEZ facts."""
+    software = dev.rpc.get_software_information()
+    version = _text(software, './/junos-version')
+    if version == 'Unknown':
+        # Older releases only carry the version inside the package comment, e.g. "JUNOS Software Release [12.1X46-D86]"
+        comment = _text(software, './/package-information/comment', '')
+        if '[' in comment:
+            version = comment[comment.find('[') + 1:comment.find(']')]
+    chassis = dev.rpc.get_chassis_inventory()
+    return {
+        'hostname': _text(software, './/host-name', 'unknown_host'),
+        'model': _text(software, './/product-model'),
+        'version': version,
+        'serial_number': _text(chassis, './/chassis/serial-number')
+    }
+
+
+def update_facts(host_ip, facts):
+    """Store freshly collected facts for host_ip, noting when serial number or version changed.
+
+    Returns:
+        bool: True if the cached entry was invalidated by a serial/version change.
+    """
+    changed = False
+
+    def store(cache):
+        nonlocal changed
+        previous = cache.get(host_ip)
+        changed = bool(previous) and (previous.get('serial_number') != facts.get('serial_number') or
+                                      previous.get('version') != facts.get('version'))
+        if changed:
+            print(f"Facts changed for {host_ip}: serial {previous.get('serial_number')} -> {facts.get('serial_number')}, "
+                  f"version {previous.get('version')} -> {facts.get('version')}")
+        entry = dict(facts)
+        entry['updated'] = time.time()
+        if changed or not previous:
+            entry['changed'] = entry['updated']
+        else:
+            entry['changed'] = previous.get('changed', entry['updated'])
+        cache[host_ip] = entry
+
+    with _lock:
+        _update_cache(store)
+    return changed
+
+
+def get_device_facts(dev, ttl=DEFAULT_TTL):
+    """Return cached facts for dev, refreshing them from the device when older than ttl.
+
+    Args:
+        dev (Device): Connected PyEZ Device (opened with gather_facts=False).
+        ttl (int): Maximum age in seconds of a cached entry; 0 forces a refresh.
+    Returns:
+        dict: hostname, model, version and serial_number.
+    """
+    host_ip = dev._hostname
+    with _lock:
+        entry = _load_cache().get(host_ip)
+    if entry and time.time() - entry.get('updated', 0) < ttl:
+        return entry
+    facts = fetch_facts(dev)
+    update_facts(host_ip, facts)
+    return facts
+
+
+def get_hostname(dev, host_lookup=None):
+    """Resolve a device name: inventory name first, then the cached device hostname, then the IP."""
+    if host_lookup and dev._hostname in host_lookup:
+        return host_lookup[dev._hostname]
+    try:
+        return get_device_facts(dev).get('hostname', dev._hostname)
+    except Exception as error:
+        print(f"Failed to look up hostname for {dev._hostname}: {error}")
+        return dev._hostname
+
+
+def invalidate(host_ip=None):
+    """Drop cached facts for one host, or for every host when host_ip is None."""
+    def drop(cache):
+        if host_ip is None:
+            cache.clear()
+        else:
+            cache.pop(host_ip, None)
+
+    with _lock:
+        _update_cache(drop)
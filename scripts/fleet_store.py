@@ -0,0 +1,329 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from route_table import Interner
+
+FLEET_DIR = os.path.join(SCRIPT_DIR, '../fleet')
+BASELINE_DIR = os.path.join(SCRIPT_DIR, '../baselines')
+
+# baselines/<host>/<host>_<YYYYmmdd_HHMMSS>_baseline.json as written by baseline.save_baseline
+_BASELINE_RE = re.compile(r'^(?P<host>.+)_(?P<ts>\d{8}_\d{6})_baseline\.json$')
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+# Columns per table after the common (ts, device) pair; 'str' columns hold IDs into the shared string table
+SCHEMAS = {
+    'facts': [('model', 'str'), ('version', 'str'), ('serial_number', 'str'),
+              ('temperature_c', 'f4'), ('cpu_load', 'f4')],
+    'optics': [('interface', 'str'), ('rx_dbm', 'f4'), ('tx_dbm', 'f4')],
+    'bgp_peers': [('peer_address', 'str'), ('peer_as', 'str'), ('state', 'str'), ('up_time', 'str')],
+    'ospf_neighbors': [('neighbor_address', 'str'), ('interface', 'str'), ('state', 'str')],
+    'ospf_interfaces': [('interface', 'str'), ('area', 'str'), ('state', 'str')],
+    'interfaces': [('interface', 'str'), ('description', 'str')],
+}
+
+_OPERATORS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+              '==': np.equal, '!=': np.not_equal}
+_WHERE_RE = re.compile(r'^(\w+)\s*(<=|>=|==|!=|<|>)\s*(.+)$')
+
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+def _dtype(table):
+    fields = [('ts', '<i8'), ('device', '<u4')]
+    fields += [(name, '<u4' if kind == 'str' else kind) for name, kind in SCHEMAS[table]]
+    return np.dtype(fields)
+
+
+def _number(value):
+    """First number in a value such as '-3.50' or '40 degrees C / 104 degrees F'; NaN when there is none."""
+    match = _NUMBER_RE.search(str(value)) if value is not None else None
+    return float(match.group()) if match else np.nan
+
+
+def _items(value):
+    """Baseline sections hold a list, or a string such as 'No BGP peers' when there is nothing."""
+    return value if isinstance(value, list) else []
+
+
+def extract_rows(baseline_data):
+    """Flatten one baseline dict into {table: [tuple of column values]} with raw (uninterned) strings."""
+    general = baseline_data.get('general_info', {})
+    facts = general.get('facts', {})
+    environmental = general.get('environmental', {})
+    rows = {table: [] for table in SCHEMAS}
+    if facts:
+        rows['facts'].append((facts.get('model'), facts.get('version'), facts.get('serial_number'),
+                              _number(environmental.get('temperature')), _number(environmental.get('cpu_load'))))
+    for xcvr in _items(general.get('transceivers')):
+        rows['optics'].append((xcvr.get('interface'), _number(xcvr.get('rx_power_dbm')),
+                               _number(xcvr.get('tx_power_dbm'))))
+    for peer in _items(baseline_data.get('bgp', {}).get('summary')):
+        rows['bgp_peers'].append((peer.get('peer_address'), peer.get('peer_as'), peer.get('state'),
+                                  peer.get('up_time')))
+    ospf = baseline_data.get('ospf', {})
+    for neighbor in _items(ospf.get('neighbors')):
+        rows['ospf_neighbors'].append((neighbor.get('neighbor_address'), neighbor.get('interface'),
+                                       neighbor.get('state')))
+    for interface in _items(ospf.get('interfaces')):
+        rows['ospf_interfaces'].append((interface.get('interface_name'), interface.get('area'),
+                                        interface.get('state')))
+    descriptions = baseline_data.get('interfaces', {}).get('descriptions')
+    if isinstance(descriptions, dict):
+        rows['interfaces'].extend(descriptions.items())
+    return rows
+
+
+class FleetStore:
+    """Columnar store of baseline records, partitioned by date and device.
+
+    Layout: fleet/<table>/<YYYYmmdd>/<device>.npy (one structured array per table, day and device,
+    one column per field) and fleet/strings.json (persistent IDs for every string value). A fleet-wide
+    query loads only the day partitions in range and filters whole columns at once.
+    """
+
+    def __init__(self, root=FLEET_DIR):
+        self.root = root
+        self.strings = Interner()
+        self._strings_file = os.path.join(root, 'strings.json')
+        self._strings_saved = 0
+        self._lock = threading.Lock()
+        if os.path.exists(self._strings_file):
+            with open(self._strings_file, 'r') as f:
+                for value in json.load(f):
+                    self.strings.intern(value)
+            self._strings_saved = len(self.strings)
+
+    def _save_strings(self):
+        if self._strings_saved == len(self.strings):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_file = f"{self._strings_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.strings.strings, f)
+        os.replace(tmp_file, self._strings_file)
+        self._strings_saved = len(self.strings)
+
+    def _intern(self, value):
+        return self.strings.intern('' if value is None else str(value))
+
+    def ingest(self, baseline_data, device, timestamp):
+        """Add one device's baseline to the store; a capture already stored for that time is skipped.
+
+        Args:
+            baseline_data (dict): Baseline as saved by baseline.save_baseline.
+            device (str): Device host name.
+            timestamp (datetime): Capture time.
+        Returns:
+            int: Rows written across all tables.
+        """
+        ts = int(timestamp.timestamp())
+        written = 0
+        with self._lock:
+            device_id = self._intern(device)
+            partitions = {}
+            for table, values in extract_rows(baseline_data).items():
+                if not values:
+                    continue
+                dtype = _dtype(table)
+                rows = np.zeros(len(values), dtype=dtype)
+                rows['ts'] = ts
+                rows['device'] = device_id
+                for column, (name, kind) in enumerate(SCHEMAS[table]):
+                    column_values = [row[column] for row in values]
+                    rows[name] = [self._intern(v) for v in column_values] if kind == 'str' else column_values
+                partitions[table] = rows
+            self._save_strings()  # Strings must be durable before rows refer to them
+
+            for table, rows in partitions.items():
+                partition_dir = os.path.join(self.root, table, f"{timestamp:%Y%m%d}")
+                os.makedirs(partition_dir, exist_ok=True)
+                path = os.path.join(partition_dir, f"{_safe_name(device)}.npy")
+                stored = rows
+                if os.path.exists(path):
+                    existing = np.load(path)
+                    if (existing['ts'] == ts).any():
+                        continue  # Already ingested (e.g. a backfill rerun)
+                    stored = np.concatenate([existing, rows])
+                tmp_file = f"{path}.tmp.npy"
+                np.save(tmp_file, stored)
+                os.replace(tmp_file, path)
+                written += len(rows)
+        return written
+
+    def load(self, table, device=None, since=None, until=None):
+        """Raw rows (structured array) of every partition of a table that can hold rows in the time range.
+
+        String columns are IDs into self.strings; the day partitions are filtered, individual rows are not.
+        """
+        first_day = f"{since:%Y%m%d}" if since else None
+        last_day = f"{until:%Y%m%d}" if until else None
+        table_dir = os.path.join(self.root, table)
+        parts = []
+        if os.path.isdir(table_dir):
+            for day in sorted(os.listdir(table_dir)):
+                if (first_day and day < first_day) or (last_day and day > last_day):
+                    continue
+                pattern = f"{_safe_name(device)}.npy" if device else '*.npy'
+                for path in glob.glob(os.path.join(table_dir, day, pattern)):
+                    if not path.endswith('.tmp.npy'):  # Skip a write interrupted before its rename
+                        parts.append(np.load(path))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=_dtype(table))
+
+    def query(self, table, where=None, device=None, since=None, until=None, latest=False):
+        """Return rows of a table matching every filter.
+
+        Args:
+            table (str): One of SCHEMAS, e.g. 'optics' or 'bgp_peers'.
+            where (list): (column, operator, value) filters, e.g. [('rx_dbm', '<', -20)].
+            device (str): Device host name.
+            since (datetime): Earliest capture time (inclusive).
+            until (datetime): Latest capture time (inclusive).
+            latest (bool): Keep only each device's most recent capture in the range.
+        Returns:
+            list: Row dicts with time, device and the table's columns.
+        """
+        if table not in SCHEMAS:
+            raise ValueError(f"Unknown table '{table}'; expected one of {', '.join(SCHEMAS)}")
+        kinds = dict(SCHEMAS[table])
+        rows = self.load(table, device, since, until)
+        mask = np.ones(len(rows), dtype=bool)
+        if since:
+            mask &= rows['ts'] >= int(since.timestamp())
+        if until:
+            mask &= rows['ts'] <= int(until.timestamp())
+        if latest and len(rows):
+            newest = np.zeros(int(rows['device'].max()) + 1, dtype=np.int64)
+            np.maximum.at(newest, rows['device'][mask], rows['ts'][mask])
+            mask &= rows['ts'] == newest[rows['device']]
+        for column, operator, value in where or []:
+            if column not in kinds:
+                raise ValueError(f"Unknown column '{column}' for table '{table}'")
+            if kinds[column] == 'str':
+                if operator not in ('==', '!='):
+                    raise ValueError(f"Only == and != apply to text column '{column}'")
+                value_id = self.strings.ids.get(str(value))
+                if value_id is None:
+                    mask &= operator == '!='  # Value never seen: nothing equals it
+                    continue
+                value = value_id
+            else:
+                value = float(value)
+            mask &= _OPERATORS[operator](rows[column], value)
+
+        selected = rows[mask]
+        strings = np.array(self.strings.strings, dtype=object)
+        columns = {'device': strings[selected['device']] if len(selected) else []}
+        for name, kind in SCHEMAS[table]:
+            if kind == 'str':
+                columns[name] = strings[selected[name]] if len(selected) else []
+            else:
+                columns[name] = selected[name].astype(np.float64).round(3).tolist()  # Drop float32 noise
+        results = []
+        for index, ts in enumerate(selected['ts'].tolist()):
+            record = {'time': datetime.fromtimestamp(ts).isoformat(sep=' ')}
+            for name, values in columns.items():
+                value = values[index]
+                record[name] = None if isinstance(value, float) and np.isnan(value) else value
+            results.append(record)
+        results.sort(key=lambda record: (record['time'], record['device']))
+        return results
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide store, opened on first use."""
+    global _store
+    if _store is None:
+        _store = FleetStore()
+    return _store
+
+
+def ingest_baseline(baseline_data, hostname, timestamp):
+    """Hook for baseline.save_baseline: add a freshly saved baseline to the fleet store.
+
+    Args:
+        timestamp (str): Capture time as used in baseline filenames ('%Y%m%d_%H%M%S').
+    """
+    return get_store().ingest(baseline_data, hostname, datetime.strptime(timestamp, '%Y%m%d_%H%M%S'))
+
+
+def ingest_baseline_dir(store, baseline_dir=BASELINE_DIR):
+    """Backfill the store from every JSON baseline saved under baselines/."""
+    for path in sorted(glob.glob(os.path.join(baseline_dir, '*', '*_baseline.json'))):
+        match = _BASELINE_RE.match(os.path.basename(path))
+        if not match:
+            continue
+        with open(path, 'r') as f:
+            baseline_data = json.load(f)
+        rows = store.ingest(baseline_data, match['host'], datetime.strptime(match['ts'], '%Y%m%d_%H%M%S'))
+        print(f"Ingested {os.path.basename(path)}: {rows} rows")
+
+
+def _parse_where(text):
+    match = _WHERE_RE.match(text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Expected <column><op><value>, e.g. rx_dbm<-20, got '{text}'")
+    return match.group(1), match.group(2), match.group(3).strip()
+
+
+def main():
+    """Query or backfill the columnar fleet store."""
+    parser = argparse.ArgumentParser(description='Fleet-wide baseline analytics')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('ingest', help='Backfill the store from baselines/*/*.json')
+    query = subparsers.add_parser('query', help='Query one table across the fleet')
+    query.add_argument('table', nargs='?', choices=list(SCHEMAS), help='Table to query')
+    query.add_argument('--where', type=_parse_where, action='append', default=[],
+                       help="Filter such as 'rx_dbm<-20' or 'state!=Established' (repeatable)")
+    query.add_argument('--device', help='Device host name')
+    query.add_argument('--since', type=datetime.fromisoformat, help='Start time, e.g. 2025-04-09T18:00')
+    query.add_argument('--until', type=datetime.fromisoformat, help='End time')
+    query.add_argument('--latest', action='store_true', help="Only each device's most recent capture")
+    query.add_argument('--optics-rx-below', type=float, metavar='DBM',
+                       help='Shortcut: optics with rx power below DBM')
+    query.add_argument('--bgp-not-established', action='store_true',
+                       help='Shortcut: BGP peers not in Established state')
+    args = parser.parse_args()
+
+    store = FleetStore()
+    if args.command == 'ingest':
+        ingest_baseline_dir(store)
+        return
+
+    table, where = args.table, list(args.where)
+    if args.optics_rx_below is not None:
+        table = 'optics'
+        where.append(('rx_dbm', '<', args.optics_rx_below))
+    if args.bgp_not_established:
+        table = 'bgp_peers'
+        where.append(('state', '!=', 'Established'))
+    if table is None:
+        parser.error('a table or a shortcut option is required')
+
+    started = datetime.now()
+    rows = store.query(table, where=where, device=args.device, since=args.since, until=args.until,
+                       latest=args.latest)
+    columns = ['device'] + [name for name, _ in SCHEMAS[table]]
+    for row in rows:
+        print(f"{row['time']}  " + "  ".join(f"{row[name] if row[name] is not None else 'N/A'!s:<16}"
+                                            for name in columns))
+    elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+    print(f"{len(rows)} rows in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
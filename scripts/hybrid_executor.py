@@ -0,0 +1,206 @@
+import io
+import os
+import sys
+import signal
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_MEMORY_MIN = 64 * 1024  # Payloads at least this large go through shared memory, not the pipe
+
+
+class SharedPayload:
+    """Picklable handle of reply bytes placed in a shared memory block by the parent process."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def share(data):
+    """Make bytes available to a pool process.
+
+    Small payloads are simply pickled. Large ones are copied once into a shared memory block, so only
+    its name crosses the pipe and the pool process reads the bytes in place.
+
+    Returns:
+        tuple: (payload to pass to the task, SharedMemory block to release afterwards or None).
+    """
+    view = memoryview(data).cast('B')
+    if view.nbytes < SHARED_MEMORY_MIN:
+        return bytes(view), None
+    block = shared_memory.SharedMemory(create=True, size=view.nbytes)
+    block.buf[:view.nbytes] = view
+    return SharedPayload(block.name, view.nbytes), block
+
+
+class _BufferReader(io.RawIOBase):
+    """Read-only file object over a memoryview; each read copies only what the parser asks for."""
+
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self._view) - self._position)
+        buffer[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+
+def _attach(name):
+    """Open an existing shared memory block; the parent process owns and unlinks it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Older Pythons register the attach with the resource tracker, but pool processes share the
+        # parent's tracker, so the parent's unlink clears that registration too
+        return shared_memory.SharedMemory(name=name)
+
+
+@contextmanager
+def open_payload(payload):
+    """Binary file object over a payload from share(), for use inside a pool task."""
+    if not isinstance(payload, SharedPayload):
+        yield io.BytesIO(payload)  # Shares the bytes object until written to
+        return
+    block = _attach(payload.name)
+    view = block.buf[:payload.size]
+    try:
+        yield io.BufferedReader(_BufferReader(view))
+    finally:
+        view.release()
+        block.close()
+
+
+def _init_worker():
+    """Pool process setup: Ctrl+C is handled by the parent, and scripts/ must be importable."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+
+
+class HybridExecutor:
+    """Device I/O on threads, CPU-heavy parse, diff and serialize steps in a process pool.
+
+    Devices are still polled from thread pools (iter_concurrently, run_concurrently). A thread that
+    has a raw reply calls run() or submit(); the work goes to a pool process and the thread waits on
+    the result without holding the GIL, so other threads keep talking to devices while every core
+    parses. Reply bytes are handed over through share().
+
+    Pool processes are spawned rather than forked: forking while device threads hold locks can
+    leave a child stuck on a lock nobody will release.
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                         mp_context=multiprocessing.get_context('spawn'))
+        self._lock = threading.Lock()
+        self._stats = {'tasks': 0, 'shared_bytes': 0, 'pickled_bytes': 0}
+
+    def submit(self, task, data, *args):
+        """Run task(payload, *args) in the pool, payload being data (bytes or None) handed over with share().
+
+        Returns:
+            Future: Result of the task; the shared memory block is released once it completes.
+        """
+        payload, block = (None, None) if data is None else share(data)
+        with self._lock:
+            self._stats['tasks'] += 1
+            if data is not None:
+                self._stats['shared_bytes' if block else 'pickled_bytes'] += memoryview(data).nbytes
+        try:
+            future = self._pool.submit(task, payload, *args)
+        except Exception:
+            if block is not None:
+                block.close()
+                block.unlink()
+            raise
+        if block is not None:
+            future.add_done_callback(lambda _: (block.close(), block.unlink()))
+        return future
+
+    def run(self, task, data, *args):
+        """submit() and wait for the result; raises what the task raised."""
+        return self.submit(task, data, *args).result()
+
+    def stats(self):
+        """Return task count and bytes handed over through shared memory and through the pipe."""
+        with self._lock:
+            return dict(self._stats, processes=self.processes)
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Pool tasks. Each takes a payload from share() first and returns only plain data or NumPy arrays,
+# since lxml trees and interner IDs of a pool process mean nothing in the parent.
+
+def _reply_root(source):
+    """Parse a raw NETCONF reply into the element dev.rpc.<name>() would have returned."""
+    from lxml import etree
+    root = etree.parse(source).getroot()
+    # PyEZ strips namespaces and the <rpc-reply> wrapper; the baseline parsers rely on both
+    for element in root.iter():
+        if isinstance(element.tag, str):
+            element.tag = etree.QName(element).localname
+    etree.cleanup_namespaces(root)
+    return root[0] if root.tag == 'rpc-reply' and len(root) == 1 else root
+
+
+def parse_reply(payload, parser):
+    """Pool task: run a baseline parser (by PARSERS name) over a raw RPC reply."""
+    from baseline import PARSERS
+    with open_payload(payload) as source:
+        return PARSERS[parser](_reply_root(source))
+
+
+def parse_route_xml(payload):
+    """Pool task: raw get-route-information reply -> portable RouteTable (see RouteTable.to_portable)."""
+    from route_table import RouteTable
+    with open_payload(payload) as source:
+        return RouteTable.from_xml_stream(source).to_portable()
+
+
+def diff_route_text(payload, previous=None):
+    """Pool task: parse 'show route' text and diff it against the previous snapshot, if any.
+
+    Args:
+        payload: UTF-8 'show route table X' output from share().
+        previous (tuple): Portable RouteTable of the last capture, or None.
+    Returns:
+        tuple: Portable (table, added, removed); added and removed are None without previous.
+    """
+    from route_table import RouteTable
+    with open_payload(payload) as source:
+        table = RouteTable.from_text(source.read().decode('utf-8'))
+    if previous is None:
+        return table.to_portable(), None, None
+    added, removed = RouteTable.from_portable(previous).diff(table)
+    return table.to_portable(), added.to_portable(), removed.to_portable()
+
+
+def write_baseline_files(payload, baseline_data, hostname, host_ip, baseline_dir, timestamp):
+    """Pool task: JSON/YAML/TXT serialization of one baseline (payload unused, pass None)."""
+    from baseline import write_baseline_files as write
+    return write(baseline_data, hostname, host_ip, baseline_dir, timestamp)
+
+
+def parse_interface_xml(payload):
+    """Pool task: raw get-interface-information extensive reply -> (names, speeds, counters) arrays."""
+    from interface_monitor import parse_counters
+    with open_payload(payload) as source:
+        return parse_counters(source)
@@ -1,9 +1,17 @@
 from jnpr.junos.utils.config import Config
 from jnpr.junos.exception import RpcTimeoutError
 from utils import render_template, check_config
+from rpc_cache import rpc_cache
+from event_log import log_event
+from push_ledger import config_hash, config_version, is_unchanged, record_push
 
-def configure_interfaces(username, password, host_ips, hosts, template_name, connect_to_hosts, disconnect_from_hosts):
-    """Apply interface configurations to specified devices."""
+def configure_interfaces(username, password, host_ips, hosts, template_name, connect_to_hosts, disconnect_from_hosts,
+                         change_number='CHG0123456', force=False):
+    """Apply interface configurations to specified devices.
+
+    Devices whose rendered config and running config are unchanged since their last push are skipped
+    unless force is set.
+    """
     # Connect to all specified devices
     connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
     if not connections:
@@ -12,6 +20,7 @@ def configure_interfaces(username, password, host_ips, hosts, template_name, con
 
     # Create a lookup dictionary for host data by IP
     host_lookup = {h['ip_address']: h for h in hosts}
+    unchanged = 0
     for dev in connections:
         # Get config data for this device
         host_data = host_lookup.get(dev.hostname)
@@ -24,6 +33,12 @@ def configure_interfaces(username, password, host_ips, hosts, template_name, con
             if not config:
                 print(f"Failed to render template for {dev.hostname}. Skipping.")
                 continue
+            # Fast path: same intent as the last successful push and nobody has committed since
+            rendered_hash = config_hash(config)
+            if not force and is_unchanged(dev.hostname, template_name, rendered_hash, config_version(dev)):
+                unchanged += 1
+                print(f"Interfaces on {dev.hostname} unchanged since last push. Skipping.")
+                continue
             # Show the config to be applied
             print(f"\nConfiguration to be applied to {dev.hostname} ({dev.hostname}):\n{config}")
             # Validate the config
@@ -35,15 +50,22 @@ def configure_interfaces(username, password, host_ips, hosts, template_name, con
             # Apply and commit the config
             configuration = Config(dev)
             configuration.load(config, format='set', merge=False)
-            configuration.commit(comment="Change CHG0123456 - interfaces", timeout=120)  # 120s timeout
+            configuration.commit(comment=f"Change {change_number} - interfaces", timeout=120)  # 120s timeout
+            rpc_cache.invalidate(dev._hostname)  # Cached config/state is stale after a commit
+            record_push(dev.hostname, template_name, rendered_hash, config_version(dev), change_number)
+            log_event('commit', device=dev.hostname, change=change_number, scope='interfaces')
             print(f"Interfaces configured on {dev.hostname}")
         except RpcTimeoutError as error:
             # Handle timeout during commit
+            log_event('failure', device=dev.hostname, change=change_number, stage='commit', scope='interfaces', error=str(error))
             print(f"Timeout during commit to {dev.hostname}: {error}")
             print("Config may have applied; verify on device.")
         except Exception as error:
             # Handle other errors
+            log_event('failure', device=dev.hostname, change=change_number, stage='configure', scope='interfaces', error=str(error))
             print(f"Failed to configure interfaces on {dev.hostname}: {error}")
 
+    print(f"{unchanged} of {len(connections)} devices unchanged since their last push and skipped.")
+
     # Disconnect from all devices
     disconnect_from_hosts(connections)
@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import time
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+import numpy as np
+
+from event_log import log_event
+from facts_cache import get_hostname
+from utils import iter_concurrently, raw_rpc_reply
+from resilience import guarded_poll, CircuitOpenError
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_FILE = os.path.join(SCRIPT_DIR, '../logs/interface_alerts.log')
+REPORT_DIR = os.path.join(SCRIPT_DIR, '../reports')
+
+DEPTH = 10              # Samples kept per interface; the spike baseline spans this many polls
+SPIKE_FACTOR = 5.0      # An error rate this many times the interface's own baseline is a spike...
+MIN_SPIKE_ERRORS = 10   # ...provided at least this many errors arrived since the previous poll
+
+# Counter columns and where each is found under <physical-interface> in get-interface-information extensive
+COUNTERS = (
+    ('in_octets', 'traffic-statistics/input-bytes'),
+    ('out_octets', 'traffic-statistics/output-bytes'),
+    ('in_packets', 'traffic-statistics/input-packets'),
+    ('out_packets', 'traffic-statistics/output-packets'),
+    ('in_errors', 'input-error-list/input-errors'),
+    ('out_errors', 'output-error-list/output-errors'),
+    ('in_drops', 'input-error-list/input-drops'),
+    ('out_drops', 'output-error-list/output-drops'),
+    ('in_discards', 'input-error-list/input-discards'),
+    ('crc_errors', 'ethernet-mac-statistics/input-crc-errors'),
+)
+COLUMN = {name: index for index, (name, _) in enumerate(COUNTERS)}
+SPIKE_COUNTERS = ('crc_errors', 'in_discards', 'in_drops', 'out_drops')
+
+_SPEED_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*([kmgt]?)bps$', re.IGNORECASE)
+_SPEED_UNITS = {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9, 't': 1e12}
+_WRAP32 = np.uint64(1 << 32)
+_WRAP64_ZONE = np.uint64(1 << 63)  # A 64-bit counter that drops from up here has wrapped, not reset
+
+
+def parse_speed(text):
+    """Interface speed ('10Gbps', '1000mbps') in bit/s; 0 when unknown ('Auto', 'Unlimited')."""
+    match = _SPEED_RE.match((text or '').strip())
+    return float(match.group(1)) * _SPEED_UNITS[match.group(2).lower()] if match else 0.0
+
+
+def _counter(element, path):
+    text = element.findtext(path)
+    return int(text) if text and text.strip().isdigit() else 0
+
+
+def iter_interfaces(source):
+    """Yield (name, speed, counters) for every physical interface of a raw extensive reply.
+
+    Each <physical-interface> is removed from the tree once read, so a chassis with thousands of
+    ports never holds more than one port's elements. Logical interfaces are skipped: their counters
+    are nested one level down and never match the COUNTERS paths.
+    """
+    parents = []
+    for event, element in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        element.tag = element.tag.rpartition('}')[2]  # Match on local names, as route_table does
+        if element.tag == 'physical-interface':
+            name = (element.findtext('name') or '').strip()
+            if name:
+                yield name, parse_speed(element.findtext('speed')), [_counter(element, path) for _, path in COUNTERS]
+            if parents:
+                parents[-1].remove(element)
+
+
+def parse_counters(source):
+    """Counters of one device as arrays.
+
+    Returns:
+        tuple: (interface names, speeds in bit/s as float64, counters as uint64 of shape (ports, len(COUNTERS))).
+    """
+    names, speeds, counters = [], [], []
+    for name, speed, values in iter_interfaces(source):
+        names.append(name)
+        speeds.append(speed)
+        counters.append(values)
+    return (names, np.array(speeds, dtype=np.float64),
+            np.array(counters, dtype=np.uint64).reshape(len(names), len(COUNTERS)))
+
+
+def counter_delta(old, new):
+    """Increase from old to new readings of uint64 counters, allowing for wraps and resets.
+
+    A counter that went down either wrapped or was cleared (clear interface statistics, reboot).
+    A reading near the top of the 64-bit range wrapped at 2**64, which the unsigned subtraction already
+    handles. One that fits in 32 bits and gives a plausible increase across 2**32 came from a
+    32-bit counter. Anything else was reset, and the new reading is the increase since then.
+
+    Returns:
+        numpy.ndarray: Increases as float64, same shape as the inputs.
+    """
+    went_down = new < old
+    delta = new - old  # Modular in uint64, so this is also right for 64-bit wraps
+    wrapped32 = went_down & (old < _WRAP32) & (new < _WRAP32) & (new + _WRAP32 - old < _WRAP32 // np.uint64(2))
+    reset = went_down & ~wrapped32 & (old < _WRAP64_ZONE)
+    delta = np.where(wrapped32, new + _WRAP32 - old, delta)
+    delta = np.where(reset, new, delta)
+    return delta.astype(np.float64)
+
+
+class CounterHistory:
+    """Counter samples of every monitored interface in NumPy ring buffers, DEPTH samples per interface.
+
+    All devices share one set of arrays indexed by a row per (device, interface), so rates, utilization
+    and spike checks for a whole poll cycle are a handful of vectorized operations over every port.
+    """
+
+    def __init__(self, depth=DEPTH, capacity=1024):
+        self.depth = depth
+        self.index = {}  # (device, interface) -> row
+        self.keys = []   # row -> (device, interface)
+        self.counters = np.zeros((capacity, depth, len(COUNTERS)), dtype=np.uint64)
+        self.times = np.zeros((capacity, depth), dtype=np.float64)
+        self.speeds = np.zeros(capacity, dtype=np.float64)
+        self.head = np.zeros(capacity, dtype=np.int64)     # Ring slot of each row's latest sample
+        self.samples = np.zeros(capacity, dtype=np.int64)  # Samples held, up to depth
+        self.alerting = np.zeros((capacity, len(SPIKE_COUNTERS)), dtype=bool)  # Spiking at the last check
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.speeds))
+        for name in ('counters', 'times', 'speeds', 'head', 'samples', 'alerting'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def rows(self, device, names):
+        """Row of every named interface of a device, adding rows for interfaces not seen before."""
+        rows = np.empty(len(names), dtype=np.int64)
+        for position, name in enumerate(names):
+            row = self.index.get((device, name))
+            if row is None:
+                row = self.index[device, name] = len(self.keys)
+                self.keys.append((device, name))
+            rows[position] = row
+        if len(self.keys) > len(self.speeds):
+            self._grow(len(self.keys))
+        return rows
+
+    def record(self, device, names, speeds, counters, timestamp):
+        """Store one poll of a device; returns the rows written."""
+        rows = self.rows(device, names)
+        head = (self.head[rows] + 1) % self.depth
+        self.head[rows] = head
+        self.counters[rows, head] = counters
+        self.times[rows, head] = timestamp
+        self.speeds[rows] = speeds
+        self.samples[rows] = np.minimum(self.samples[rows] + 1, self.depth)
+        return rows
+
+    def deltas(self, rows, back=1):
+        """Counter increases between each row's latest sample and the one back polls earlier.
+
+        back may be an array (one per row). Rows without that many samples are marked invalid.
+
+        Returns:
+            tuple: (increases (rows, counters) float64, elapsed seconds, valid mask).
+        """
+        head = self.head[rows]
+        then = (head - back) % self.depth
+        seconds = self.times[rows, head] - self.times[rows, then]
+        valid = (self.samples[rows] > back) & (seconds > 0)
+        return counter_delta(self.counters[rows, then], self.counters[rows, head]), seconds, valid
+
+    def evaluate(self, rows, spike_factor=SPIKE_FACTOR, min_errors=MIN_SPIKE_ERRORS):
+        """Rates, utilization and error spikes of the given rows, from their two latest samples.
+
+        An error counter spikes when at least min_errors arrived since the previous poll and its rate is
+        over spike_factor times the rate across the rest of the ring (the interface's own baseline).
+        Ports need three samples before they can spike, so the first interval is a baseline, not an alert.
+        Each spike is reported once; the counter re-arms after a poll without one.
+
+        Returns:
+            dict: Arrays aligned with rows: valid, rates (per second, per counter), deltas,
+                in_util/out_util (percent of speed, NaN when the speed is unknown), spikes, new_spikes.
+        """
+        deltas, seconds, valid = self.deltas(rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rates = np.where(valid[:, None], deltas / seconds[:, None], 0.0)
+            speeds = np.where(self.speeds[rows] > 0, self.speeds[rows], np.nan)
+            in_util = rates[:, COLUMN['in_octets']] * 8 * 100 / speeds
+            out_util = rates[:, COLUMN['out_octets']] * 8 * 100 / speeds
+
+        # Baseline: from the oldest sample still in the ring up to the previous one
+        columns = [COLUMN[name] for name in SPIKE_COUNTERS]
+        head = self.head[rows]
+        previous = (head - 1) % self.depth
+        oldest = (head - (self.samples[rows] - 1)) % self.depth
+        base_seconds = self.times[rows, previous] - self.times[rows, oldest]
+        base_delta = counter_delta(self.counters[rows, oldest][:, columns], self.counters[rows, previous][:, columns])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            base_rate = np.where(base_seconds[:, None] > 0, base_delta / base_seconds[:, None], 0.0)
+        current = deltas[:, columns]
+        # A spike needs a real baseline interval; on a port's second sample there is none yet
+        has_baseline = valid & (base_seconds > 0)
+        spikes = has_baseline[:, None] & (current >= min_errors) & (rates[:, columns] > spike_factor * base_rate)
+        new_spikes = spikes & ~self.alerting[rows]
+        self.alerting[rows] = spikes
+        return {'valid': valid, 'rates': rates, 'deltas': deltas, 'in_util': in_util, 'out_util': out_util,
+                'spikes': spikes, 'new_spikes': new_spikes, 'base_rate': base_rate}
+
+
+def spike_alerts(history, rows, metrics, host_lookup, timestamp):
+    """Alert records for the new spikes found by CounterHistory.evaluate."""
+    alerts = []
+    time_str = timestamp.isoformat(sep=' ', timespec='seconds')
+    for position, column in zip(*np.nonzero(metrics['new_spikes'])):
+        device, interface = history.keys[rows[position]]
+        counter = SPIKE_COUNTERS[column]
+        alerts.append({'time': time_str, 'event': 'alert', 'type': 'interface_errors', 'device': device,
+                       'host_name': host_lookup.get(device, device), 'interface': interface, 'counter': counter,
+                       'delta': int(metrics['deltas'][position, COLUMN[counter]]),
+                       'rate_per_s': round(float(metrics['rates'][position, COLUMN[counter]]), 2),
+                       'baseline_per_s': round(float(metrics['base_rate'][position, column]), 3)})
+    return alerts
+
+
+def _write_alerts(alerts, log_file=LOG_FILE):
+    """Append alerts to the interface alert log as JSON lines in a single write."""
+    if not alerts:
+        return
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    with open(log_file, 'a') as log:
+        log.write("".join(json.dumps(alert) + "\n" for alert in alerts))
+
+
+def _top(values, count):
+    """Indexes of the count largest finite values, largest first, without sorting everything."""
+    candidates = np.flatnonzero(np.isfinite(values) & (values > 0))
+    if len(candidates) > count:
+        candidates = candidates[np.argpartition(values[candidates], -count)[-count:]]
+    return candidates[np.argsort(values[candidates])[::-1]]
+
+
+def write_report(history, rows, metrics, alerts, host_lookup, timestamp, elapsed, failed, top=20):
+    """Write one cycle's summary: alerts, busiest ports and ports with errors. Returns the file path."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    stamp = timestamp.strftime('%Y%m%d_%H%M%S')
+    report_file = os.path.join(REPORT_DIR, f"interface_report_{stamp}.txt")
+
+    def label(position):
+        device, interface = history.keys[rows[position]]
+        return f"{host_lookup.get(device, device)} {interface}"
+
+    lines = [f"Interface Monitoring Report - {stamp}\n{'=' * 50}\n",
+             f"{len(rows)} interfaces polled in {elapsed:.1f} s, {int(metrics['valid'].sum())} with rates\n"]
+    if failed:
+        lines.append(f"Poll failed on: {', '.join(sorted(failed))}\n")
+    lines.append(f"\nError spikes ({len(alerts)}):\n")
+    lines.extend(f"  - {a['host_name']} {a['interface']}: {a['counter']} +{a['delta']} "
+                 f"({a['rate_per_s']}/s, baseline {a['baseline_per_s']}/s)\n" for a in alerts)
+    utilization = np.fmax(metrics['in_util'], metrics['out_util'])
+    lines.append(f"\nBusiest interfaces (top {top}):\n")
+    lines.extend(f"  - {label(p)}: in {metrics['in_util'][p]:.1f}% out {metrics['out_util'][p]:.1f}%\n"
+                 for p in _top(utilization, top))
+    errors = metrics['rates'][:, [COLUMN['in_errors'], COLUMN['out_errors'], COLUMN['crc_errors']]].sum(axis=1)
+    lines.append(f"\nInterfaces with errors this cycle (top {top}):\n")
+    lines.extend(f"  - {label(p)}: in {int(metrics['deltas'][p, COLUMN['in_errors']])} "
+                 f"out {int(metrics['deltas'][p, COLUMN['out_errors']])} crc {int(metrics['deltas'][p, COLUMN['crc_errors']])}\n"
+                 for p in _top(errors, top))
+    with open(report_file, 'w') as f:
+        f.writelines(lines)
+    return report_file
+
+
+def interface_monitor(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, interval=60,
+                      cycles=None, spike_factor=SPIKE_FACTOR, min_errors=MIN_SPIKE_ERRORS, executor=None):
+    """Poll interface counters across devices every interval seconds and report rates, utilization and error spikes.
+
+    Devices are polled concurrently and each reply is parsed as a stream. Every cycle's results go
+    into one CounterHistory, and all ports are evaluated together. Spikes are written to
+    logs/interface_alerts.log and the event log. Each cycle also gets a summary in
+    reports/interface_report_<timestamp>.txt. cycles limits the number of polls; by default the
+    monitor runs until Ctrl+C.
+    A HybridExecutor, when given, parses the replies in its process pool.
+    Polls go through the per-device circuit breakers: a device that keeps timing out is skipped until
+    its next probe, which reconnects it.
+    """
+    connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
+    if not connections:
+        print("No devices connected for interface monitoring.")
+        return
+
+    host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+    history = CounterHistory()
+
+    def poll(dev):
+        reply = raw_rpc_reply(dev, 'get_interface_information', extensive=True)
+        polled_at = time.time()  # Counters are read when the reply is built, not when it is parsed
+        if executor is None:
+            return polled_at, parse_counters(reply)
+        from hybrid_executor import parse_interface_xml
+        return polled_at, executor.run(parse_interface_xml, reply.getbuffer())
+
+    print(f"Starting interface monitoring every {interval} s. Press Ctrl+C to stop.")
+    cycle = 0
+    try:
+        while True:
+            started = time.monotonic()
+            timestamp = datetime.now()
+            polled, failed = [], []
+            for dev, result, error in iter_concurrently(connections, lambda dev: guarded_poll(dev, poll)):
+                if isinstance(error, CircuitOpenError):
+                    failed.append(f"{get_hostname(dev, host_lookup)} (skipped)")
+                    log_event('skipped', device=dev.hostname, stage='interface_poll', reason=str(error))
+                    continue
+                if error is not None:
+                    failed.append(get_hostname(dev, host_lookup))
+                    log_event('failure', device=dev.hostname, stage='interface_poll', error=str(error))
+                    print(f"Failed to poll interfaces on {dev.hostname}: {error}")
+                    continue
+                polled_at, (names, speeds, counters) = result
+                polled.append(history.record(dev.hostname, names, speeds, counters, polled_at))
+
+            rows = np.concatenate(polled) if polled else np.zeros(0, dtype=np.int64)
+            metrics = history.evaluate(rows, spike_factor, min_errors)
+            alerts = spike_alerts(history, rows, metrics, host_lookup, timestamp)
+            _write_alerts(alerts)
+            for alert in alerts:
+                log_event('interface_alert', **{k: v for k, v in alert.items() if k not in ('time', 'event')})
+                print(f"ALERT {alert['host_name']} {alert['interface']}: {alert['counter']} spike, +{alert['delta']} "
+                      f"({alert['rate_per_s']}/s vs baseline {alert['baseline_per_s']}/s)")
+            elapsed = time.monotonic() - started
+            report_file = write_report(history, rows, metrics, alerts, host_lookup, timestamp, elapsed, failed)
+            print(f"Polled {len(rows)} interfaces on {len(polled)} devices in {elapsed:.1f} s; report: {report_file}")
+
+            cycle += 1
+            if cycles and cycle >= cycles:
+                break
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("\nInterface monitoring stopped by user.")
+    finally:
+        disconnect_from_hosts(connections)
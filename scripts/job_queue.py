@@ -0,0 +1,504 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from contextlib import contextmanager
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from utils import merge_host_data
+from concurrency import limiter
+
+# Durable queue shared by the coordinator and every worker; for several nodes put it on shared storage
+QUEUE_FILE = os.path.join(SCRIPT_DIR, '../queue/jobs.db')
+REPORT_DIR = os.path.join(SCRIPT_DIR, '../reports')
+
+TASKS = ['backup', 'baseline', 'route_snapshot', 'bgp_verification', 'ospf_verification']
+
+LEASE_SECONDS = 120     # A claimed job returns to the queue if its worker stops heartbeating this long
+HEARTBEAT_SECONDS = 30  # How often a worker extends the leases of the jobs it is running
+MAX_ATTEMPTS = 3        # Claims per job before it is given up as failed
+RETRY_DELAY = 30        # Seconds a failed job waits before another worker may claim it, times its attempts
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    action TEXT NOT NULL,
+    host_ip TEXT NOT NULL,
+    host_name TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued / leased / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at, id);
+CREATE INDEX IF NOT EXISTS jobs_device ON jobs (host_ip, status);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch, merged);
+"""
+
+
+class JobQueue:
+    """Per-device jobs in SQLite, claimed by workers under time-limited leases.
+
+    A worker owns a job only while its lease is current; every write a worker makes is conditioned on
+    still holding the lease, so a job whose lease expired and was re-claimed elsewhere cannot be completed
+    twice. At most one job per device is leased at a time across all workers.
+    """
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        # sqlite3 connections are not shared between threads; each thread opens its own
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")  # Take the write lock up front so two workers never claim one job
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def submit(self, batch, jobs, max_attempts=MAX_ATTEMPTS):
+        """Queue (action, host dict, params) jobs under one batch id; returns the number queued."""
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO jobs (batch, action, host_ip, host_name, params, max_attempts, available_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(batch, action, host['ip_address'], host['host_name'], json.dumps(params or {}), max_attempts, now)
+                 for action, host, params in jobs])
+        return len(jobs)
+
+    def claim(self, worker, batch=None, lease=LEASE_SECONDS):
+        """Lease the oldest runnable job whose device is not busy elsewhere; None when there is none."""
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs whose worker vanished on their last attempt are given up here
+            db.execute("UPDATE jobs SET status = 'failed', finished = ?, "
+                       "error = 'lease expired on final attempt (worker lost)' "
+                       "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+            row = db.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' OR (status = 'leased' AND lease_expires < ?)) "
+                "AND available_at <= ? AND (? IS NULL OR batch = ?) "
+                "AND host_ip NOT IN (SELECT host_ip FROM jobs WHERE status = 'leased' AND lease_expires >= ?) "
+                "ORDER BY id LIMIT 1", (now, now, batch, batch, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'leased', worker = ?, attempts = attempts + 1, "
+                       "lease_expires = ?, started = ? WHERE id = ?", (worker, now + lease, now, row['id']))
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['attempts'] += 1
+        return job
+
+    def heartbeat(self, worker, job_ids, lease=LEASE_SECONDS):
+        """Extend the leases this worker still holds; returns the ids it has lost."""
+        if not job_ids:
+            return set()
+        held = set()
+        with self._transaction() as db:
+            for job_id in job_ids:
+                cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? "
+                                    "AND status = 'leased'", (time.time() + lease, job_id, worker))
+                if cursor.rowcount:
+                    held.add(job_id)
+        return set(job_ids) - held
+
+    def complete(self, job_id, worker, result):
+        """Store a job's result; False if the worker no longer held the lease."""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, finished = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                                (json.dumps(result), time.time(), job_id, worker))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """Requeue a failed job with a delay, or fail it for good after its last attempt."""
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET error = ?, lease_expires = NULL, "
+                "status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "finished = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END, "
+                "available_at = ? + ? * attempts "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (str(error)[:2000], now, now, RETRY_DELAY, job_id, worker))
+        return cursor.rowcount == 1
+
+    def counts(self, batch=None):
+        """Job count per status, for one batch or the whole queue."""
+        rows = self._db().execute("SELECT status, COUNT(*) FROM jobs WHERE (? IS NULL OR batch = ?) "
+                                  "GROUP BY status", (batch, batch)).fetchall()
+        return {status: count for status, count in rows}
+
+    def unmerged(self, batch):
+        """Finished jobs of a batch whose results have not been merged yet."""
+        rows = self._db().execute("SELECT * FROM jobs WHERE batch = ? AND merged = 0 "
+                                  "AND status IN ('done', 'failed') ORDER BY id", (batch,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_merged(self, job_ids):
+        with self._transaction() as db:
+            db.executemany("UPDATE jobs SET merged = 1 WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def jobs(self, batch):
+        rows = self._db().execute("SELECT id, action, host_name, host_ip, status, attempts, worker, started, "
+                                  "finished, error FROM jobs WHERE batch = ? ORDER BY id", (batch,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def batches(self):
+        rows = self._db().execute("SELECT batch, COUNT(*), SUM(status IN ('done', 'failed')), "
+                                  "MIN(available_at) FROM jobs GROUP BY batch ORDER BY MIN(id)").fetchall()
+        return [tuple(row) for row in rows]
+
+
+# Worker side: run a job on one device and return a JSON-serializable result. No files are written here;
+# the coordinator turns results into backups/, baselines/, routing/ and reports/ output.
+
+def _run_backup(dev, host, params):
+    from rpc_cache import cached_rpc
+    return {'config': cached_rpc(dev, 'get_config', options={'format': 'text'}).text}
+
+
+def _run_profile(profile_name):
+    def run(dev, host, params):
+        from collection_engine import collect_device
+        name = params.get('profile', profile_name)
+        return {'profile': name, 'profiles': collect_device(dev, host, [name], fresh=params.get('fresh', False))}
+    return run
+
+
+def _run_route_snapshot(dev, host, params):
+    from route_monitor import capture_routing_tables
+    dev.tables = params.get('tables') or host.get('tables') or ['inet.0']
+    tables = capture_routing_tables(dev, host['host_name'], None)
+    if not tables:
+        raise RuntimeError("route capture failed")
+    return {'tables': tables, 'captured_at': datetime.now().isoformat(timespec='seconds')}
+
+
+RUNNERS = {
+    'backup': _run_backup,
+    'baseline': _run_profile('baseline'),
+    'route_snapshot': _run_route_snapshot,
+    'bgp_verification': _run_profile('bgp_verification'),
+    'ospf_verification': _run_profile('ospf_verification'),
+}
+
+
+class Worker:
+    """Claim jobs from the queue with several threads, keep their leases alive and report results."""
+
+    def __init__(self, job_queue, username, password, hosts, threads=8, worker_id=None, batch=None):
+        from collector_daemon import SessionPool
+        self.queue = job_queue
+        self.hosts = {h['ip_address']: h for h in hosts}
+        self.threads = threads
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch = batch
+        self.pool = SessionPool(username, password)  # One warm session per device this worker has served
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {'done': 0, 'failed': 0, 'lost': 0}
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._lock:
+                held = set(self._held)
+            lost = self.queue.heartbeat(self.worker_id, held)
+            for job_id in lost:
+                print(f"Lost lease on job {job_id}; another worker may run it")
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def execute(self, job):
+        """Run one claimed job and report its outcome to the queue."""
+        host = dict(self.hosts.get(job['host_ip'], {}), host_name=job['host_name'], ip_address=job['host_ip'])
+        with self._lock:
+            self._held.add(job['id'])
+        try:
+            dev = self.pool.get(job['host_ip'])  # Connects run under the limiter themselves
+            if dev is None:
+                raise ConnectionError(f"could not connect to {job['host_ip']}")
+            with limiter.slot(job['host_ip']):
+                result = RUNNERS[job['action']](dev, host, job['params'])
+        except Exception as error:
+            print(f"Job {job['id']} {job['action']} on {job['host_name']} failed "
+                  f"(attempt {job['attempts']}/{job['max_attempts']}): {error}")
+            self._count('failed' if self.queue.fail(job['id'], self.worker_id, error) else 'lost')
+        else:
+            if self.queue.complete(job['id'], self.worker_id, result):
+                self._count('done')
+                print(f"Job {job['id']} {job['action']} on {job['host_name']} done")
+            else:
+                self._count('lost')
+                print(f"Job {job['id']} finished after its lease was lost; result discarded")
+        finally:
+            with self._lock:
+                self._held.discard(job['id'])
+
+    def _loop(self, exit_when_empty, poll):
+        while not self._stop.is_set():
+            job = self.queue.claim(self.worker_id, batch=self.batch)
+            if job is not None:
+                self.execute(job)
+                continue
+            counts = self.queue.counts(self.batch)
+            if exit_when_empty and not counts.get('queued') and not counts.get('leased'):
+                return
+            self._stop.wait(poll)
+
+    def run(self, exit_when_empty=False, poll=2.0):
+        """Work until stopped, or until the queue has nothing left to run when exit_when_empty is set."""
+        heartbeat = threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True)
+        heartbeat.start()
+        loops = [threading.Thread(target=self._loop, args=(exit_when_empty, poll), name=f"job-{n}")
+                 for n in range(self.threads)]
+        for thread in loops:
+            thread.start()
+        try:
+            for thread in loops:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            print("\nWorker stopping; running jobs are finished or their leases expire")
+        finally:
+            self._stop.set()
+            self.pool.close_all()
+        return self.stats
+
+
+# Coordinator side: merge finished jobs into the usual output directories
+
+def _merge_backup(job, result, outputs):
+    from event_log import log_event
+    backup_dir = os.path.join(SCRIPT_DIR, '../backups')
+    os.makedirs(backup_dir, exist_ok=True)
+    date_str = datetime.fromtimestamp(job['finished']).strftime('%Y%m%d')
+    filepath = os.path.join(backup_dir, f"{job['host_name']}_{date_str}.cfg")
+    with open(filepath, 'w') as f:
+        f.write(result['config'])
+    log_event('backup', device=job['host_ip'], host_name=job['host_name'], path=filepath,
+              bytes=len(result['config']), worker=job['worker'])
+    return filepath
+
+
+def _merge_profile(job, result, outputs):
+    from collection_engine import write_results
+    record = {'host_name': job['host_name'], 'host_ip': job['host_ip'], 'profiles': result['profiles']}
+    written = write_results([record], result['profile'])
+    if result['profile'].endswith('_verification'):
+        outputs['verification'].extend(written)
+    return ", ".join(written) or None
+
+
+def _merge_route_snapshot(job, result, outputs):
+    from route_monitor import save_routing_tables, parse_tables
+    from route_history import RouteHistory
+    routing_dir = os.path.join(SCRIPT_DIR, '../routing')
+    os.makedirs(routing_dir, exist_ok=True)
+    captured_at = datetime.fromisoformat(result['captured_at'])
+    filepath = save_routing_tables(result['tables'], job['host_name'], routing_dir,
+                                   captured_at.strftime('%Y%m%d_%H%M%S'))
+    history = RouteHistory()
+    for table_name, table in parse_tables(result['tables']).items():
+        history.record_snapshot(job['host_name'], table_name, captured_at, table)
+    return filepath
+
+
+MERGERS = {
+    'backup': _merge_backup,
+    'baseline': _merge_profile,
+    'route_snapshot': _merge_route_snapshot,
+    'bgp_verification': _merge_profile,
+    'ospf_verification': _merge_profile,
+}
+
+
+def merge_results(job_queue, batch, outputs):
+    """Write every newly finished job of a batch to its output files; returns how many were merged.
+
+    Args:
+        outputs (dict): Accumulates 'verification' lines and per-job 'paths' across calls.
+    """
+    jobs = job_queue.unmerged(batch)
+    for job in jobs:
+        if job['status'] != 'done':
+            outputs['paths'][job['id']] = None
+            continue
+        try:
+            outputs['paths'][job['id']] = MERGERS[job['action']](job, json.loads(job['result']), outputs)
+        except Exception as error:
+            print(f"Failed to merge job {job['id']} {job['action']} for {job['host_name']}: {error}")
+            outputs['paths'][job['id']] = f"merge failed: {error}"
+    if jobs:
+        job_queue.mark_merged([job['id'] for job in jobs])
+    return len(jobs)
+
+
+def write_report(job_queue, batch, outputs):
+    """Write reports/jobs_<batch>.txt with every job's outcome and the verification results."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_file = os.path.join(REPORT_DIR, f"jobs_{batch}.txt")
+    jobs = job_queue.jobs(batch)
+    workers = {job['worker'] for job in jobs if job['worker']}
+    lines = [f"Job Batch Report - {batch}", "=" * 50,
+             f"{len(jobs)} jobs, {sum(job['status'] == 'done' for job in jobs)} done, "
+             f"{sum(job['status'] == 'failed' for job in jobs)} failed, {len(workers)} workers", ""]
+    for job in jobs:
+        took = f"{job['finished'] - job['started']:.1f}s" if job['finished'] and job['started'] else "-"
+        lines.append(f"{job['action']:<18} {job['host_name']:<24} {job['status']:<7} attempts={job['attempts']} "
+                     f"worker={job['worker'] or '-'} time={took}")
+        if job['status'] == 'failed':
+            lines.append(f"    error: {job['error']}")
+        elif outputs['paths'].get(job['id']):
+            lines.append(f"    output: {outputs['paths'][job['id']]}")
+    if outputs['verification']:
+        lines += ["", "Protocol Verification Results:"] + [f"  - {line}" for line in outputs['verification']]
+    with open(report_file, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return report_file
+
+
+def coordinate(job_queue, batch, poll=5.0):
+    """Merge a batch's results as workers finish them, until no job is queued or leased; returns the report."""
+    outputs = {'verification': [], 'paths': {}}
+    last = None
+    while True:
+        merge_results(job_queue, batch, outputs)
+        counts = job_queue.counts(batch)
+        progress = (counts.get('queued', 0), counts.get('leased', 0), counts.get('done', 0), counts.get('failed', 0))
+        if progress != last:
+            print(f"Batch {batch}: {progress[0]} queued, {progress[1]} running, {progress[2]} done, {progress[3]} failed")
+            last = progress
+        if not progress[0] and not progress[1]:
+            merge_results(job_queue, batch, outputs)  # Anything finished since the last pass
+            return write_report(job_queue, batch, outputs)
+        time.sleep(poll)
+
+
+def _load_hosts():
+    merged_data = merge_host_data(os.path.join(SCRIPT_DIR, "../data/inventory.yml"),
+                                  os.path.join(SCRIPT_DIR, "../data/hosts_data.yml"))
+    if not merged_data:
+        print("Failed to merge host data. Exiting.")
+        sys.exit(1)
+    for host in merged_data.get('hosts', []):
+        host.setdefault('tables', merged_data.get('tables', ['inet.0']))
+    return merged_data
+
+
+def _submit(job_queue, merged_data, args):
+    hosts = merged_data.get('hosts', [])
+    if args.change:
+        from change_targets import load_change_targets
+        hosts, _ = load_change_targets(args.change.strip().upper(), hosts)
+    if args.hosts:
+        hosts = [h for h in hosts if h['host_name'] in args.hosts or h['ip_address'] in args.hosts]
+    if not hosts:
+        print("No matching hosts. Exiting.")
+        sys.exit(1)
+    batch = datetime.now().strftime('%Y%m%d_%H%M%S')
+    count = job_queue.submit(batch, [(action, host, {}) for action in args.actions for host in hosts])
+    print(f"Queued {count} jobs for {len(hosts)} hosts as batch {batch}")
+    return batch
+
+
+def main():
+    """Queue per-device jobs, run workers that claim them, and merge results into the usual outputs."""
+    parser = argparse.ArgumentParser(description='Sharded collection through a durable SQLite job queue')
+    parser.add_argument('--db', default=QUEUE_FILE, help='Queue database; use shared storage for several nodes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_targets(sub):
+        sub.add_argument('--actions', nargs='+', choices=TASKS, required=True, help='Per-device tasks to queue')
+        sub.add_argument('--hosts', nargs='+', help='Host names or IPs (default: every host)')
+        sub.add_argument('--change', help='Only the hosts in changes/<CHG>/<CHG>_CI.yml')
+
+    add_targets(subparsers.add_parser('submit', help='Queue jobs and print the batch id'))
+    worker_parser = subparsers.add_parser('worker', help='Claim and run jobs until stopped')
+    worker_parser.add_argument('--threads', type=int, default=8, help='Jobs run at once by this worker')
+    worker_parser.add_argument('--batch', help='Only claim jobs of this batch')
+    worker_parser.add_argument('--exit-when-empty', action='store_true', help='Stop once nothing is queued or running')
+    coordinate_parser = subparsers.add_parser('coordinate', help='Merge a batch into backups/, baselines/ and reports/')
+    coordinate_parser.add_argument('batch')
+    run_parser = subparsers.add_parser('run', help='Submit, start local worker processes and coordinate')
+    add_targets(run_parser)
+    run_parser.add_argument('--workers', type=int, default=4, help='Local worker processes to start')
+    run_parser.add_argument('--threads', type=int, default=8, help='Jobs run at once by each worker')
+    status_parser = subparsers.add_parser('status', help='Show batches, or the jobs of one batch')
+    status_parser.add_argument('batch', nargs='?')
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.db)
+
+    if args.command == 'status':
+        if not args.batch:
+            for batch, total, finished, created in job_queue.batches():
+                print(f"{batch:<18} {finished}/{total} finished  queued {datetime.fromtimestamp(created):%Y-%m-%d %H:%M}")
+            return
+        for job in job_queue.jobs(args.batch):
+            print(f"{job['id']:>6} {job['action']:<18} {job['host_name']:<24} {job['status']:<7} "
+                  f"attempts={job['attempts']} worker={job['worker'] or '-'} {job['error'] or ''}")
+        return
+
+    merged_data = _load_hosts()
+    if args.command == 'worker':
+        worker = Worker(job_queue, merged_data.get('username'), merged_data.get('password'),
+                        merged_data.get('hosts', []), threads=args.threads, batch=args.batch)
+        print(f"Worker {worker.worker_id} claiming jobs from {os.path.abspath(args.db)}")
+        stats = worker.run(exit_when_empty=args.exit_when_empty)
+        print(f"Worker {worker.worker_id}: {stats['done']} done, {stats['failed']} failed, {stats['lost']} lost leases")
+        return
+
+    if args.command == 'coordinate':
+        print(f"Report generated: {coordinate(job_queue, args.batch)}")
+        return
+
+    batch = _submit(job_queue, merged_data, args)
+    if args.command == 'submit':
+        return
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--db', args.db, 'worker',
+                                 '--threads', str(args.threads), '--batch', batch, '--exit-when-empty'])
+               for _ in range(args.workers)]
+    try:
+        print(f"Report generated: {coordinate(job_queue, batch)}")
+    finally:
+        for process in workers:
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from utils import run_concurrently, update_json_file
+from resilience import guarded_poll, CircuitOpenError
+from facts_cache import get_hostname
+from event_log import log_event
+
+# Per-device read position in the remote log, keyed by host IP and log file
+CURSOR_FILE = os.path.join(SCRIPT_DIR, '../cache/log_cursors.json')
+# logs/devices/<host>/<YYYYmmdd>.log.gz, one gzip member appended per collection, plus the SQLite index
+STORE_DIR = os.path.join(SCRIPT_DIR, '../logs/devices')
+
+REMOTE_LOG_DIR = '/var/log'
+CLI_TAIL_LINES = 500     # First 'show log <file> | last N' window of the CLI fallback...
+CLI_MAX_LINES = 16000    # ...doubled until the cursor line is found, up to this
+
+# "Oct 19 10:11:12[.123]  host process[pid]: TAG_NAME: message"
+_LINE_RE = re.compile(r'^(?P<month>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+(?P<time>\d\d:\d\d:\d\d)(?:\.\d+)?\s+'
+                      r'(?:\S+\s+)?(?P<process>[\w./-]+?)(?:\[\d+\])?:\s+(?:(?P<tag>[A-Z][A-Z0-9]*_[A-Z0-9_]+):)?')
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    device TEXT NOT NULL,
+    host_name TEXT NOT NULL,
+    facility TEXT NOT NULL,
+    first_ts TEXT NOT NULL,
+    last_ts TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    member_offset INTEGER NOT NULL,
+    member_length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_lookup ON chunks (device, facility, last_ts);
+CREATE INDEX IF NOT EXISTS chunks_time ON chunks (last_ts);
+"""
+
+_cursors = None
+_lock = threading.Lock()
+
+
+def _load_cursors():
+    """Load the cursors from disk once per process."""
+    global _cursors
+    if _cursors is None:
+        try:
+            with open(CURSOR_FILE, 'r') as cursor_file:
+                _cursors = json.load(cursor_file)
+        except FileNotFoundError:
+            _cursors = {}
+        except (json.JSONDecodeError, OSError) as error:
+            print(f"Warning: Ignoring unreadable log cursors '{CURSOR_FILE}': {error}")
+            _cursors = {}
+    return _cursors
+
+
+def _update_cursors(update):
+    """Apply update(cursors) to the file under its cross-process lock, then keep the result in memory."""
+    global _cursors
+    _cursors = update_json_file(CURSOR_FILE, update)
+
+
+def line_hash(line):
+    """Identity of one log line, the same whether it came over SFTP or the CLI."""
+    return hashlib.sha1(line.rstrip('\r\n').encode('utf-8', errors='replace')).hexdigest()
+
+
+def lines_after(lines, tail_hash):
+    """Lines after the last one matching the cursor hash.
+
+    Returns:
+        tuple: (new lines, found); when the cursor line is not present every line is new.
+    """
+    if tail_hash:
+        for index in range(len(lines) - 1, -1, -1):
+            if line_hash(lines[index]) == tail_hash:
+                return lines[index + 1:], True
+    return lines, False
+
+
+def parse_line(line, now=None):
+    """Split a syslog line into (timestamp, facility); unparseable lines get (None, '-').
+
+    The facility is the message tag's prefix (UI_COMMIT -> UI, RPD_BGP_NEIGHBOR_STATE_CHANGED -> RPD),
+    or the process name for untagged messages. Syslog omits the year, so a date in the future is
+    taken to be from last year.
+    """
+    match = _LINE_RE.match(line)
+    if not match:
+        return None, '-'
+    now = now or datetime.now()
+    try:
+        timestamp = datetime.strptime(f"{now.year} {match['month']} {match['day']} {match['time']}",
+                                      '%Y %b %d %H:%M:%S')
+    except ValueError:
+        return None, '-'
+    if timestamp > now + timedelta(days=1):
+        timestamp = timestamp.replace(year=now.year - 1)
+    tag = match['tag']
+    return timestamp, tag.split('_', 1)[0] if tag else match['process']
+
+
+def _rotated_tail(sftp, rotated_path, tail_hash):
+    """Unread lines at the end of the rotated log, located by the cursor line's hash.
+
+    Returns:
+        tuple: (lines, bytes transferred); no lines when the cursor is older than the last rotation.
+    """
+    try:
+        with sftp.open(rotated_path, 'rb') as remote:
+            rotated = gzip.GzipFile(fileobj=remote).read()
+        transferred = sftp.stat(rotated_path).st_size
+    except (IOError, OSError, EOFError):
+        return [], 0
+    lines, found = lines_after(rotated.decode('utf-8', errors='replace').splitlines(), tail_hash)
+    return (lines if found else []), transferred
+
+
+def _fetch_sftp(dev, log_file, cursor):
+    """Read only the bytes appended since the cursor, verifying the cursor line is still where it was.
+
+    Without a verified offset (the file shrank, was rotated, or the last run used the CLI) the cursor line
+    is searched for by hash; if the current file does not contain it, the unread rest of the rotated
+    <log_file>.0.gz comes first, followed by the whole new file.
+
+    Returns:
+        tuple: (new complete lines, new cursor fields, bytes transferred).
+    """
+    from config_archive import open_sftp
+    remote_path = f"{REMOTE_LOG_DIR}/{log_file}"
+    sftp = open_sftp(dev)
+    try:
+        size = sftp.stat(remote_path).st_size
+        offset, tail_len = cursor.get('offset'), cursor.get('tail_len', 0)
+        verified, transferred = False, 0
+        if offset is not None and tail_len <= offset <= size:
+            with sftp.open(remote_path, 'rb') as remote:
+                remote.seek(offset - tail_len)
+                tail = remote.read(tail_len)
+            transferred += len(tail)
+            verified = not cursor.get('tail_hash') or \
+                line_hash(tail.decode('utf-8', errors='replace')) == cursor['tail_hash']
+        start = offset if verified else 0  # Cursor verified: fetch only what follows it
+        with sftp.open(remote_path, 'rb') as remote:
+            remote.seek(start)
+            data = remote.read(size - start)
+        transferred += len(data)
+
+        complete = data[:data.rfind(b'\n') + 1]  # A half-written last line is fetched again next time
+        lines = complete.decode('utf-8', errors='replace').splitlines()
+        prefix = []
+        if not verified and cursor.get('tail_hash'):
+            # No usable offset (last run went through the CLI) or the file was rotated or replaced
+            lines, found = lines_after(lines, cursor['tail_hash'])
+            if not found:
+                prefix, transferred_rotated = _rotated_tail(sftp, f"{remote_path}.0.gz", cursor['tail_hash'])
+                transferred += transferred_rotated
+    finally:
+        sftp.close()
+
+    new_cursor = {'offset': start + len(complete)}
+    last_line = complete[complete.rfind(b'\n', 0, len(complete) - 1) + 1:] if complete else b''
+    if last_line:
+        new_cursor.update(tail_len=len(last_line), tail_hash=line_hash(last_line.decode('utf-8', errors='replace')))
+    return prefix + lines, new_cursor, transferred
+
+
+def _fetch_cli(dev, log_file, cursor):
+    """Fallback without SFTP: widen 'show log <file> | last N' until it reaches the cursor line."""
+    count = CLI_TAIL_LINES
+    while True:
+        reply = dev.rpc.cli(f"show log {log_file} | last {count}", format='text')
+        text = reply.text if reply is not None and reply.text else ''
+        lines = [line for line in text.splitlines() if line.strip()]
+        new_lines, found = lines_after(lines, cursor.get('tail_hash'))
+        if found or not cursor.get('tail_hash') or len(lines) < count or count >= CLI_MAX_LINES:
+            break
+        count *= 2
+    new_cursor = {'offset': None}  # Byte position is unknown; the next SFTP run re-syncs by hash
+    if lines:
+        new_cursor.update(tail_hash=line_hash(lines[-1]), tail_len=len(lines[-1].encode('utf-8')) + 1)
+    return new_lines, new_cursor, len(text.encode('utf-8'))
+
+
+def fetch_new_lines(dev, log_file='messages', cursor=None):
+    """Fetch log lines written since the cursor, over SFTP when possible, else through the CLI.
+
+    Returns:
+        tuple: (lines, new cursor, bytes transferred, method).
+    """
+    cursor = cursor or {}
+    try:
+        lines, new_cursor, transferred = _fetch_sftp(dev, log_file, cursor)
+        method = 'sftp'
+    except Exception as sftp_error:
+        print(f"SFTP log read failed on {dev.hostname} ({sftp_error}); using the CLI")
+        lines, new_cursor, transferred = _fetch_cli(dev, log_file, cursor)
+        method = 'cli'
+    new_cursor.setdefault('tail_hash', cursor.get('tail_hash'))
+    new_cursor.setdefault('tail_len', cursor.get('tail_len', 0))
+    return lines, new_cursor, transferred, method
+
+
+class LogStore:
+    """Compressed per-device, per-day log files with an SQLite index by device, facility and time.
+
+    Each collection appends one gzip member per day file; the index records where each member starts,
+    so a query decompresses only the members whose device, facility and time range match.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(store_dir, 'index.db'))
+        self.db.executescript(_INDEX_SCHEMA)
+
+    def append(self, device, host_name, lines, collected_at=None):
+        """Append new lines to the day files and index them; returns compressed bytes written."""
+        collected_at = collected_at or datetime.now()
+        by_day = {}
+        for line in lines:
+            timestamp, facility = parse_line(line, collected_at)
+            timestamp = timestamp or collected_at
+            by_day.setdefault(timestamp.strftime('%Y%m%d'), []).append((line, timestamp, facility))
+
+        written = 0
+        rows = []
+        host_dir = os.path.join(self.store_dir, host_name)
+        os.makedirs(host_dir, exist_ok=True)
+        for day, entries in sorted(by_day.items()):
+            member = gzip.compress("".join(f"{line}\n" for line, _, _ in entries).encode('utf-8'))
+            path = os.path.join(host_dir, f"{day}.log.gz")
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+            written += len(member)
+            facilities = {}
+            for _, timestamp, facility in entries:
+                first, last, count = facilities.get(facility, (timestamp, timestamp, 0))
+                facilities[facility] = (min(first, timestamp), max(last, timestamp), count + 1)
+            rows.extend((device, host_name, facility, first.isoformat(sep=' '), last.isoformat(sep=' '), count,
+                         os.path.relpath(path, self.store_dir), offset, len(member))
+                        for facility, (first, last, count) in facilities.items())
+        with self.db:
+            self.db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return written
+
+    def query(self, device=None, facility=None, since=None, until=None, match=None):
+        """Yield stored lines filtered by device (IP or host name), facility, time range and substring."""
+        clauses, params = [], []
+        if device:
+            clauses.append("(device = ? OR host_name = ?)")
+            params += [device, device]
+        if facility:
+            clauses.append("facility = ?")
+            params.append(facility)
+        if since:
+            clauses.append("last_ts >= ?")
+            params.append(since.isoformat(sep=' '))
+        if until:
+            clauses.append("first_ts <= ?")
+            params.append(until.isoformat(sep=' '))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        members = self.db.execute(f"SELECT path, member_offset, member_length FROM chunks {where} "
+                                  "GROUP BY path, member_offset, member_length "
+                                  "ORDER BY MIN(first_ts), path, member_offset", params).fetchall()
+        for path, offset, length in members:
+            with open(os.path.join(self.store_dir, path), 'rb') as f:
+                f.seek(offset)
+                text = gzip.decompress(f.read(length)).decode('utf-8')
+            # Lines were filed by their own date, so the day file fixes the year
+            day_end = datetime.strptime(os.path.basename(path)[:8], '%Y%m%d') + timedelta(days=1)
+            for line in text.splitlines():
+                timestamp, line_facility = parse_line(line, day_end)
+                if facility and line_facility != facility:
+                    continue
+                if timestamp and ((since and timestamp < since) or (until and timestamp > until)):
+                    continue
+                if match and match not in line:
+                    continue
+                yield line
+
+    def close(self):
+        self.db.close()
+
+
+def collect_logs(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts,
+                 log_file='messages', max_workers=64):
+    """Fetch only the new lines of each device's log concurrently and append them to the local store."""
+    connections = connect_to_hosts(username=username, password=password, host_ips=host_ips)
+    if not connections:
+        print("No devices connected for log collection.")
+        return
+
+    host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+    def fetch(dev):
+        with _lock:
+            cursor = dict(_load_cursors().get(dev.hostname, {}).get(log_file, {}))
+        return fetch_new_lines(dev, log_file, cursor)
+
+    # Devices are read in parallel; appends and cursor updates happen here, one device at a time
+    store = LogStore()
+    total_lines = total_bytes = 0
+    try:
+        for dev, fetched, error in run_concurrently(connections, lambda dev: guarded_poll(dev, fetch),
+                                                    max_workers=max_workers):
+            if isinstance(error, CircuitOpenError):
+                log_event('skipped', device=dev.hostname, stage='log_collection', reason=str(error))
+                print(f"Skipping {dev.hostname}: {error}")
+                continue
+            if error:
+                log_event('failure', device=dev.hostname, stage='log_collection', error=str(error))
+                print(f"Failed to collect {log_file} from {dev.hostname}: {error}")
+                continue
+            lines, cursor, transferred, method = fetched
+            host_name = get_hostname(dev, host_lookup)
+            stored = store.append(dev.hostname, host_name, lines) if lines else 0
+            entry = dict(cursor, method=method, collected_at=datetime.now().isoformat(timespec='seconds'))
+            with _lock:
+                # Only after the lines are stored, so a crash re-fetches rather than loses them
+                _update_cursors(lambda cursors: cursors.setdefault(dev.hostname, {}).update({log_file: entry}))
+            total_lines += len(lines)
+            total_bytes += transferred
+            log_event('logs', device=dev.hostname, host_name=host_name, file=log_file, lines=len(lines),
+                      transferred=transferred, stored=stored, method=method)
+            print(f"Collected {len(lines)} new {log_file} lines from {host_name} "
+                  f"({transferred} bytes over {method}, {stored} bytes stored)")
+    finally:
+        store.close()
+        disconnect_from_hosts(connections)
+    print(f"Log collection: {total_lines} new lines, {total_bytes} bytes transferred from {len(connections)} devices")
+
+
+def main():
+    """Collect new device log lines incrementally, or query the local log store."""
+    parser = argparse.ArgumentParser(description='Incremental device log collection')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    collect_parser = subparsers.add_parser('collect', help='Fetch new lines from every device')
+    collect_parser.add_argument('--file', default='messages', help='Log file under /var/log (default: messages)')
+    collect_parser.add_argument('--hosts', nargs='+', help='Host names or IPs (default: every host)')
+    collect_parser.add_argument('--interval', type=int, help='Repeat every N seconds until interrupted')
+    query_parser = subparsers.add_parser('query', help='Search the local log store')
+    query_parser.add_argument('--device', help='Host name or IP')
+    query_parser.add_argument('--facility', help='Message tag prefix (e.g. RPD, UI, SNMP) or process name')
+    query_parser.add_argument('--since', help="Start time, 'YYYY-mm-dd HH:MM[:SS]'")
+    query_parser.add_argument('--until', help="End time, 'YYYY-mm-dd HH:MM[:SS]'")
+    query_parser.add_argument('--match', help='Only lines containing this text')
+    args = parser.parse_args()
+
+    if args.command == 'query':
+        store = LogStore()
+        count = 0
+        try:
+            for line in store.query(args.device, args.facility,
+                                    datetime.fromisoformat(args.since) if args.since else None,
+                                    datetime.fromisoformat(args.until) if args.until else None, args.match):
+                print(line)
+                count += 1
+        finally:
+            store.close()
+        print(f"{count} lines")
+        return
+
+    from utils import merge_host_data
+    from connect_to_hosts import connect_to_hosts, disconnect_from_hosts
+    merged_data = merge_host_data(os.path.join(SCRIPT_DIR, "../data/inventory.yml"),
+                                  os.path.join(SCRIPT_DIR, "../data/hosts_data.yml"))
+    if not merged_data:
+        print("Failed to merge host data. Exiting.")
+        sys.exit(1)
+    hosts = [h for h in merged_data.get('hosts', [])
+             if not args.hosts or h['host_name'] in args.hosts or h['ip_address'] in args.hosts]
+    try:
+        while True:
+            collect_logs(merged_data.get('username'), merged_data.get('password'),
+                         [h['ip_address'] for h in hosts], hosts, connect_to_hosts, disconnect_from_hosts,
+                         log_file=args.file)
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nLog collection stopped by user.")
+
+if __name__ == "__main__":
+    main()
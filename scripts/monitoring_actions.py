@@ -15,31 +15,20 @@ def ping_host(ip_address, timeout=2, count=4):
         print(f"Error pinging {ip_address}: {error}")
         return False
 
-def verify_bgp(device, host_name):
+def _verify(device, host_name, profile_name, fresh, log=print):
+    """Run a verification profile on one device and return its result line."""
+    from collection_engine import collect_device, write_results
+    record = {'host_name': host_name, 'host_ip': device.hostname,
+              'profiles': collect_device(device, {}, [profile_name], fresh=fresh, log=log)}
+    return write_results([record], profile_name, log=log)[0]
+
+def verify_bgp(device, host_name, fresh=False, log=print):
     """Verify BGP state on the device."""
-    try:
-        # Run 'show bgp summary' and parse output
-        bgp_output = device.rpc.cli('show bgp summary', format='text')
-        bgp_text = bgp_output.text
-        if "Establ" in bgp_text:
-            return f"{host_name} ({device.hostname}): BGP is Established"
-        else:
-            return f"{host_name} ({device.hostname}): BGP is NOT Established"
-    except Exception as error:
-        return f"{host_name} ({device.hostname}): BGP verification failed - {error}"
+    return _verify(device, host_name, 'bgp_verification', fresh, log)
 
-def verify_ospf(device, host_name):
+def verify_ospf(device, host_name, fresh=False, log=print):
     """Verify OSPF state on the device."""
-    try:
-        # Run 'show ospf neighbor' and parse output
-        ospf_output = device.rpc.cli('show ospf neighbor', format='text')
-        ospf_text = ospf_output.text
-        if "Full" in ospf_text:
-            return f"{host_name} ({device.hostname}): OSPF is Full"
-        else:
-            return f"{host_name} ({device.hostname}): OSPF is NOT Full"
-    except Exception as error:
-        return f"{host_name} ({device.hostname}): OSPF verification failed - {error}"
+    return _verify(device, host_name, 'ospf_verification', fresh, log)
 
 def monitor_actions(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, actions):
     """Execute specified monitoring actions."""
@@ -69,15 +58,13 @@ def monitor_actions(username, password, host_ips, hosts, connect_to_hosts, disco
             print("No devices connected for protocol verification.")
             return
 
-        host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+        # One engine pass: both profiles' RPCs run concurrently across devices
+        from collection_engine import collect, write_results
+        profiles = [action for action in ('bgp_verification', 'ospf_verification') if action in actions]
+        collected = collect(connections, hosts, profiles)
         results = []
-
-        for dev in connections:
-            host_name = host_lookup.get(dev.hostname, dev.hostname)
-            if 'bgp_verification' in actions:
-                results.append(verify_bgp(dev, host_name))
-            if 'ospf_verification' in actions:
-                results.append(verify_ospf(dev, host_name))
+        for profile_name in profiles:
+            results.extend(write_results(collected, profile_name))
 
         # Print verification results
         print("\nProtocol Verification Results:")
@@ -0,0 +1,169 @@
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from fleet_store import FleetStore
+
+REPORT_DIR = os.path.join(SCRIPT_DIR, '../reports')
+
+RX_THRESHOLD = -20.0  # dBm below which a receive level is treated as failing
+TX_THRESHOLD = -8.0   # dBm below which a transmit level is treated as failing
+SECONDS_PER_DAY = 86400.0
+
+
+def link_trends(ts, link, values, window=5):
+    """Per-link least-squares slope, rolling mean and latest reading, computed for all links at once.
+
+    Args:
+        ts (numpy.ndarray): Capture times in epoch seconds.
+        link (numpy.ndarray): Dense link index (0..n_links-1) of every reading.
+        values (numpy.ndarray): Readings in dBm; NaN readings are ignored.
+        window (int): Number of most recent readings averaged for the rolling mean.
+    Returns:
+        dict: Arrays indexed by link: samples, slope (dB/day), fitted (regression level at the last reading),
+            mean (rolling), latest, first_ts, last_ts.
+    """
+    valid = ~np.isnan(values)
+    ts, link, values = ts[valid], link[valid], values[valid].astype(np.float64)
+    n_links = int(link.max()) + 1 if len(link) else 0
+
+    # Readings grouped per link, oldest first, so each link is one contiguous run
+    order = np.lexsort((ts, link))
+    ts, link, values = ts[order], link[order], values[order]
+    days = (ts - ts.min()) / SECONDS_PER_DAY if len(ts) else ts.astype(np.float64)
+
+    # Ordinary least squares per link from bincount sums: slope = (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2)
+    n = np.bincount(link, minlength=n_links).astype(np.float64)
+    sx = np.bincount(link, days, minlength=n_links)
+    sy = np.bincount(link, values, minlength=n_links)
+    sxx = np.bincount(link, days * days, minlength=n_links)
+    sxy = np.bincount(link, days * values, minlength=n_links)
+    denominator = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(denominator > 1e-12, (n * sxy - sx * sy) / denominator, np.nan)
+
+    # Rolling mean of the last `window` readings of each link, from one cumulative sum
+    ends = np.cumsum(n).astype(np.int64) - 1
+    starts = ends - np.minimum(n.astype(np.int64), window) + 1
+    present = n > 0
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    mean = np.full(n_links, np.nan)
+    mean[present] = ((cumulative[ends[present] + 1] - cumulative[starts[present]]) /
+                     (ends[present] - starts[present] + 1))
+    latest = np.full(n_links, np.nan)
+    latest[present] = values[ends[present]]
+    fitted = np.full(n_links, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        intercept = (sy - slope * sx) / n
+    fitted[present] = intercept[present] + slope[present] * days[ends[present]]
+    first_ts = np.zeros(n_links, dtype=np.int64)
+    last_ts = np.zeros(n_links, dtype=np.int64)
+    group_starts = ends - n.astype(np.int64) + 1
+    first_ts[present] = ts[group_starts[present]]
+    last_ts[present] = ts[ends[present]]
+    return {'samples': n.astype(np.int64), 'slope': slope, 'fitted': fitted, 'mean': mean, 'latest': latest,
+            'first_ts': first_ts, 'last_ts': last_ts}
+
+
+def forecast_crossing(level, slope, threshold):
+    """Days until a level reaches the threshold at the current slope.
+
+    Returns 0 for links already at or below the threshold and inf for links that are stable or improving.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        days = np.where(slope < 0, (threshold - level) / slope, np.inf)
+    days = np.where(level <= threshold, 0.0, days)
+    return np.where(np.isnan(days), np.inf, days)
+
+
+def analyze(store=None, since=None, until=None, device=None, metric='rx_dbm', threshold=None,
+            horizon=30, window=5, min_samples=3, min_slope=0.05):
+    """Flag optics whose level is below the threshold or forecast to cross it within the horizon.
+
+    Args:
+        metric (str): 'rx_dbm' or 'tx_dbm'.
+        threshold (float): Failure level in dBm; defaults to RX_THRESHOLD/TX_THRESHOLD.
+        horizon (int): Forecast horizon in days.
+        window (int): Readings in the rolling mean.
+        min_samples (int): Readings a link needs before its slope is trusted.
+        min_slope (float): Decline in dB/day below which a link is considered stable.
+    Returns:
+        list: Flagged link dicts, soonest crossing first.
+    """
+    store = store or FleetStore()
+    threshold = threshold if threshold is not None else (RX_THRESHOLD if metric == 'rx_dbm' else TX_THRESHOLD)
+    rows = store.load('optics', device=device, since=since, until=until)
+    if since:
+        rows = rows[rows['ts'] >= int(since.timestamp())]
+    if until:
+        rows = rows[rows['ts'] <= int(until.timestamp())]
+    if not len(rows):
+        return []
+
+    # One dense index per (device, interface) pair
+    pairs = (rows['device'].astype(np.uint64) << np.uint64(32)) | rows['interface'].astype(np.uint64)
+    keys, link = np.unique(pairs, return_inverse=True)
+    trends = link_trends(rows['ts'], link.ravel(), rows[metric], window=window)
+    slope = np.where(trends['samples'] >= min_samples, trends['slope'], np.nan)
+    declining = np.where(slope <= -min_slope, slope, 0.0)
+    # Project from the regression line when the slope is trusted; the rolling mean lags a steady decline
+    level = np.where(np.isnan(slope), trends['mean'], trends['fitted'])
+    days = forecast_crossing(level, declining, threshold)
+    flagged = np.flatnonzero((days <= horizon) & (trends['samples'] > 0))
+
+    strings = store.strings
+    results = []
+    for index in flagged[np.argsort(days[flagged], kind='stable')].tolist():
+        key = int(keys[index])
+        results.append({
+            'device': strings.lookup(key >> 32),
+            'interface': strings.lookup(key & 0xFFFFFFFF),
+            'samples': int(trends['samples'][index]),
+            'latest_dbm': round(float(trends['latest'][index]), 2),
+            'mean_dbm': round(float(trends['mean'][index]), 2),
+            'slope_db_per_day': None if np.isnan(slope[index]) else round(float(slope[index]), 3),
+            'days_to_threshold': round(float(days[index]), 1),
+            'status': 'below threshold' if days[index] == 0 else 'degrading',
+            'last_seen': datetime.fromtimestamp(int(trends['last_ts'][index])).isoformat(sep=' ')
+        })
+    return results
+
+
+def main():
+    """Report optics that are failing or trending towards failure."""
+    parser = argparse.ArgumentParser(description='Optics degradation trending from baseline history')
+    parser.add_argument('--metric', choices=['rx_dbm', 'tx_dbm'], default='rx_dbm', help='Reading to trend')
+    parser.add_argument('--threshold', type=float, help='Failure level in dBm (default -20 rx, -8 tx)')
+    parser.add_argument('--horizon', type=int, default=30, help='Forecast horizon in days')
+    parser.add_argument('--window', type=int, default=5, help='Readings in the rolling mean')
+    parser.add_argument('--days', type=int, default=90, help='History to load, in days')
+    parser.add_argument('--device', help='Device host name')
+    args = parser.parse_args()
+
+    started = datetime.now()
+    results = analyze(since=started - timedelta(days=args.days), device=args.device, metric=args.metric,
+                      threshold=args.threshold, horizon=args.horizon, window=args.window)
+    elapsed = (datetime.now() - started).total_seconds()
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_file = os.path.join(REPORT_DIR, f"optics_trend_{started:%Y%m%d_%H%M%S}.txt")
+    lines = []
+    for r in results:
+        slope = 'N/A' if r['slope_db_per_day'] is None else r['slope_db_per_day']
+        lines.append(f"{r['device']:<20} {r['interface']:<16} {r['status']:<16} latest {r['latest_dbm']:>7} dBm  "
+                     f"mean {r['mean_dbm']:>7} dBm  slope {slope:>7} dB/day  "
+                     f"crossing in {r['days_to_threshold']} days\n")
+    with open(report_file, 'w') as f:
+        f.write(f"Optics trend ({args.metric}, last {args.days} days, horizon {args.horizon} days)\n")
+        f.writelines(lines)
+    sys.stdout.writelines(lines)
+    print(f"{len(results)} optics flagged in {elapsed:.2f} s; report saved to {report_file}")
+
+if __name__ == "__main__":
+    main()
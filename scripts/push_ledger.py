@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from utils import update_json_file
+
+# Last successfully committed rendered config per device and template, keyed by host IP
+PUSH_LEDGER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../cache/push_ledger.json')
+
+_ledger = None
+_lock = threading.Lock()
+
+
+def _load_ledger():
+    """Load the ledger from disk once per process."""
+    global _ledger
+    if _ledger is None:
+        try:
+            with open(PUSH_LEDGER_FILE, 'r') as ledger_file:
+                _ledger = json.load(ledger_file)
+        except FileNotFoundError:
+            _ledger = {}
+        except (json.JSONDecodeError, OSError) as error:
+            print(f"Warning: Ignoring unreadable push ledger '{PUSH_LEDGER_FILE}': {error}")
+            _ledger = {}
+    return _ledger
+
+
+def _update_ledger(update):
+    """Apply update(ledger) to the file under its cross-process lock, then keep the result in memory."""
+    global _ledger
+    _ledger = update_json_file(PUSH_LEDGER_FILE, update)
+
+
+def config_hash(config):
+    """Hash rendered set commands, ignoring blank lines and surrounding whitespace."""
+    lines = [line.strip() for line in config.splitlines() if line.strip()]
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def config_version(dev):
+    """Identify the device's running config by its latest commit (time, user and client).
+
+    One small get-commit-information RPC; any commit made since the last push, by anyone, changes it.
+    """
+    try:
+        reply = dev.rpc.get_commit_information()
+    except Exception as error:
+        print(f"Could not read commit information from {dev.hostname}: {error}")
+        return None  # Unknown version never matches, so the device is pushed
+    latest = reply.find('.//commit-history')
+    if latest is None:
+        return None
+    date_time = latest.find('date-time')
+    stamp = (date_time.get('seconds') or date_time.text) if date_time is not None else ''
+    fields = (stamp, latest.findtext('user'), latest.findtext('client'))
+    return "|".join((field or '').strip() for field in fields)
+
+
+def is_unchanged(host_ip, template, rendered_hash, version):
+    """True if this rendered config was the last one committed and nothing was committed since."""
+    entry = _load_ledger().get(host_ip, {}).get(template)
+    return bool(entry and version and entry['hash'] == rendered_hash and entry['config_version'] == version)
+
+
+def record_push(host_ip, template, rendered_hash, version, change_number=None):
+    """Remember a successful commit of a rendered config."""
+    entry = {
+        'hash': rendered_hash,
+        'config_version': version,
+        'change': change_number,
+        'committed_at': datetime.now().isoformat(timespec='seconds')
+    }
+    with _lock:
+        _update_ledger(lambda ledger: ledger.setdefault(host_ip, {}).update({template: entry}))
+
+
+def forget(host_ip=None):
+    """Drop ledger entries for one device, or all of them, so the next run pushes again."""
+    def drop(ledger):
+        if host_ip is None:
+            ledger.clear()
+        else:
+            ledger.pop(host_ip, None)
+
+    with _lock:
+        _update_ledger(drop)
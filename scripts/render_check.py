@@ -0,0 +1,204 @@
+import os
+import re
+import sys
+import shlex
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+TEMPLATE_DIR = os.path.join(SCRIPT_DIR, '../templates')
+RENDER_DIR = os.path.join(SCRIPT_DIR, '../rendered')
+
+_COMMAND_RE = re.compile(r'^(set|delete|activate|deactivate|protect|unprotect)\s+\S')
+_QUOTED_RE = re.compile(r'"[^"]*"')
+
+# Leaves that hold exactly one value: two different values for the same path is a conflict
+SINGLE_VALUE_LEAVES = {'description', 'peer-as', 'local-as', 'metric', 'host-name', 'type', 'mtu',
+                       'autonomous-system', 'router-id', 'preference', 'vlan-id', 'interface-mode'}
+
+_env = None  # Strict Jinja2 environment, one per worker process
+
+
+def lint_set_commands(config):
+    """Check rendered set commands locally, without a device.
+
+    Flags lines that are not set/delete commands, unbalanced quotes, empty or 'None' values left by
+    missing variables, duplicate lines, two values for a single-value leaf, and set lines that a later
+    delete removes again.
+
+    Returns:
+        tuple: (errors, warnings) as lists of 'line N: message' strings.
+    """
+    errors, warnings = [], []
+    seen = {}       # Line -> first line number
+    leaves = {}     # Single-value leaf path -> (value, line number)
+    set_paths = []  # (tokens, line number) of set lines, for set-then-delete conflicts
+    for number, raw in enumerate(config.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not _COMMAND_RE.match(line):
+            errors.append(f"line {number}: not a set/delete command: {line}")
+            continue
+        try:
+            tokens = shlex.split(line)
+        except ValueError:
+            errors.append(f"line {number}: unbalanced quotes: {line}")
+            continue
+        if 'None' in tokens or '' in tokens or re.search(r'\s{2,}', _QUOTED_RE.sub('""', line)):
+            errors.append(f"line {number}: empty or None value (missing variable?): {line}")
+            continue
+        normalized = " ".join(tokens)
+        if normalized in seen:
+            warnings.append(f"line {number}: duplicate of line {seen[normalized]}: {line}")
+            continue
+        seen[normalized] = number
+
+        if tokens[0] == 'set':
+            if len(tokens) >= 3 and tokens[-2] in SINGLE_VALUE_LEAVES:
+                path = " ".join(tokens[1:-1])
+                previous = leaves.setdefault(path, (tokens[-1], number))
+                if previous[0] != tokens[-1]:
+                    errors.append(f"line {number}: conflicts with line {previous[1]}: "
+                                  f"{path} is '{previous[0]}' and '{tokens[-1]}'")
+            set_paths.append((tokens[1:], number))
+        elif tokens[0] == 'delete':
+            path = tokens[1:]
+            for set_tokens, set_number in set_paths:
+                if set_tokens[:len(path)] == path:
+                    errors.append(f"line {number}: deletes what line {set_number} sets: {line}")
+                    break
+    return errors, warnings
+
+
+def _strict_env():
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader, StrictUndefined
+        _env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), undefined=StrictUndefined)
+    return _env
+
+
+def template_names():
+    """Every Jinja2 template in templates/."""
+    return sorted(name for name in os.listdir(TEMPLATE_DIR) if name.endswith('.j2'))
+
+
+def template_variables(template_name):
+    """Top-level variables a template reads."""
+    from jinja2 import meta
+    env = _strict_env()
+    source = env.loader.get_source(env, template_name)[0]
+    return meta.find_undeclared_variables(env.parse(source))
+
+
+def render_host(task):
+    """Render and lint every applicable template for one host (runs in a worker process).
+
+    A template applies to a host when the host defines at least one of its top-level variables; any
+    other variable it needs must then be present too, or rendering fails as undefined.
+
+    Args:
+        task (tuple): (host dict, template names, output directory or None).
+    Returns:
+        dict: host_name, ip_address and one result per applicable template.
+    """
+    from jinja2 import TemplateError, UndefinedError
+    host, names, output_dir = task
+    results = []
+    for name in names:
+        variables = template_variables(name)
+        if variables and not variables & set(host):
+            continue  # Not meant for this host
+        result = {'template': name, 'errors': [], 'warnings': [], 'path': None, 'lines': 0}
+        try:
+            config = _strict_env().get_template(name).render(**host)
+        except UndefinedError as error:
+            result['errors'].append(f"undefined variable: {error}")
+            results.append(result)
+            continue
+        except TemplateError as error:
+            result['errors'].append(f"template error: {error}")
+            results.append(result)
+            continue
+        config = "\n".join(line.strip() for line in config.splitlines() if line.strip())
+        if not config:
+            continue  # Template renders nothing for this host
+        result['errors'], result['warnings'] = lint_set_commands(config)
+        result['lines'] = config.count("\n") + 1
+        if output_dir:
+            host_dir = os.path.join(output_dir, host['host_name'])
+            os.makedirs(host_dir, exist_ok=True)
+            result['path'] = os.path.join(host_dir, f"{os.path.splitext(name)[0]}.set")
+            with open(result['path'], 'w') as f:
+                f.write(config + "\n")
+        results.append(result)
+    return {'host_name': host['host_name'], 'ip_address': host.get('ip_address'), 'results': results}
+
+
+def render_fleet(hosts, templates=None, output_dir=RENDER_DIR, max_workers=None):
+    """Render and lint templates for every host in a process pool, before any SSH session is opened.
+
+    Args:
+        hosts (list): Host dicts as returned by merge_host_data.
+        templates (list): Template names; defaults to every template in templates/.
+        output_dir (str): Where rendered/<host>/<template>.set files go; None writes nothing.
+    Returns:
+        list: render_host results in host order.
+    """
+    names = templates or template_names()
+    tasks = [(host, names, output_dir) for host in hosts]
+    if not tasks:
+        return []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(render_host, tasks, chunksize=max(1, len(tasks) // 64)))
+
+
+def failed_hosts(results):
+    """IPs of hosts with at least one lint or render error."""
+    return {r['ip_address'] for r in results if any(t['errors'] for t in r['results'])}
+
+
+def print_summary(results):
+    """Print per-host errors/warnings and a one-line total; returns the number of failing hosts."""
+    failed = 0
+    for host in results:
+        problems = [(t['template'], level, message) for t in host['results']
+                    for level, messages in (('ERROR', t['errors']), ('WARNING', t['warnings'])) for message in messages]
+        if any(level == 'ERROR' for _, level, _ in problems):
+            failed += 1
+        for template, level, message in problems:
+            print(f"{host['host_name']} {template}: {level} {message}")
+    rendered = sum(len(host['results']) for host in results)
+    print(f"Rendered {rendered} configs for {len(results)} hosts; {failed} hosts failed validation")
+    return failed
+
+
+def main():
+    """Render every template for every host offline and lint the set commands."""
+    from utils import merge_host_data
+    parser = argparse.ArgumentParser(description='Offline render and pre-validation of device configs')
+    parser.add_argument('--templates', nargs='+', help='Template names (default: all in templates/)')
+    parser.add_argument('--host', action='append', help='Only this host name (repeatable)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    merged_data = merge_host_data(os.path.join(SCRIPT_DIR, "../data/inventory.yml"),
+                                  os.path.join(SCRIPT_DIR, "../data/hosts_data.yml"))
+    if not merged_data:
+        print("Failed to merge host data. Exiting.")
+        sys.exit(1)
+    hosts = [h for h in merged_data.get('hosts', []) if not args.host or h['host_name'] in args.host]
+
+    started = datetime.now()
+    results = render_fleet(hosts, args.templates, max_workers=args.workers)
+    failed = print_summary(results)
+    print(f"Set files written to {os.path.abspath(RENDER_DIR)} in {(datetime.now() - started).total_seconds():.2f} s")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
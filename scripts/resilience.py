@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from concurrency import limiter, device_key
+from utils import locked_file, write_json_atomic
+
+# Per-device circuit breaker state, shared by every action, poll and process on this host
+BREAKER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../cache/circuit_breakers.json')
+
+FAILURE_THRESHOLD = 3  # Consecutive failed connects before a device's circuit opens
+OPEN_SECONDS = 60      # First wait before a probe is allowed; doubles after each failed probe...
+MAX_OPEN_SECONDS = 1800  # ...up to this
+
+# Error class names worth retrying: the device may answer on the next attempt
+_TRANSIENT_ERRORS = ('Timeout', 'ConnectRefused', 'ConnectClosed', 'ConnectionReset', 'SSHException',
+                     'EOFError', 'socket')
+# Errors that prove the device is alive; they never open a circuit
+_ALIVE_ERRORS = ('ConnectAuthError', 'ConnectNotMasterError', 'RpcError')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of connecting to a device whose circuit is open."""
+
+
+def _matches(error, names):
+    return any(name in type(error).__name__ or name in type(error).__module__ for name in names)
+
+
+def is_transient(error):
+    """True for timeouts and dropped or refused connections."""
+    return _matches(error, _TRANSIENT_ERRORS)
+
+
+def retry(operation, attempts=3, base_delay=1.0, max_delay=15.0, retry_on=is_transient, sleep=limiter.pause):
+    """Call operation() until it succeeds, retrying transient errors with jittered exponential backoff.
+
+    Delays use 'full jitter': a random time between 0 and min(max_delay, base_delay * 2**attempt), so
+    many devices failing together do not retry in lockstep. Non-transient errors are raised at once.
+    The default sleep hands the caller's limiter slots back while it waits, so a backoff does not
+    keep other devices from running.
+    """
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except Exception as error:
+            if attempt == attempts - 1 or not retry_on(error):
+                raise
+            sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+class CircuitBreakers:
+    """Closed / open / half-open circuit per device, persisted so the state outlives one run.
+
+    Closed: connects go through. After FAILURE_THRESHOLD consecutive failures the circuit opens and
+    connects are refused until its wait expires; then one probe is let through (half-open). A successful
+    probe closes the circuit; a failed one re-opens it with twice the wait.
+    Every change re-reads the file under a lock shared by all processes, so none of their updates is lost.
+    """
+
+    def __init__(self, path=BREAKER_FILE, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS,
+                 max_open_seconds=MAX_OPEN_SECONDS):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._state = {}
+        self._mtime = None
+        self._probing = set()  # Devices with a half-open probe in flight in this process
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        """Reload when another process has written the file since we last read it."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if force or mtime != self._mtime:
+            try:
+                with open(self.path, 'r') as f:
+                    self._state = json.load(f)
+                self._mtime = mtime
+            except (json.JSONDecodeError, OSError) as error:
+                print(f"Warning: Ignoring unreadable circuit breaker state '{self.path}': {error}")
+
+    def _save(self):
+        write_json_atomic(self.path, self._state)
+        self._mtime = os.path.getmtime(self.path)
+
+    def allow(self, device):
+        """Return True if a connect to the device may be attempted now."""
+        with self._lock:
+            self._refresh()
+            entry = self._state.get(device)
+            if not entry or entry['state'] == 'closed':
+                return True
+            if time.time() < entry['retry_at'] or device in self._probing:
+                return False
+            self._probing.add(device)  # Half-open: this caller is the probe
+            return True
+
+    def probing(self, device):
+        """True while this process holds the half-open probe of the device."""
+        with self._lock:
+            return device in self._probing
+
+    def retry_in(self, device):
+        """Seconds until an open circuit allows its next probe."""
+        entry = self._state.get(device)
+        return max(0, round(entry['retry_at'] - time.time())) if entry else 0
+
+    def record_success(self, device):
+        with self._lock, locked_file(self.path):
+            self._probing.discard(device)
+            self._refresh(force=True)
+            if device in self._state:
+                del self._state[device]
+                self._save()
+
+    def record_failure(self, device, error):
+        """Count a failed connect; returns True if the circuit is (now) open."""
+        with self._lock, locked_file(self.path):
+            self._probing.discard(device)
+            self._refresh(force=True)
+            entry = self._state.setdefault(device, {'state': 'closed', 'failures': 0, 'open_seconds': 0})
+            entry['failures'] += 1
+            entry['last_error'] = str(error)[:200]
+            entry['last_failure'] = time.time()
+            if entry['state'] == 'open':
+                entry['open_seconds'] = min(self.max_open_seconds, entry['open_seconds'] * 2)  # Probe failed
+            elif entry['failures'] >= self.failure_threshold:
+                entry['state'] = 'open'
+                entry['open_seconds'] = self.open_seconds
+            if entry['state'] == 'open':
+                entry['retry_at'] = time.time() + entry['open_seconds']
+            self._save()
+            return entry['state'] == 'open'
+
+    def reset(self, device=None):
+        """Close one device's circuit, or all of them."""
+        with self._lock, locked_file(self.path):
+            self._refresh(force=True)
+            if device is None:
+                self._state.clear()
+            else:
+                self._state.pop(device, None)
+            self._save()
+
+    def open_devices(self):
+        """Devices whose circuit is currently open, with their state."""
+        with self._lock:
+            self._refresh()
+            return {device: dict(entry) for device, entry in self._state.items() if entry['state'] == 'open'}
+
+
+# Breakers shared by every connection in this process
+breakers = CircuitBreakers()
+
+
+def guarded_call(device, operation, attempts=3):
+    """Run operation() for a device through its circuit breaker, with retries for transient errors.
+
+    Raises:
+        CircuitOpenError: The device is known dead and its next probe is not due yet.
+    """
+    if not breakers.allow(device):
+        raise CircuitOpenError(f"circuit open, next probe in {breakers.retry_in(device)}s")
+    try:
+        result = retry(operation, attempts=attempts)
+    except Exception as error:
+        if not _matches(error, _ALIVE_ERRORS):
+            breakers.record_failure(device, error)
+        else:
+            breakers.record_success(device)  # Reachable; the failure is not about liveness
+        raise
+    breakers.record_success(device)
+    return result
+
+
+def reconnect(dev):
+    """Replace a device's NETCONF session with a fresh one; raises if the device does not answer."""
+    try:
+        dev.close()
+    except Exception:
+        pass  # The old session is usually already gone
+    dev.open()
+
+
+def guarded_poll(dev, operation):
+    """Run operation(dev) on a connected device through its circuit breaker.
+
+    Polls are not retried here; the next scheduled poll is the retry. Timeouts and dropped connections
+    count as failures, any other error proves the device answered. A dead session is reopened first,
+    and so is the session of a half-open probe, since it died with the device.
+
+    Raises:
+        CircuitOpenError: The device is known dead and its next probe is not due yet.
+    """
+    device = device_key(dev)
+    if not breakers.allow(device):
+        raise CircuitOpenError(f"circuit open, next probe in {breakers.retry_in(device)}s")
+    try:
+        if breakers.probing(device) or not getattr(dev, 'connected', True):
+            reconnect(dev)
+        result = operation(dev)
+    except Exception as error:
+        if is_transient(error) or _matches(error, ('ConnectError',)):
+            breakers.record_failure(device, error)
+        else:
+            breakers.record_success(device)
+        raise
+    breakers.record_success(device)
+    return result
+
+
+def main():
+    """List open circuits or close them by hand."""
+    parser = argparse.ArgumentParser(description='Per-device circuit breakers')
+    parser.add_argument('--reset', nargs='*', metavar='HOST_IP', help='Close these circuits (all if none given)')
+    args = parser.parse_args()
+
+    if args.reset is not None:
+        for device in args.reset or [None]:
+            breakers.reset(device)
+        print(f"Closed {', '.join(args.reset) if args.reset else 'all'} circuits")
+        return
+    open_devices = breakers.open_devices()
+    for device, entry in sorted(open_devices.items()):
+        print(f"{device:<16} {entry['failures']:>3} failures  next probe in {breakers.retry_in(device):>5}s  "
+              f"{entry.get('last_error', '')}")
+    print(f"{len(open_devices)} open circuits")
+
+if __name__ == "__main__":
+    main()
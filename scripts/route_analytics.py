@@ -0,0 +1,197 @@
+import os
+import json
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+from route_table import PREFIX_BYTES, Interner, format_destination
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../logs/route_changes.log')
+
+# Dampening defaults follow the usual BGP route-flap dampening figures
+PENALTY_PER_FLAP = 1000
+SUPPRESS_THRESHOLD = 2000
+REUSE_THRESHOLD = 750
+HALF_LIFE = 900  # Seconds for a penalty to decay by half
+
+# State key: big-endian scope ID, then the destination part of a route row so keys sort by device/table first
+STATE_KEY_DTYPE = np.dtype([('scope', '>u4'), ('family', 'u1'), ('hi', '>u8'), ('lo', '>u8'), ('plen', 'u1')])
+STATE_KEY_BYTES = STATE_KEY_DTYPE.itemsize
+
+
+class FlapAnalyzer:
+    """Streaming flap, churn and dampening-penalty analytics over route change events.
+
+    Per-prefix state lives in NumPy arrays sorted by a key of the interned device/table ID followed by
+    the destination bytes, so one poll's changes are decayed, counted and checked in a few vectorized
+    steps even when a whole table is withdrawn or re-learnt.
+
+    Memory stays bounded: at most max_prefixes prefixes are tracked (least recently changed are
+    dropped first), each keeps at most flap_threshold timestamps, and churn keeps one bucket per poll
+    within the window.
+    """
+
+    def __init__(self, window=900, flap_threshold=5, churn_threshold=1000, max_prefixes=200000,
+                 log_file=LOG_FILE):
+        self.window = window                    # Sliding window in seconds for flap counts and churn rate
+        self.flap_threshold = flap_threshold    # Changes of one prefix within the window that raise an alert
+        self.churn_threshold = churn_threshold  # Changes per minute for a device/table that raise an alert
+        self.max_prefixes = max_prefixes
+        self.log_file = log_file
+        self._scopes = Interner()       # (device, table) -> scope ID at the front of every state key
+        self._keys = np.empty(0, dtype=f'V{STATE_KEY_BYTES}')  # Sorted state keys; the arrays below follow them
+        self._penalty = np.empty(0, dtype=np.float64)
+        self._updated = np.empty(0, dtype=np.float64)
+        self._suppressed = np.empty(0, dtype=bool)  # Currently over the suppress threshold
+        self._flaps = np.empty((0, flap_threshold), dtype=np.float64)  # Flap times, newest in the last column
+        self._flap_count = np.empty(0, dtype=np.int64)
+        self._churn = {}                # (device, table) -> deque of (time, changes)
+        self._churn_alerted = set()
+
+    def _churn_rate(self, device, table, now, changes):
+        buckets = self._churn.setdefault((device, table), deque())
+        buckets.append((now, changes))
+        while buckets and buckets[0][0] < now - self.window:
+            buckets.popleft()
+        span = max(now - buckets[0][0], 60.0)  # At least a minute so one poll does not look like a spike
+        return sum(count for _, count in buckets) * 60.0 / span
+
+    def _state_keys(self, device, table, prefix_keys):
+        """Prefix the destination keys with the device/table scope ID."""
+        keys = np.empty(len(prefix_keys), dtype=[('scope', '>u4'), ('prefix', f'V{PREFIX_BYTES}')])
+        keys['scope'] = self._scopes.intern((device, table))
+        keys['prefix'] = prefix_keys
+        return keys.view(f'V{STATE_KEY_BYTES}')
+
+    def process(self, device, table, timestamp, added, removed):
+        """Account for one poll's changes of a table and return the records written to the log.
+
+        Args:
+            device (str): Device host name.
+            table (str): Routing table name.
+            timestamp (datetime): Poll time.
+            added (RouteTable): Routes that appeared since the previous poll.
+            removed (RouteTable): Routes that went away since the previous poll.
+        Returns:
+            list: Structured records (one churn summary plus any alerts).
+        """
+        now = timestamp.timestamp()
+        time_str = timestamp.isoformat(sep=' ', timespec='seconds')
+        changes = len(added) + len(removed)
+        rate = self._churn_rate(device, table, now, changes)
+        records = [{'time': time_str, 'event': 'route_churn', 'device': device, 'table': table,
+                    'added': len(added), 'removed': len(removed), 'rate_per_min': round(rate, 1)}]
+
+        if rate >= self.churn_threshold and (device, table) not in self._churn_alerted:
+            self._churn_alerted.add((device, table))
+            records.append({'time': time_str, 'event': 'alert', 'type': 'churn', 'device': device, 'table': table,
+                            'rate_per_min': round(rate, 1), 'threshold': self.churn_threshold})
+        elif rate < self.churn_threshold / 2:
+            self._churn_alerted.discard((device, table))  # Re-arm once churn has clearly settled
+
+        if changes:
+            # A next-hop change shows up as add+remove of one destination; count it as one flap
+            keys = np.concatenate([added._row_keys(prefix_only=True), removed._row_keys(prefix_only=True)])
+            for alert in self._flap(self._state_keys(device, table, np.unique(keys)), now):
+                alert.update(time=time_str, device=device, table=table)
+                records.append(alert)
+
+        records.extend(self._reuse(now, time_str))
+        self._write(records)
+        return records
+
+    def _reuse(self, now, time_str):
+        """Release suppressed prefixes whose decayed penalty fell below the reuse threshold."""
+        suppressed = np.flatnonzero(self._suppressed)
+        penalty = self._penalty[suppressed] * 0.5 ** ((now - self._updated[suppressed]) / HALF_LIFE)
+        released = penalty < REUSE_THRESHOLD
+        self._suppressed[suppressed[released]] = False
+        alerts = []
+        for index, penalty in zip(suppressed[released].tolist(), penalty[released].tolist()):
+            (device, table), destination = self._describe(index)
+            alerts.append({'time': time_str, 'event': 'alert', 'type': 'dampening_reuse', 'device': device,
+                           'table': table, 'destination': destination, 'penalty': round(penalty)})
+        return alerts
+
+    def _flap(self, keys, now):
+        """Update the penalty and flap window of every changed prefix; return alert dicts for thresholds crossed.
+
+        Args:
+            keys (numpy.ndarray): Sorted, unique state keys of the prefixes that changed in this poll.
+            now (float): Poll time as a UNIX timestamp.
+        """
+        positions = np.searchsorted(self._keys, keys)
+        known = positions < len(self._keys)
+        known[known] = self._keys[positions[known]] == keys[known]
+        if not known.all():
+            self._insert(positions[~known], keys[~known])
+            positions = np.searchsorted(self._keys, keys)
+
+        penalty = self._penalty[positions] * 0.5 ** ((now - self._updated[positions]) / HALF_LIFE) + PENALTY_PER_FLAP
+        self._penalty[positions] = penalty
+        self._updated[positions] = now
+        flaps = self._flaps[positions]
+        flaps[:, :-1] = flaps[:, 1:]
+        flaps[:, -1] = now
+        self._flaps[positions] = flaps
+        count = np.minimum(self._flap_count[positions] + 1, self.flap_threshold)
+
+        suppress = ~self._suppressed[positions] & (penalty >= SUPPRESS_THRESHOLD)
+        self._suppressed[positions[suppress]] = True
+        flapping = (count == self.flap_threshold) & (flaps[:, 0] >= now - self.window)
+        count[flapping] = 0  # Alert once per threshold's worth of flaps
+        self._flap_count[positions] = count
+
+        alerts = []
+        for index in np.flatnonzero(suppress | flapping).tolist():
+            # Only format the destination when an alert actually needs it
+            destination = self._describe(positions[index])[1]
+            rounded = round(float(penalty[index]))
+            if suppress[index]:
+                alerts.append({'event': 'alert', 'type': 'dampening_suppress', 'penalty': rounded,
+                               'destination': destination})
+            if flapping[index]:
+                alerts.append({'event': 'alert', 'type': 'flap', 'flaps': self.flap_threshold,
+                               'window_s': self.window, 'penalty': rounded, 'destination': destination})
+        self._evict()
+        return alerts
+
+    def _insert(self, positions, keys):
+        """Add zeroed state for new keys at their sorted positions."""
+        self._keys = np.insert(self._keys, positions, keys)
+        self._penalty = np.insert(self._penalty, positions, 0.0)
+        self._updated = np.insert(self._updated, positions, 0.0)
+        self._suppressed = np.insert(self._suppressed, positions, False)
+        self._flaps = np.insert(self._flaps, positions, 0.0, axis=0)
+        self._flap_count = np.insert(self._flap_count, positions, 0)
+
+    def _evict(self):
+        """Drop the least recently changed prefixes above max_prefixes."""
+        if len(self._keys) <= self.max_prefixes:
+            return
+        keep = np.sort(np.argsort(self._updated, kind='stable')[len(self._keys) - self.max_prefixes:])
+        self._keys, self._penalty, self._updated = self._keys[keep], self._penalty[keep], self._updated[keep]
+        self._suppressed, self._flaps, self._flap_count = self._suppressed[keep], self._flaps[keep], self._flap_count[keep]
+
+    def _describe(self, index):
+        """(device, table) and destination string of the state at index."""
+        key = self._keys[index:index + 1].view(STATE_KEY_DTYPE)[0]
+        return (self._scopes.lookup(int(key['scope'])),
+                format_destination(key['family'], key['hi'], key['lo'], key['plen']))
+
+    def decayed_penalty(self, device, table, key, now=None):
+        """Current penalty of a tracked prefix key, decayed to now."""
+        state_key = self._state_keys(device, table, np.frombuffer(key, dtype=f'V{PREFIX_BYTES}'))
+        position = int(np.searchsorted(self._keys, state_key)[0])
+        if position == len(self._keys) or self._keys[position] != state_key[0]:
+            return 0.0
+        now = now if now is not None else datetime.now().timestamp()
+        return float(self._penalty[position] * 0.5 ** ((now - self._updated[position]) / HALF_LIFE))
+
+    def _write(self, records):
+        """Append records to the route change log as JSON lines in a single write."""
+        if not records:
+            return
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        with open(self.log_file, 'a') as log:
+            log.write("".join(json.dumps(record) + "\n" for record in records))
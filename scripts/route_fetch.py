@@ -0,0 +1,108 @@
+import queue
+import socket
+from utils import raw_rpc_reply, run_concurrently
+from route_table import RouteTable
+
+LARGE_TABLE_ROUTES = 50000  # Tables with at least this many routes are fetched in chunks
+CHUNK_PREFIX_BITS = 3       # Prefix-range chunks split the address space into 2**bits blocks
+
+
+def table_route_count(dev, table):
+    """Total routes in a table from 'show route summary', or None if it cannot be read."""
+    try:
+        summary = dev.rpc.get_route_summary_information(table=table)
+    except Exception:
+        return None
+    for route_table in summary.iter('route-table'):
+        if (route_table.findtext('table-name') or '').strip() == table:
+            count = (route_table.findtext('total-route-count') or '').strip()
+            return int(count) if count.isdigit() else None
+    return None
+
+
+def _block(width, bits, index):
+    """Address string of the index-th /bits block of a 32- or 128-bit address space."""
+    value = index << (width - bits)
+    if width == 32:
+        return socket.inet_ntoa(value.to_bytes(4, 'big'))
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))
+
+
+def plan_chunks(table, chunk_by='prefix', bits=CHUNK_PREFIX_BITS, protocols=None):
+    """Split one table fetch into get-route-information argument sets that together cover the table.
+
+    'prefix' uses 2**bits '<destination> longer' ranges of inet/inet6 tables, plus one chunk of exact
+    lookups for the few prefixes shorter than /bits (e.g. the default route) that no range returns;
+    the /bits blocks themselves come back with their '<block> longer' range.
+    'protocol' fetches one protocol per chunk; routes of protocols not listed are not fetched.
+    Tables that cannot be split (mpls.0 with prefix chunking) are fetched whole.
+    """
+    if chunk_by == 'protocol' and protocols:
+        return [{'protocol': protocol} for protocol in protocols]
+    if 'inet6' in table:
+        width = 128
+    elif table.startswith('inet.') or '.inet.' in table:
+        width = 32
+    else:
+        return [{}]
+    chunks = [{'destination': f"{_block(width, bits, index)}/{bits}", 'longer': True} for index in range(2 ** bits)]
+    short = [f"{_block(width, plen, index)}/{plen}" for plen in range(bits) for index in range(2 ** plen)]
+    chunks.append({'exact_destinations': short})
+    return chunks
+
+
+def _parse_reply(reply, executor=None):
+    """RouteTable of one raw reply, parsed here or, given a HybridExecutor, in its process pool."""
+    if executor is None:
+        return RouteTable.from_xml_stream(reply)
+    from hybrid_executor import parse_route_xml
+    return RouteTable.from_portable(executor.run(parse_route_xml, reply.getbuffer()))
+
+
+def fetch_chunk(dev, table, chunk, executor=None):
+    """Fetch one chunk as a raw reply and parse it incrementally into a RouteTable."""
+    if 'exact_destinations' in chunk:
+        return RouteTable.merge([
+            _parse_reply(raw_rpc_reply(dev, 'get_route_information', table=table, destination=destination,
+                                       exact=True), executor)
+            for destination in chunk['exact_destinations']])
+    return _parse_reply(raw_rpc_reply(dev, 'get_route_information', table=table, **chunk), executor)
+
+
+def fetch_route_table(dev, table, extra_sessions=(), chunk_by='prefix', bits=CHUNK_PREFIX_BITS, protocols=None,
+                      threshold=LARGE_TABLE_ROUTES, executor=None):
+    """Fetch one routing table as a RouteTable without ever holding the whole reply as an XML tree.
+
+    Small tables come in one streamed reply. Tables of threshold routes or more (or of unknown size)
+    are split with plan_chunks; the chunks are shared out over dev and any extra sessions to the same
+    device, each session working through the chunk queue in its own thread. Every chunk is parsed
+    into a compact RouteTable as soon as it arrives, so peak memory is about one chunk's reply per session.
+    Given a HybridExecutor, chunks are parsed in its process pool while the sessions fetch the next ones.
+
+    Raises:
+        Exception: The first chunk error; a partial table would show up as mass route withdrawal.
+    """
+    count = table_route_count(dev, table)
+    if count is not None and count < threshold:
+        return fetch_chunk(dev, table, {}, executor)
+
+    pending = queue.Queue()
+    for chunk in plan_chunks(table, chunk_by, bits, protocols):
+        pending.put(chunk)
+
+    def drain(session):
+        parts = []
+        while True:
+            try:
+                chunk = pending.get_nowait()
+            except queue.Empty:
+                return parts
+            parts.append(fetch_chunk(session, table, chunk, executor))
+
+    # Sessions to one device; the caller already holds this device's slot in the adaptive limiter
+    parts = []
+    for _, session_parts, error in run_concurrently([dev] + list(extra_sessions), drain, adaptive=False):
+        if error is not None:
+            raise error
+        parts.extend(session_parts)
+    return RouteTable.merge(parts)
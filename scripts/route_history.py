@@ -0,0 +1,258 @@
+import os
+import re
+import sys
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from route_table import (RouteTable, Interner, FAMILY_INET, FAMILY_INET6,
+                         parse_destination, format_destination)
+
+HISTORY_DIR = os.path.join(SCRIPT_DIR, '../history')
+
+# One change event: when, which destination, which next-hop/protocol, and whether it appeared (+1) or went away (-1).
+# Native little-endian so memory-mapped segments can be filtered without conversion.
+EVENT_DTYPE = np.dtype([('ts', '<i8'), ('family', 'u1'), ('hi', '<u8'), ('lo', '<u8'), ('plen', 'u1'),
+                        ('nh', '<u4'), ('proto', '<u2'), ('op', 'i1')])
+
+# routing/<host>_<table>_<YYYYmmdd_HHMMSS>.txt as written by route_monitor.save_routing_tables
+_CAPTURE_RE = re.compile(r'^(?P<host>.+)_(?P<table>[^_]+)_(?P<ts>\d{8}_\d{6})\.txt$')
+
+_MASK64 = (1 << 64) - 1
+
+
+def _safe_name(name):
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+class RouteHistory:
+    """Append-only store of route change events, one day-segment file per device and table.
+
+    Layout: history/<device>/<table>/<YYYYmmdd>.events (raw EVENT_DTYPE rows, read via np.memmap),
+    history/<device>/<table>/last.npy (latest snapshot, used to diff the next capture) and
+    history/strings.json (persistent next-hop/protocol IDs).
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self.next_hops = Interner()
+        self.protocols = Interner()
+        self._strings_file = os.path.join(root, 'strings.json')
+        self._strings_saved = (0, 0)
+        if os.path.exists(self._strings_file):
+            with open(self._strings_file, 'r') as f:
+                strings = json.load(f)
+            for value in strings.get('next_hops', []):
+                self.next_hops.intern(value)
+            for value in strings.get('protocols', []):
+                self.protocols.intern(value)
+            self._strings_saved = (len(self.next_hops), len(self.protocols))
+
+    def _table_dir(self, device, table):
+        return os.path.join(self.root, _safe_name(device), _safe_name(table))
+
+    def _save_strings(self):
+        if self._strings_saved == (len(self.next_hops), len(self.protocols)):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_file = f"{self._strings_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'next_hops': self.next_hops.strings, 'protocols': self.protocols.strings}, f)
+        os.replace(tmp_file, self._strings_file)
+        self._strings_saved = (len(self.next_hops), len(self.protocols))
+
+    def _to_persistent(self, table):
+        """Re-key a RouteTable's process-local next-hop/protocol IDs to this store's persistent IDs."""
+        rows = table.routes.copy()
+        if len(rows):
+            nh_map = np.array([self.next_hops.intern(s) for s in table.next_hops.strings], dtype=np.uint32)
+            proto_map = np.array([self.protocols.intern(s) for s in table.protocols.strings], dtype=np.uint16)
+            rows['nh'] = nh_map[rows['nh']]
+            rows['proto'] = proto_map[rows['proto']]
+        return RouteTable(rows, self.next_hops, self.protocols)
+
+    def record_snapshot(self, device, table_name, timestamp, table):
+        """Diff a new capture against the last stored one and append the resulting events.
+
+        Args:
+            device (str): Device host name.
+            table_name (str): Routing table, e.g. 'inet.0'.
+            timestamp (datetime): Capture time.
+            table (RouteTable): The new snapshot.
+        Returns:
+            tuple: (added, removed) counts.
+        """
+        table_dir = self._table_dir(device, table_name)
+        os.makedirs(table_dir, exist_ok=True)
+        current = self._to_persistent(table)
+        last_file = os.path.join(table_dir, 'last.npy')
+        if os.path.exists(last_file):
+            previous = RouteTable(np.load(last_file), self.next_hops, self.protocols)
+        else:
+            previous = RouteTable(None, self.next_hops, self.protocols)
+        added, removed = previous.diff(current)
+
+        events = np.zeros(len(added) + len(removed), dtype=EVENT_DTYPE)
+        if len(events):
+            both = np.concatenate([added.routes, removed.routes])
+            for field in ('family', 'hi', 'lo', 'plen', 'nh', 'proto'):
+                events[field] = both[field]
+            events['ts'] = int(timestamp.timestamp())
+            events['op'][:len(added)] = 1
+            events['op'][len(added):] = -1
+            self._save_strings()  # Strings must be durable before events refer to them
+            with open(os.path.join(table_dir, f"{timestamp:%Y%m%d}.events"), 'ab') as f:
+                f.write(events.tobytes())
+
+        tmp_file = os.path.join(table_dir, 'last.tmp.npy')
+        np.save(tmp_file, current.routes)
+        os.replace(tmp_file, last_file)
+        return len(added), len(removed)
+
+    def _segments(self, device=None, table=None, since=None, until=None):
+        """Yield (device, table, path) for segment files that can hold events in the time range."""
+        if not os.path.isdir(self.root):
+            return
+        first_day = f"{since:%Y%m%d}" if since else None
+        last_day = f"{until:%Y%m%d}" if until else None
+        for device_name in sorted(os.listdir(self.root)):
+            device_dir = os.path.join(self.root, device_name)
+            if not os.path.isdir(device_dir) or (device and device_name != _safe_name(device)):
+                continue
+            for table_name in sorted(os.listdir(device_dir)):
+                if table and table_name != _safe_name(table):
+                    continue
+                table_dir = os.path.join(device_dir, table_name)
+                for segment in sorted(os.listdir(table_dir)):
+                    if not segment.endswith('.events'):
+                        continue
+                    day = segment[:8]
+                    if (first_day and day < first_day) or (last_day and day > last_day):
+                        continue
+                    yield device_name, table_name, os.path.join(table_dir, segment)
+
+    def query(self, prefix=None, covering=None, device=None, table=None, next_hop=None, since=None, until=None):
+        """Return change events matching every given filter, oldest first.
+
+        Args:
+            prefix (str): Exact destination, e.g. '10.0.0.0/8'.
+            covering (str): Address or prefix; matches events for every prefix that contains it.
+            device (str): Device host name.
+            table (str): Routing table name.
+            next_hop (str): Substring of the next-hop text, e.g. '172.27.200.1'.
+            since (datetime): Earliest event time (inclusive).
+            until (datetime): Latest event time (inclusive).
+        Returns:
+            list: Event dicts with time, device, table, destination, protocol, next_hop and change.
+        """
+        exact = parse_destination(prefix) if prefix else None
+        cover = parse_destination(covering) if covering else None
+        if (prefix and exact is None) or (covering and cover is None):
+            raise ValueError(f"Invalid destination: {prefix or covering}")
+        nh_ids = None
+        if next_hop:
+            nh_ids = np.array([i for i, s in enumerate(self.next_hops.strings) if next_hop in s], dtype=np.uint32)
+        start = int(since.timestamp()) if since else None
+        end = int(until.timestamp()) if until else None
+
+        matches = []
+        for device_name, table_name, path in self._segments(device, table, since, until):
+            count = os.path.getsize(path) // EVENT_DTYPE.itemsize  # Ignore a torn trailing write
+            if not count:
+                continue
+            events = np.memmap(path, dtype=EVENT_DTYPE, mode='r', shape=(count,))
+            # Segments are appended in time order, so the time range is a slice
+            lo = np.searchsorted(events['ts'], start, side='left') if start is not None else 0
+            hi = np.searchsorted(events['ts'], end, side='right') if end is not None else count
+            window = events[lo:hi]
+            mask = np.ones(len(window), dtype=bool)
+            if exact:
+                mask &= ((window['family'] == exact[0]) & (window['hi'] == exact[1]) &
+                         (window['lo'] == exact[2]) & (window['plen'] == exact[3]))
+            if cover:
+                mask &= _covers(window, cover)
+            if nh_ids is not None:
+                mask &= np.isin(window['nh'], nh_ids)
+            for event in window[mask]:
+                matches.append({
+                    'time': datetime.fromtimestamp(int(event['ts'])).isoformat(sep=' '),
+                    'device': device_name,
+                    'table': table_name,
+                    'destination': format_destination(event['family'], event['hi'], event['lo'], event['plen']),
+                    'protocol': self.protocols.lookup(int(event['proto'])),
+                    'next_hop': self.next_hops.lookup(int(event['nh'])),
+                    'change': 'added' if event['op'] > 0 else 'removed'
+                })
+        matches.sort(key=lambda event: event['time'])
+        return matches
+
+
+def _covers(events, target):
+    """Mask of events whose prefix contains the target address/prefix (same family, shorter or equal length)."""
+    family, hi, lo, plen = target
+    if family not in (FAMILY_INET, FAMILY_INET6):
+        return np.zeros(len(events), dtype=bool)
+    lengths = events['plen'].astype(np.uint64)
+    if family == FAMILY_INET:
+        shift = np.uint64(32) - np.minimum(lengths, np.uint64(32))
+        mask_lo = (np.uint64(0xFFFFFFFF) >> shift) << shift
+        contains = (np.uint64(lo) & mask_lo) == events['lo']
+    else:
+        hi_shift = np.uint64(64) - np.minimum(lengths, np.uint64(64))
+        lo_shift = np.uint64(128) - np.maximum(lengths, np.uint64(64))
+        # Shifting a uint64 by 64 is undefined, so full-width masks are handled explicitly
+        mask_hi = np.where(hi_shift == 64, np.uint64(0), (np.uint64(_MASK64) >> hi_shift) << hi_shift)
+        mask_lo = np.where(lo_shift == 64, np.uint64(0), (np.uint64(_MASK64) >> lo_shift) << lo_shift)
+        contains = ((np.uint64(hi) & mask_hi) == events['hi']) & ((np.uint64(lo) & mask_lo) == events['lo'])
+    return (events['family'] == family) & (events['plen'] <= plen) & contains
+
+
+def ingest_routing_dir(history, routing_dir=os.path.join(SCRIPT_DIR, '../routing')):
+    """Backfill the store from saved route_monitor captures, oldest first."""
+    captures = []
+    for filename in os.listdir(routing_dir):
+        match = _CAPTURE_RE.match(filename)
+        if match:
+            captures.append((datetime.strptime(match['ts'], '%Y%m%d_%H%M%S'), match['host'], match['table'], filename))
+    for timestamp, host, table_name, filename in sorted(captures):
+        with open(os.path.join(routing_dir, filename), 'r') as f:
+            added, removed = history.record_snapshot(host, table_name, timestamp, RouteTable.from_text(f.read()))
+        print(f"Ingested {filename}: {added} added, {removed} removed")
+
+
+def main():
+    """Query or backfill the route history store."""
+    parser = argparse.ArgumentParser(description='Route change history')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('ingest', help='Backfill history from the routing/ captures')
+    query = subparsers.add_parser('query', help='Find route changes')
+    query.add_argument('--prefix', help='Exact destination, e.g. 10.0.0.0/8')
+    query.add_argument('--covering', help='Address or prefix; match every prefix containing it')
+    query.add_argument('--device', help='Device host name')
+    query.add_argument('--table', help='Routing table, e.g. inet.0')
+    query.add_argument('--next-hop', help='Next-hop text to match, e.g. 172.27.200.1')
+    query.add_argument('--since', type=datetime.fromisoformat, help='Start time, e.g. 2025-04-09T18:00')
+    query.add_argument('--until', type=datetime.fromisoformat, help='End time')
+    args = parser.parse_args()
+
+    history = RouteHistory()
+    if args.command == 'ingest':
+        ingest_routing_dir(history)
+        return
+
+    started = datetime.now()
+    events = history.query(prefix=args.prefix, covering=args.covering, device=args.device, table=args.table,
+                           next_hop=args.next_hop, since=args.since, until=args.until)
+    for event in events:
+        print(f"{event['time']}  {event['device']:<20} {event['table']:<8} {event['change']:<8} "
+              f"{event['destination']:<20} [{event['protocol']}] {event['next_hop']}")
+    elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+    print(f"{len(events)} events in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
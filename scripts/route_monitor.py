@@ -1,10 +1,32 @@
 import os
+import re
 import time
+import heapq
+import socket
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from jnpr.junos.exception import ConnectError
+from facts_cache import get_hostname
+from route_table import RouteTable
+from route_history import RouteHistory
+from route_analytics import FlapAnalyzer
+from event_log import log_event
+from utils import iter_concurrently
+from resilience import guarded_poll, breakers
 
-def capture_routing_tables(device, host_name, routing_dir):
-    """Capture routing tables and return them as a dict."""
+SYSLOG_PORT = 5514           # Unprivileged default; point the devices' 'syslog host' at it
+MIN_INTERVAL_FACTOR = 0.25   # A churning device is polled down to interval * this...
+MAX_INTERVAL_FACTOR = 4      # ...and a stable one backs off up to interval * this
+BACKOFF = 1.5                # Stretch of a device's interval after each poll without changes
+TRIGGER_DEBOUNCE = 3         # Seconds to wait after a routing event so a burst causes one capture
+BATCH_THREADS = 8            # Due batches captured at the same time
+
+# Syslog messages that mean the routing table is likely to change
+TRIGGER_RE = re.compile(r'\b(RPD_\w+|BGP_\w+|bgp_\w+|OSPF\w*|LDP_\w+|RSVP_\w+|UI_COMMIT\w*|SNMP_TRAP_LINK_\w+)')
+
+def capture_routing_tables(device, host_name, routing_dir, raise_errors=False):
+    """Capture routing tables and return them as a dict; None on failure unless raise_errors is set."""
     tables = {}
     try:
         # Capture each table specified in hosts_data.yml
@@ -14,40 +36,237 @@ def capture_routing_tables(device, host_name, routing_dir):
         return tables
     except Exception as error:
         print(f"Failed to capture routing tables for {host_name} ({device.hostname}): {error}")
+        if raise_errors:
+            raise
+        return None
+
+def capture_large_tables(device, host_name, tables, extra_sessions=(), executor=None, raise_errors=False):
+    """Fetch routing tables as compact RouteTables through chunked, streamed XML retrieval."""
+    from route_fetch import fetch_route_table
+    try:
+        return {table: fetch_route_table(device, table, extra_sessions, executor=executor) for table in tables}
+    except Exception as error:
+        print(f"Failed to capture routing tables for {host_name} ({device.hostname}): {error}")
+        if raise_errors:
+            raise
         return None
 
 def save_routing_tables(tables, host_name, routing_dir, timestamp):
     """Save routing tables to files."""
+    filepath = None
     for table_name, table_content in tables.items():
         filename = f"{host_name}_{table_name}_{timestamp}.txt"
         filepath = os.path.join(routing_dir, filename)
         with open(filepath, 'w') as f:
             f.write(table_content)
-        return filepath  # Return last filepath for reporting
+    return filepath  # Return last filepath for reporting
+
+def parse_tables(tables):
+    """Convert captured table text into compact RouteTable snapshots."""
+    return {table_name: RouteTable.from_text(text) for table_name, text in tables.items()}
 
 def compare_tables(old_tables, new_tables):
-    """Compare old and new routing tables, return changes."""
+    """Compare old and new RouteTable snapshots, return changes."""
     changes = {}
     for table_name in old_tables:
         if table_name not in new_tables:
             changes[table_name] = "Table removed"
             continue
-        old_lines = set(old_tables[table_name].splitlines())
-        new_lines = set(new_tables[table_name].splitlines())
-        additions = new_lines - old_lines
-        subtractions = old_lines - new_lines
-        if additions or subtractions:
-            changes[table_name] = {
-                'additions': list(additions),
-                'subtractions': list(subtractions)
-            }
+        # Route ages change on every poll, so compare routes rather than raw lines
+        added, removed = old_tables[table_name].diff(new_tables[table_name])
+        if len(added) or len(removed):
+            changes[table_name] = {'additions': added, 'subtractions': removed}
     for table_name in new_tables:
         if table_name not in old_tables:
             changes[table_name] = "Table added"
     return changes
 
-def route_monitor(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, interval):
-    """Monitor routing tables at specified intervals and report changes."""
+def parse_and_compare(executor, tables, old_tables=None):
+    """parse_tables and compare_tables in one go, with the parsing and diffing done in a process pool.
+
+    Args:
+        executor (HybridExecutor): Pool the tables are handed to as raw text.
+        tables (dict): Captured table text by table name.
+        old_tables (dict): Previous RouteTables of the device, or None on its first capture.
+    Returns:
+        tuple: (RouteTables by table name, changes as from compare_tables or None without old_tables).
+    """
+    from hybrid_executor import diff_route_text
+    old_tables = old_tables or {}
+    futures = {table_name: executor.submit(diff_route_text, text.encode('utf-8'),
+                                           old_tables[table_name].to_portable() if table_name in old_tables else None)
+               for table_name, text in tables.items()}
+    new_tables, diffs = {}, {}
+    for table_name, future in futures.items():
+        table, added, removed = future.result()
+        new_tables[table_name] = RouteTable.from_portable(table)
+        if added is not None:
+            diffs[table_name] = RouteTable.from_portable(added), RouteTable.from_portable(removed)
+    if not old_tables:
+        return new_tables, None
+
+    # Same order and shape as compare_tables
+    changes = {}
+    for table_name in old_tables:
+        if table_name not in new_tables:
+            changes[table_name] = "Table removed"
+            continue
+        added, removed = diffs[table_name]
+        if len(added) or len(removed):
+            changes[table_name] = {'additions': added, 'subtractions': removed}
+    for table_name in new_tables:
+        if table_name not in old_tables:
+            changes[table_name] = "Table added"
+    return new_tables, changes
+
+class PollScheduler:
+    """Per-device due times in a heap; intervals back off on stable devices and tighten on churn.
+
+    A device handed out by wait_due is running until done() is called for it. A trigger meanwhile is
+    held back and scheduled by done(), so the same device is never captured twice at once.
+    """
+
+    def __init__(self, host_ips, interval, min_interval=None, max_interval=None):
+        self.base = interval
+        self.min_interval = min_interval or max(5, interval * MIN_INTERVAL_FACTOR)
+        self.max_interval = max_interval or interval * MAX_INTERVAL_FACTOR
+        self.intervals = {host_ip: interval for host_ip in host_ips}
+        self.reasons = {}  # host_ip -> syslog tag that triggered its next capture
+        self._due = {}     # host_ip -> due time of its live heap entry; older entries are skipped
+        self._running = {}  # host_ip -> due time of a trigger received during its capture, or None
+        self._heap = []
+        self._condition = threading.Condition()
+        now = time.monotonic()
+        for host_ip in host_ips:
+            self._push(host_ip, now)
+
+    def _push(self, host_ip, due):
+        self._due[host_ip] = due
+        heapq.heappush(self._heap, (due, host_ip))
+
+    def trigger(self, host_ip, reason, delay=TRIGGER_DEBOUNCE):
+        """Capture a device soon; events arriving before that capture are folded into it."""
+        with self._condition:
+            if host_ip not in self.intervals:
+                return False
+            due = time.monotonic() + delay
+            if host_ip in self._running:
+                if self._running[host_ip] is None:
+                    self._running[host_ip] = due
+                    self.reasons[host_ip] = reason
+            elif due < self._due.get(host_ip, float('inf')):
+                self._push(host_ip, due)
+                self.reasons[host_ip] = reason
+                self._condition.notify()
+            return True
+
+    def wait_due(self):
+        """Block until at least one device is due and mark the due ones running.
+
+        Returns:
+            dict: host_ip -> syslog tag that triggered the capture, or None for a scheduled poll.
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)  # Superseded by an earlier trigger
+                if self._heap and self._heap[0][0] <= now:
+                    due = {}
+                    while self._heap and self._heap[0][0] <= now:
+                        entry_due, host_ip = heapq.heappop(self._heap)
+                        if self._due.get(host_ip) == entry_due:
+                            del self._due[host_ip]
+                            self._running[host_ip] = None
+                            due[host_ip] = self.reasons.pop(host_ip, None)  # Consumed by this capture
+                    return due
+                self._condition.wait(self._heap[0][0] - now if self._heap else 1.0)
+
+    def done(self, host_ip, changes, not_before=0):
+        """Schedule a device's next poll from the outcome of the capture just made; returns the delay.
+
+        changes is None when the capture failed or had nothing to compare with; the interval is kept.
+        not_before delays the next poll further, e.g. until the device's circuit allows a probe.
+        A trigger received during the capture schedules the next one earlier instead.
+        """
+        with self._condition:
+            interval = self.intervals[host_ip]
+            if changes:
+                interval = max(self.min_interval, interval / 2)
+            elif changes is not None:
+                interval = min(self.max_interval, interval * BACKOFF)
+            self.intervals[host_ip] = interval
+            now = time.monotonic()
+            delay = max(interval, not_before)
+            triggered = self._running.pop(host_ip, None)
+            if triggered is not None and not not_before:
+                delay = max(0, triggered - now)
+            self._push(host_ip, now + delay)
+            self._condition.notify()
+            return delay
+
+
+class SyslogTrigger(threading.Thread):
+    """UDP syslog listener that schedules an immediate capture when a device logs a routing event."""
+
+    def __init__(self, scheduler, hosts, port=SYSLOG_PORT, bind='0.0.0.0'):
+        super().__init__(name='syslog-trigger', daemon=True)
+        self.scheduler = scheduler
+        self.by_name = {h['host_name']: h['ip_address'] for h in hosts}
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((bind, port))  # Raises OSError if the port is taken
+        self.socket.settimeout(1.0)
+        self.stopped = threading.Event()
+        self.triggers = 0
+
+    def _device(self, source_ip, message):
+        # Devices often log from a loopback, so fall back to the host name in the message header
+        if source_ip in self.scheduler.intervals:
+            return source_ip
+        for token in message.split()[:6]:
+            if token in self.by_name:
+                return self.by_name[token]
+        return None
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                data, (source_ip, _) = self.socket.recvfrom(8192)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            message = data.decode('utf-8', errors='replace')
+            match = TRIGGER_RE.search(message)
+            host_ip = self._device(source_ip, message) if match else None
+            if host_ip and self.scheduler.trigger(host_ip, match.group(1)):
+                self.triggers += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.socket.close()
+
+
+def route_monitor(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, interval,
+                  syslog_port=SYSLOG_PORT, min_interval=None, max_interval=None, large_tables=False, table_sessions=4,
+                  executor=None):
+    """Monitor routing tables and report changes.
+
+    Each device has its own poll interval, starting at 'interval': it grows after polls without changes
+    (up to max_interval) and halves after polls with changes (down to min_interval). Routing events
+    received on the syslog port trigger an immediate capture of the device that logged them.
+    syslog_port=0 disables the listener.
+
+    large_tables fetches each table as streamed XML, split into prefix-range chunks over table_sessions
+    sessions per device when it is large; routes go straight into the compact diff and the route history
+    instead of text files under routing/.
+
+    With a HybridExecutor, captured tables are parsed (and diffed against the previous capture) in its
+    process pool by the capturing threads, so the diff work of many devices runs on all cores.
+
+    Captures go through the per-device circuit breakers; a device whose circuit is open is skipped and
+    its session is reopened by the next probe.
+    """
     routing_dir = os.path.join(os.path.dirname(__file__), '../routing')
     os.makedirs(routing_dir, exist_ok=True)  # Create routing folder if missing
     report_dir = os.path.join(os.path.dirname(__file__), '../reports')
@@ -64,54 +283,161 @@ def route_monitor(username, password, host_ips, hosts, connect_to_hosts, disconn
         return
 
     host_lookup = {h['ip_address']: h['host_name'] for h in hosts}
+    devices = {dev.hostname: dev for dev in connections}
     previous_tables = {}  # Store previous captures
+    history = RouteHistory()  # Indexed change history, queried with scripts/route_history.py
+    analytics = FlapAnalyzer()  # Flap/churn alerts as JSON lines in logs/route_changes.log
+    no_changes = RouteTable()
+    scheduler = PollScheduler(list(devices), interval, min_interval, max_interval)
 
-    print(f"Starting route monitoring with {interval}-second interval. Press Ctrl+C to stop.")
-    try:
-        while True:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            report = f"Route Monitoring Report - {timestamp}\n{'='*50}\n"
-
-            for dev in connections:
-                host_name = host_lookup.get(dev.hostname, dev.hostname)
-                dev.tables = tables  # Attach tables to device object
-                new_tables = capture_routing_tables(dev, host_name, routing_dir)
-                if not new_tables:
-                    continue
-
-                # Save new tables
-                filepath = save_routing_tables(new_tables, host_name, routing_dir, timestamp)
-
-                # Compare with previous tables
-                if host_name in previous_tables:
-                    changes = compare_tables(previous_tables[host_name], new_tables)
-                    if changes:
-                        report += f"\nChanges for {host_name} ({dev.hostname}):\n"
-                        for table_name, change in changes.items():
-                            report += f"  Table {table_name}:\n"
-                            if isinstance(change, dict):
-                                if change['additions']:
-                                    report += f"    Additions:\n      - " + "\n      - ".join(change['additions']) + "\n"
-                                if change['subtractions']:
-                                    report += f"    Subtractions:\n      - " + "\n      - ".join(change['subtractions']) + "\n"
-                            else:
-                                report += f"    {change}\n"
+    listener = None
+    if syslog_port:
+        try:
+            listener = SyslogTrigger(scheduler, hosts, syslog_port)
+            listener.start()
+            print(f"Listening for routing events on UDP port {syslog_port}")
+        except OSError as error:
+            print(f"Syslog listener disabled, cannot bind UDP port {syslog_port}: {error}")
+
+    extra_sessions = {}
+    if large_tables and table_sessions > 1:
+        from connect_to_hosts import open_sessions
+        for host_ip in devices:
+            extra_sessions[host_ip] = open_sessions(host_ip, username, password, table_sessions - 1)
+
+    def capture(dev):
+        host_name = get_hostname(dev, host_lookup)
+        if large_tables:
+            return capture_large_tables(dev, host_name, tables, extra_sessions.get(dev.hostname, []), executor,
+                                        raise_errors=True)
+        dev.tables = tables  # Attach tables to device object
+        # Raised, not swallowed, so the circuit breaker sees the timeout
+        captured = capture_routing_tables(dev, host_name, routing_dir, raise_errors=True)
+        if executor is None or not captured:
+            return captured
+        # Only this thread touches the device's entry while it is due, so the previous capture is stable
+        try:
+            return (captured,) + parse_and_compare(executor, captured, previous_tables.get(host_name))
+        except Exception as error:
+            print(f"Failed to parse routing tables for {host_name} ({dev.hostname}): {error}")
+            return None
+
+    record_lock = threading.Lock()  # History, analytics and previous_tables are updated one device at a time
+
+    def record(dev, new_tables, reason, captured_at, timestamp):
+        """Store and compare one device's capture; returns its report lines and its changes."""
+        host_name = get_hostname(dev, host_lookup)
+        report = []
+        if reason:
+            report.append(f"\nCapture of {host_name} triggered by syslog event {reason}\n")
+
+        changes = None
+        if large_tables:
+            filepath = 'the route history'  # Already compact; no text copy is kept
+        elif executor is not None:
+            # Parsed and diffed in the process pool by the capturing thread
+            text_tables, new_tables, changes = new_tables
+            filepath = save_routing_tables(text_tables, host_name, routing_dir, timestamp)
+        else:
+            # Save new tables, then keep only the compact form in memory
+            filepath = save_routing_tables(new_tables, host_name, routing_dir, timestamp)
+            new_tables = parse_tables(new_tables)
+        for table_name, table in new_tables.items():
+            try:
+                history.record_snapshot(host_name, table_name, captured_at, table)
+            except OSError as error:
+                print(f"Failed to record route history for {host_name} {table_name}: {error}")
+
+        # Compare with previous tables
+        if host_name in previous_tables:
+            if changes is None:
+                changes = compare_tables(previous_tables[host_name], new_tables)
+            for table_name in new_tables:
+                change = changes.get(table_name)
+                if not isinstance(change, dict):
+                    change = {'additions': no_changes, 'subtractions': no_changes}
+                records = analytics.process(host_name, table_name, captured_at,
+                                            change['additions'], change['subtractions'])
+                log_event('diff', device=dev.hostname, host_name=host_name, table=table_name,
+                          added=len(change['additions']), removed=len(change['subtractions']), trigger=reason)
+                for alert in records[1:]:
+                    log_event('route_alert', device=dev.hostname, **{k: v for k, v in alert.items()
+                                                                     if k not in ('time', 'event', 'device')})
+            if changes:
+                report.append(f"\nChanges for {host_name} ({dev.hostname}):\n")
+                for table_name, change in changes.items():
+                    report.append(f"  Table {table_name}:\n")
+                    if isinstance(change, dict):
+                        if len(change['additions']):
+                            report.append("    Additions:\n")
+                            report.extend(f"      - {line}\n" for line in change['additions'].format_lines())
+                        if len(change['subtractions']):
+                            report.append("    Subtractions:\n")
+                            report.extend(f"      - {line}\n" for line in change['subtractions'].format_lines())
                     else:
-                        report += f"\nNo changes for {host_name} ({dev.hostname})\n"
-                else:
-                    report += f"\nInitial capture for {host_name} ({dev.hostname}) saved to {filepath}\n"
+                        report.append(f"    {change}\n")
+            else:
+                report.append(f"\nNo changes for {host_name} ({dev.hostname})\n")
+        else:
+            report.append(f"\nInitial capture for {host_name} ({dev.hostname}) saved to {filepath}\n")
+
+        previous_tables[host_name] = new_tables
+        return report, changes
+
+    def poll_batch(reasons):
+        """Capture the due devices in parallel and write one report for them."""
+        captured_at = datetime.now()
+        timestamp = captured_at.strftime('%Y%m%d_%H%M%S')
+        report = [f"Route Monitoring Report - {timestamp}\n{'='*50}\n"]  # Joined once when saved
 
-                previous_tables[host_name] = new_tables
+        # Due devices are captured in parallel; results are processed here one at a time
+        for dev, new_tables, error in iter_concurrently([devices[ip] for ip in reasons],
+                                                        lambda dev: guarded_poll(dev, capture)):
+            if error or not new_tables:
+                # A device whose circuit is open waits for its next probe, not its interval
+                scheduler.done(dev.hostname, changes=None, not_before=breakers.retry_in(dev.hostname))
+                continue
+            changes = None
+            try:
+                with record_lock:
+                    lines, changes = record(dev, new_tables, reasons[dev.hostname], captured_at, timestamp)
+                report.extend(lines)
+            except Exception as failure:
+                log_event('failure', device=dev.hostname, stage='route_record', error=str(failure))
+                print(f"Failed to process the routing tables of {dev.hostname}: {failure}")
+            finally:
+                # Always rescheduled; a device left running would never be polled again
+                next_poll = scheduler.done(dev.hostname, changes=None if changes is None else bool(changes))
+            report.append(f"  Next poll of {get_hostname(dev, host_lookup)} in {next_poll:.0f} s\n")
 
-            # Save report
-            report_file = os.path.join(report_dir, f"route_report_{timestamp}.txt")
-            with open(report_file, 'w') as f:
-                f.write(report)
-            print(f"\nReport generated: {report_file}")
+        if len(report) == 1:
+            return  # Every due capture failed
+        # Save report
+        report_file = os.path.join(report_dir, f"route_report_{timestamp}.txt")
+        with open(report_file, 'w') as f:
+            f.writelines(report)
+        print(f"\nReport generated: {report_file}")
 
-            time.sleep(interval)
+    def report_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Route monitoring batch failed: {future.exception()}")
+
+    print(f"Starting route monitoring with a {interval}-second base interval "
+          f"({scheduler.min_interval:.0f}-{scheduler.max_interval:.0f} s per device). Press Ctrl+C to stop.")
+    # Each due batch runs on its own thread, so a device stuck in a timeout holds up only its own
+    # batch; it is not due again until its capture is done
+    batches = ThreadPoolExecutor(max_workers=BATCH_THREADS, thread_name_prefix='route-batch')
+    try:
+        while True:
+            batches.submit(poll_batch, scheduler.wait_due()).add_done_callback(report_failure)
 
     except KeyboardInterrupt:
         print("\nRoute monitoring stopped by user.")
     finally:
+        if listener is not None:
+            listener.stop()
+            print(f"Syslog listener handled {listener.triggers} routing event triggers")
+        batches.shutdown(wait=True, cancel_futures=True)
+        for sessions in extra_sessions.values():
+            disconnect_from_hosts(sessions)
         disconnect_from_hosts(connections)
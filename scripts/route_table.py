@@ -0,0 +1,329 @@
+import re
+import socket
+import numpy as np
+from xml.etree.ElementTree import iterparse
+
+# Address families stored in the 'family' column; MPLS labels reuse the 'lo' column
+FAMILY_LABEL, FAMILY_INET, FAMILY_INET6 = 0, 4, 6
+
+# One route = 24 bytes. Fields are big-endian and packed so that a raw byte comparison of two
+# rows orders them by (family, hi, lo, plen, nh, proto); that lets whole rows be used as sort keys.
+ROUTE_DTYPE = np.dtype([('family', 'u1'), ('hi', '>u8'), ('lo', '>u8'), ('plen', 'u1'),
+                        ('nh', '>u4'), ('proto', '>u2')])
+PREFIX_BYTES = 18  # family + hi + lo + plen: the part of a row that identifies the destination
+
+_MASK64 = (1 << 64) - 1
+
+# Junos 'show route' text: a destination line, optional extra protocol entries and next-hop lines
+_DEST_RE = re.compile(r'^(\S+)\s+([*+\- ]*)\[([\w-]+)/\d+\]')
+_ENTRY_RE = re.compile(r'^\s+([*+\- ]*)\[([\w-]+)/\d+\]')
+_NEXT_HOP_RE = re.compile(r'^\s+(>?)\s*(.+?)\s*$')
+
+
+class Interner:
+    """Map repeated strings (next-hops, protocols) to small integer IDs and back."""
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, value):
+        index = self.ids.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.ids[value] = index
+            self.strings.append(value)
+        return index
+
+    def lookup(self, index):
+        return self.strings[index]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# Shared by every table in the process so IDs are comparable between snapshots
+NEXT_HOPS = Interner()
+PROTOCOLS = Interner()
+
+
+def parse_destination(destination):
+    """Convert a destination string to (family, hi, lo, plen), or None if it is not a prefix or label.
+
+    The network is masked to its prefix length, so '10.1.2.3/8' and '10.0.0.0/8' are the same key.
+    """
+    address, _, length = destination.partition('/')
+    try:
+        if ':' in address:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+            plen = int(length) if length else 128
+            value &= ((1 << 128) - 1) ^ ((1 << (128 - plen)) - 1)
+            return FAMILY_INET6, value >> 64, value & _MASK64, plen
+        if '.' in address:
+            value = int.from_bytes(socket.inet_aton(address), 'big')
+            plen = int(length) if length else 32
+            value &= 0xFFFFFFFF ^ ((1 << (32 - plen)) - 1)
+            return FAMILY_INET, 0, value, plen
+        # mpls.0 labels, e.g. '299776' or '299776(S=0)'; plen flags the S=0 entry
+        label, _, stack = address.partition('(')
+        return FAMILY_LABEL, 0, int(label), 1 if stack.startswith('S=0') else 0
+    except (OSError, ValueError):
+        return None
+
+
+def format_destination(family, hi, lo, plen):
+    """Inverse of parse_destination."""
+    if family == FAMILY_INET6:
+        value = (int(hi) << 64) | int(lo)
+        return f"{socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))}/{plen}"
+    if family == FAMILY_INET:
+        return f"{socket.inet_ntoa(int(lo).to_bytes(4, 'big'))}/{plen}"
+    return f"{int(lo)}(S=0)" if plen else str(int(lo))
+
+
+def parse_route_text(text):
+    """Yield (destination, protocol, next_hop) for the active entry of each route in 'show route' text."""
+    destination = protocol = next_hop = None
+    active = False
+    for line in text.splitlines():
+        match = _DEST_RE.match(line)
+        if match:
+            if destination and protocol:
+                yield destination, protocol, next_hop or 'N/A'
+            destination, next_hop = match.group(1), None
+            active = '*' in match.group(2)
+            protocol = match.group(3) if active else None
+            continue
+        if destination is None or not line.strip():
+            continue
+        match = _ENTRY_RE.match(line)
+        if match:
+            # Another protocol entry for the same destination; keep only the active one
+            active = '*' in match.group(1)
+            if active:
+                protocol, next_hop = match.group(2), None
+            continue
+        match = _NEXT_HOP_RE.match(line)
+        if match and active and (next_hop is None or match.group(1)):
+            # Prefer the selected ('>') next hop, otherwise the first listed
+            next_hop = match.group(2).lstrip('> ').strip()
+    if destination and protocol:
+        yield destination, protocol, next_hop or 'N/A'
+
+
+class RouteTable:
+    """Route snapshot held as one packed NumPy structured array with interned next-hops and protocols.
+
+    Rows are kept sorted and unique, which makes diffs set operations on raw row bytes and
+    longest-prefix-match a binary search per prefix length.
+    """
+
+    def __init__(self, routes=None, next_hops=NEXT_HOPS, protocols=PROTOCOLS, skipped=0):
+        # Diffs compare raw row bytes, so every table must hold big-endian rows; np.concatenate and
+        # some loaders hand back native byte order
+        routes = np.zeros(0, dtype=ROUTE_DTYPE) if routes is None else routes.astype(ROUTE_DTYPE, copy=False)
+        self.routes = np.unique(routes) if len(routes) else routes
+        self.next_hops = next_hops
+        self.protocols = protocols
+        self.skipped = skipped  # Destinations that were neither prefixes nor labels
+
+    @classmethod
+    def from_entries(cls, entries, next_hops=NEXT_HOPS, protocols=PROTOCOLS):
+        """Build a table from (destination, protocol, next_hop) string tuples."""
+        rows = []
+        skipped = 0
+        for destination, protocol, next_hop in entries:
+            key = parse_destination(destination)
+            if key is None:
+                skipped += 1
+                continue
+            rows.append(key + (next_hops.intern(next_hop or 'N/A'), protocols.intern(protocol or 'Unknown')))
+        routes = np.array(rows, dtype=ROUTE_DTYPE) if rows else None
+        return cls(routes, next_hops, protocols, skipped)
+
+    @classmethod
+    def from_text(cls, text, **kwargs):
+        """Build a table from 'show route table X' text output."""
+        return cls.from_entries(parse_route_text(text), **kwargs)
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        """Build a table from baseline routing_table dicts (destination/protocol/next_hop)."""
+        return cls.from_entries(((r['destination'], r.get('protocol'), r.get('next_hop')) for r in records), **kwargs)
+
+    @classmethod
+    def from_xml(cls, reply, **kwargs):
+        """Build a table from a get-route-information reply, using the active entry of each route."""
+        return cls.from_entries(filter(None, map(_active_entry, reply.iter('rt'))), **kwargs)
+
+    @classmethod
+    def from_xml_stream(cls, source, **kwargs):
+        """Build a table from a raw get-route-information reply (file object or path) with iterparse.
+
+        Each <rt> element is read, reduced to its active entry and removed from the tree at once, so
+        only one route's elements are alive at a time however large the reply is.
+        """
+        return cls.from_entries(iter_xml_routes(source), **kwargs)
+
+    @classmethod
+    def merge(cls, tables, next_hops=NEXT_HOPS, protocols=PROTOCOLS):
+        """One table from several partial ones (e.g. chunks of one fetch) sharing the same interners."""
+        tables = [table for table in tables if len(table)]
+        routes = np.concatenate([table.routes for table in tables]) if tables else None
+        return cls(routes, next_hops, protocols, sum(table.skipped for table in tables))
+
+    def to_portable(self):
+        """The table in a form another process can rebuild it from (see from_portable).
+
+        Interner IDs are only meaningful in the process that assigned them, so the rows are renumbered
+        against the next-hop and protocol strings they actually use, which travel along.
+
+        Returns:
+            tuple: (routes array, next-hop strings, protocol strings, skipped count).
+        """
+        routes = self.routes.copy()
+        nh_ids, routes['nh'] = np.unique(self.routes['nh'], return_inverse=True)
+        proto_ids, routes['proto'] = np.unique(self.routes['proto'], return_inverse=True)
+        return (routes, [self.next_hops.lookup(int(i)) for i in nh_ids],
+                [self.protocols.lookup(int(i)) for i in proto_ids], self.skipped)
+
+    @classmethod
+    def from_portable(cls, portable, next_hops=NEXT_HOPS, protocols=PROTOCOLS):
+        """Rebuild a table from to_portable() output, interning its strings into this process's interners."""
+        routes, nh_strings, proto_strings, skipped = portable
+        routes = routes.copy()
+        if len(routes):
+            routes['nh'] = np.array([next_hops.intern(s) for s in nh_strings], dtype=np.uint32)[routes['nh']]
+            routes['proto'] = np.array([protocols.intern(s) for s in proto_strings], dtype=np.uint16)[routes['proto']]
+        return cls(routes, next_hops, protocols, skipped)
+
+    def __len__(self):
+        return len(self.routes)
+
+    @property
+    def nbytes(self):
+        return self.routes.nbytes
+
+    def _row_keys(self, prefix_only=False):
+        """Rows (or just their destination bytes) as fixed-width byte strings for set operations."""
+        width = PREFIX_BYTES if prefix_only else ROUTE_DTYPE.itemsize
+        raw = self.routes.view(np.uint8).reshape(len(self.routes), ROUTE_DTYPE.itemsize)[:, :width]
+        return np.ascontiguousarray(raw).view(f'V{width}').ravel()
+
+    def _subset(self, mask):
+        return RouteTable(self.routes[mask], self.next_hops, self.protocols)
+
+    def diff(self, newer):
+        """Compare with a newer snapshot.
+
+        Returns:
+            tuple: (added, removed) RouteTables; a changed next-hop or protocol appears in both.
+        """
+        old_keys, new_keys = self._row_keys(), newer._row_keys()
+        added = newer._subset(~np.isin(new_keys, old_keys))
+        removed = self._subset(~np.isin(old_keys, new_keys))
+        return added, removed
+
+    def changed_destinations(self, newer):
+        """Destinations present in both snapshots whose next-hop or protocol changed."""
+        added, removed = self.diff(newer)
+        common = np.isin(added._row_keys(prefix_only=True), removed._row_keys(prefix_only=True))
+        return [format_destination(r['family'], r['hi'], r['lo'], r['plen']) for r in added.routes[common]]
+
+    def lookup(self, addresses):
+        """Longest-prefix-match each address against the table.
+
+        Args:
+            addresses (list): IPv4/IPv6 address strings.
+        Returns:
+            numpy.ndarray: Row index into self.routes for every address, -1 where nothing matches.
+        """
+        result = np.full(len(addresses), -1, dtype=np.int64)
+        parsed = [parse_destination(address.split('/')[0]) for address in addresses]
+        for family, width in ((FAMILY_INET, 32), (FAMILY_INET6, 128)):
+            query_index = np.array([i for i, p in enumerate(parsed) if p and p[0] == family], dtype=np.int64)
+            if not len(query_index):
+                continue
+            query_hi = np.array([parsed[i][1] for i in query_index], dtype=np.uint64)
+            query_lo = np.array([parsed[i][2] for i in query_index], dtype=np.uint64)
+            in_family = np.flatnonzero(self.routes['family'] == family)
+            lengths = np.unique(self.routes['plen'][in_family])[::-1]  # Longest prefixes first
+            for plen in lengths:
+                pending = result[query_index] < 0
+                if not pending.any():
+                    break
+                rows = in_family[self.routes['plen'][in_family] == plen]
+                mask_hi, mask_lo = _prefix_masks(int(plen), width)
+                keys = _key16(self.routes['hi'][rows], self.routes['lo'][rows])
+                order = np.argsort(keys)
+                # Rows sharing a destination differ only in next-hop; any of them answers the lookup
+                wanted = _key16(query_hi[pending] & mask_hi, query_lo[pending] & mask_lo)
+                position = np.searchsorted(keys[order], wanted)
+                position = np.minimum(position, len(rows) - 1)
+                hit = keys[order][position] == wanted
+                targets = query_index[pending][hit]
+                result[targets] = rows[order][position[hit]]
+        return result
+
+    def record(self, index):
+        """Return one row as a destination/protocol/next_hop dict."""
+        row = self.routes[index]
+        return {
+            'destination': format_destination(row['family'], row['hi'], row['lo'], row['plen']),
+            'protocol': self.protocols.lookup(int(row['proto'])),
+            'next_hop': self.next_hops.lookup(int(row['nh']))
+        }
+
+    def to_records(self):
+        """Yield every route as a destination/protocol/next_hop dict (baseline format)."""
+        for index in range(len(self.routes)):
+            yield self.record(index)
+
+    def format_lines(self):
+        """Yield one 'destination [protocol] next-hop' line per route, for reports."""
+        for record in self.to_records():
+            yield f"{record['destination']} [{record['protocol']}] {record['next_hop']}"
+
+
+def _active_entry(route):
+    """(destination, protocol, next_hop) of an <rt> element's active entry, or None."""
+    destination = route.findtext('rt-destination')
+    entry = route.find("rt-entry[current-active]")
+    entry = entry if entry is not None else route.find('rt-entry')
+    if destination is None or entry is None:
+        return None
+    next_hop = entry.findtext('nh[selected-next-hop]/to') or entry.findtext('nh/to') or 'N/A'
+    return destination.strip(), (entry.findtext('protocol-name') or '').strip(), next_hop.strip()
+
+
+def iter_xml_routes(source):
+    """Yield the active entry of every <rt> in a raw reply, freeing each route's elements as it goes."""
+    parents = []
+    for event, element in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        element.tag = element.tag.rpartition('}')[2]  # Junos replies are namespaced; match on local names
+        if element.tag == 'rt':
+            entry = _active_entry(element)
+            if entry is not None:
+                yield entry
+            if parents:
+                parents[-1].remove(element)
+
+
+def _prefix_masks(plen, width):
+    """(hi, lo) 64-bit masks for a prefix length within a 32- or 128-bit address."""
+    if width == 32:
+        return np.uint64(0), np.uint64(0xFFFFFFFF ^ ((1 << (32 - plen)) - 1))
+    value = ((1 << 128) - 1) ^ ((1 << (128 - plen)) - 1)
+    return np.uint64(value >> 64), np.uint64(value & _MASK64)
+
+
+def _key16(hi, lo):
+    """Pack (hi, lo) pairs into 16-byte big-endian keys whose byte order equals numeric order."""
+    packed = np.empty((len(hi), 2), dtype='>u8')
+    packed[:, 0] = hi
+    packed[:, 1] = lo
+    return packed.view('V16').ravel()
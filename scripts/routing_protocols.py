@@ -1,9 +1,17 @@
 from jnpr.junos.utils.config import Config
 from jnpr.junos.exception import RpcTimeoutError
 from utils import render_template, check_config
+from rpc_cache import rpc_cache
+from event_log import log_event
+from push_ledger import config_hash, config_version, is_unchanged, record_push
 
-def configure_routing(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, protocols):
-    """Apply routing protocol configurations to specified devices."""
+def configure_routing(username, password, host_ips, hosts, connect_to_hosts, disconnect_from_hosts, protocols,
+                      change_number='CHG0123456', force=False):
+    """Apply routing protocol configurations to specified devices.
+
+    Devices whose rendered config and running config are unchanged since their last push are skipped
+    unless force is set.
+    """
     # Map protocol names to their template files
     protocol_templates = {
         'bgp': 'bgp_template.j2',
@@ -21,6 +29,7 @@ def configure_routing(username, password, host_ips, hosts, connect_to_hosts, dis
 
     # Create a lookup dictionary for host data by IP
     host_lookup = {h['ip_address']: h for h in hosts}
+    unchanged = 0
     for dev in connections:
         host_data = host_lookup.get(dev.hostname)
         if not host_data:
@@ -46,6 +55,14 @@ def configure_routing(username, password, host_ips, hosts, connect_to_hosts, dis
             print(f"No valid configuration generated for {dev.hostname}. Skipping.")
             continue
 
+        # Fast path: same intent as the last successful push and nobody has committed since
+        ledger_key = "+".join(protocol_templates[p] for p in protocols_to_config)
+        rendered_hash = config_hash(combined_config)
+        if not force and is_unchanged(dev.hostname, ledger_key, rendered_hash, config_version(dev)):
+            unchanged += 1
+            print(f"Routing protocols on {dev.hostname} unchanged since last push. Skipping.")
+            continue
+
         try:
             print(f"\nConfiguration to be applied to {dev.hostname} ({dev.hostname}):\n{combined_config.strip()}")
             # Validate the combined config
@@ -57,13 +74,20 @@ def configure_routing(username, password, host_ips, hosts, connect_to_hosts, dis
             # Apply and commit the config
             configuration = Config(dev)
             configuration.load(combined_config, format='set', merge=False)
-            configuration.commit(comment="Change CHG0123456 - routing protocols", timeout=120)
+            configuration.commit(comment=f"Change {change_number} - routing protocols", timeout=120)
+            rpc_cache.invalidate(dev._hostname)  # Cached config/state is stale after a commit
+            record_push(dev.hostname, ledger_key, rendered_hash, config_version(dev), change_number)
+            log_event('commit', device=dev.hostname, change=change_number, scope='routing')
             print(f"Routing protocols configured on {dev.hostname}")
         except RpcTimeoutError as error:
+            log_event('failure', device=dev.hostname, change=change_number, stage='commit', scope='routing', error=str(error))
             print(f"Timeout during commit to {dev.hostname}: {error}")
             print("Config may have applied; verify on device.")
         except Exception as error:
+            log_event('failure', device=dev.hostname, change=change_number, stage='configure', scope='routing', error=str(error))
             print(f"Failed to configure routing protocols on {dev.hostname}: {error}")
 
+    print(f"{unchanged} of {len(connections)} devices unchanged since their last push and skipped.")
+
     # Disconnect from all devices
     disconnect_from_hosts(connections)
@@ -0,0 +1,144 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from event_log import log_event
+
+# Seconds a reply stays valid, per RPC class
+RPC_TTLS = {
+    'config': 300,     # Configuration only changes on commit
+    'inventory': 3600, # Software version and hardware inventory
+    'state': 30,       # Protocol, route and interface state
+}
+
+_CONFIG_RPCS = {'get_config', 'get_configuration'}
+_INVENTORY_RPCS = {'get_software_information', 'get_chassis_inventory'}
+
+
+def rpc_class(rpc_name, args):
+    """Classify an RPC (or CLI command) so it gets the TTL of its class."""
+    if rpc_name == 'cli' and args:
+        command = str(args[0]).strip()
+        if command.startswith('show configuration'):
+            return 'config'
+        if command.startswith(('show version', 'show chassis hardware')):
+            return 'inventory'
+        return 'state'
+    if rpc_name in _CONFIG_RPCS:
+        return 'config'
+    if rpc_name in _INVENTORY_RPCS:
+        return 'inventory'
+    return 'state'
+
+
+def _reply_size(reply):
+    """Rough size of a reply in bytes, used for the memory bound."""
+    text = getattr(reply, 'text', None)
+    size = len(text) if text else 0
+    try:
+        size += 64 * sum(1 for _ in reply.iter())
+    except AttributeError:
+        pass
+    return size
+
+
+class RpcCache:
+    """Size-bounded LRU cache of RPC replies keyed by (device, rpc, args), with per-class TTLs.
+
+    Replies are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=256 * 1024 * 1024, ttls=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(RPC_TTLS, **(ttls or {}))
+        self.enabled = True
+        self._entries = OrderedDict()  # key -> (expires, size, reply)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'bypassed': 0}
+
+    @staticmethod
+    def make_key(host_ip, rpc_name, args, kwargs):
+        return (host_ip, rpc_name, json.dumps([args, kwargs], sort_keys=True, default=str))
+
+    def call(self, dev, rpc_name, *args, fresh=False, **kwargs):
+        """Return the reply of dev.rpc.<rpc_name>(*args, **kwargs), from cache when still valid.
+
+        Args:
+            dev (Device): Connected PyEZ Device.
+            rpc_name (str): RPC method name on dev.rpc, e.g. 'get_config' or 'cli'.
+            fresh (bool): Bypass the cache read for state that must be current; the reply is still stored.
+        """
+        key = self.make_key(dev._hostname, rpc_name, args, kwargs)
+        now = time.monotonic()
+        with self._lock:
+            if not self.enabled or fresh:
+                self._stats['bypassed'] += 1
+            else:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[2]
+                if entry:
+                    self._stats['expired'] += 1
+                    self._drop(key)
+                self._stats['misses'] += 1
+
+        started = time.monotonic()
+        try:
+            reply = getattr(dev.rpc, rpc_name)(*args, **kwargs)
+        except Exception as error:
+            log_event('failure', device=dev._hostname, stage='rpc', rpc=rpc_name, error=str(error))
+            raise
+        log_event('rpc', device=dev._hostname, rpc=rpc_name, args=list(args) or None,
+                  duration_s=round(time.monotonic() - started, 3))
+        if self.enabled:
+            self._store(key, reply, now + self.ttls.get(rpc_class(rpc_name, args), self.ttls['state']))
+        return reply
+
+    def _store(self, key, reply, expires):
+        size = _reply_size(reply)
+        if size > self.max_bytes:
+            return  # Never let one reply flush the whole cache
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires, size, reply)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, host_ip=None, rpc_name=None):
+        """Remove entries for a device and/or RPC (e.g. after a commit); no arguments clears everything."""
+        with self._lock:
+            for key in list(self._entries):
+                if (host_ip is None or key[0] == host_ip) and (rpc_name is None or key[1] == rpc_name):
+                    self._drop(key)
+
+    def stats(self):
+        """Return hit/miss counters plus current entry count and size."""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes,
+                        hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else 0.0)
+
+
+# Cache shared by every action in this process
+rpc_cache = RpcCache()
+
+
+def cached_rpc(dev, rpc_name, *args, fresh=False, **kwargs):
+    """Call an RPC through the shared cache."""
+    return rpc_cache.call(dev, rpc_name, *args, fresh=fresh, **kwargs)
+
+
+def cached_cli(dev, command, format='text', fresh=False):
+    """Run a CLI command through the shared cache."""
+    return rpc_cache.call(dev, 'cli', command, fresh=fresh, format=format)
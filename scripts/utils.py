@@ -1,5 +1,11 @@
+import io
 import os
+import json
+import fcntl
+import tempfile
 import yaml
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def load_yaml(file_path):
     """Load a YAML file and return its contents as a Python object."""
@@ -42,7 +48,7 @@ def merge_host_data(inventory_file, config_file=None):
             print("Error: Invalid format in 'inventory.yml' - each entry must have a 'location' key.")
             return None
         # Iterate over device types (switches, routers, firewalls)
-        for dev_type in ['switches', 'routers', 'firewalls']:
+        for dev_type, device_type in [('switches', 'switch'), ('routers', 'router'), ('firewalls', 'firewall')]:
             if dev_type in location_dict:
                 # Add each device to the host list with relevant details
                 for dev in location_dict[dev_type]:
@@ -50,7 +56,7 @@ def merge_host_data(inventory_file, config_file=None):
                         'host_name': dev['host_name'],
                         'ip_address': dev['ip_address'],
                         'location': location_dict['location'],
-                        'device_type': dev_type[:-1],  # Remove 's' (e.g., 'switches' -> 'switch')
+                        'device_type': device_type,  # Singular group name (e.g., 'switches' -> 'switch')
                         'vendor': dev.get('vendor', 'Unknown')  # Default to 'Unknown' if vendor missing
                     })
 
@@ -82,16 +88,75 @@ def merge_host_data(inventory_file, config_file=None):
                         break
             else:
                 print(f"Warning: Host '{inv_host['host_name']}' in inventory.yml not found in hosts_data.yml")
-        return {'username': username, 'password': password, 'hosts': merged_hosts}
+        return {'username': username, 'password': password, 'hosts': merged_hosts,
+                'interval': config_data.get('interval', 300), 'tables': config_data.get('tables', ['inet.0']),
+                'syslog_port': config_data.get('syslog_port', 5514)}
 
     # Return just inventory hosts if no config file
     return {'hosts': all_hosts}
 
+@contextmanager
+def locked_file(path):
+    """Hold an exclusive lock on <path>.lock; serializes read-modify-write of path across processes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_json_atomic(path, data):
+    """Write JSON through a temp file of its own next to path, then rename it over path.
+
+    A crash never leaves a truncated file, and processes saving at the same time never share a temp file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def update_json_file(path, update):
+    """Apply update(data) to the JSON object in path under its lock, and save it atomically.
+
+    The file is re-read under the lock, so entries other processes saved meanwhile are kept.
+    Returns:
+        dict: The data as saved.
+    """
+    with locked_file(path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (json.JSONDecodeError, OSError) as error:
+            print(f"Warning: Replacing unreadable '{path}': {error}")
+            data = {}
+        update(data)
+        write_json_atomic(path, data)
+    return data
+
+_template_env = None  # Shared Jinja2 environment, built on first use
+
+def get_template_env():
+    """Return the shared Jinja2 environment so compiled templates are reused across renders."""
+    global _template_env
+    if _template_env is None:
+        from jinja2 import Environment, FileSystemLoader
+        template_dir = os.path.join(os.path.dirname(__file__), '../templates')
+        # Jinja2 caches compiled templates per environment, so keep a single one
+        _template_env = Environment(loader=FileSystemLoader(template_dir))
+    return _template_env
+
 def render_template(host_data, template_name):
     """Render a Jinja2 template with host data."""
-    from jinja2 import Environment, FileSystemLoader
-    template_dir = os.path.join(os.path.dirname(__file__), '../templates')
-    env = Environment(loader=FileSystemLoader(template_dir))
+    env = get_template_env()
     try:
         template = env.get_template(template_name)
         return template.render(**host_data)
@@ -103,6 +168,11 @@ def render_template(host_data, template_name):
 def check_config(device, config_str):
     """Check if the configuration can be applied to the device."""
     from jnpr.junos.utils.config import Config
+    from render_check import lint_set_commands
+    # Lint locally first so the device commit check is only spent on configs that look valid
+    errors, _ = lint_set_commands(config_str)
+    if errors:
+        return False, "Local validation failed:\n" + "\n".join(errors)
     try:
         # Load config into a Config object for validation
         config = Config(device)
@@ -117,3 +187,69 @@ def check_config(device, config_str):
             return False, "Commit check failed - configuration has errors."
     except Exception as error:
         return False, f"Error checking configuration: {error}"
+
+def raw_rpc_xml(dev, rpc_name, attrs=None, **kwargs):
+    """Run an RPC and return the reply document exactly as received (str or bytes), never parsed by PyEZ.
+
+    Keyword arguments become child elements; True means an empty flag element. attrs become attributes
+    of the RPC element, e.g. raw_rpc_xml(dev, 'get_configuration', attrs={'format': 'json'}).
+    """
+    from lxml import etree
+    rpc = etree.Element(rpc_name.replace('_', '-'), {name: str(value) for name, value in (attrs or {}).items()})
+    for name, value in kwargs.items():
+        option = etree.SubElement(rpc, name.replace('_', '-'))
+        if value is not True:
+            option.text = str(value)
+    return dev._conn.rpc(rpc).xml
+
+def raw_rpc_reply(dev, rpc_name, **kwargs):
+    """Run an RPC and return its reply as unparsed XML bytes for incremental parsing (iterparse).
+
+    dev.rpc.<name>() keeps the whole reply as an lxml tree for as long as the caller holds it; here
+    only the reply text is kept. Arguments as for raw_rpc_xml, e.g. raw_rpc_reply(dev,
+    'get_route_information', table='inet.0', destination='10.0.0.0/8', longer=True).
+    """
+    raw = raw_rpc_xml(dev, rpc_name, **kwargs)
+    return io.BytesIO(raw.encode('utf-8') if isinstance(raw, str) else raw)
+
+def iter_concurrently(items, worker, max_workers=64, adaptive=True):
+    """Run worker(item) for every item on a thread pool and yield each result as soon as it is ready.
+
+    Args:
+        items (list): Items to process, typically connected Device objects or host IPs.
+        worker (callable): Function called once per item.
+        max_workers (int): Maximum number of items processed at the same time.
+        adaptive (bool): Let the shared AdaptiveLimiter decide how many of those actually run at once,
+            based on latency, connection errors and routing-engine CPU.
+    Yields:
+        tuple: (item, result, error) in completion order; error is None on success.
+    """
+    from concurrency import limiter, device_key
+    if not items:
+        return
+
+    def run(item):
+        if not adaptive:
+            return worker(item)
+        with limiter.slot(device_key(item)):
+            result = worker(item)
+        limiter.maybe_sample_cpu(item)  # Rate-limited per device; no-op for host IP strings
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = {executor.submit(run, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as error:
+                yield item, None, error
+
+def run_concurrently(items, worker, max_workers=64, adaptive=True):
+    """Run worker(item) for every item on a thread pool and collect the results.
+
+    Same arguments as iter_concurrently.
+    Returns:
+        list: (item, result, error) tuples in completion order; error is None on success.
+    """
+    return list(iter_concurrently(items, worker, max_workers=max_workers, adaptive=adaptive))
@@ -1,7 +1,11 @@
 import os
+import json
 import argparse
 from utils import merge_host_data
 from connect_to_hosts import connect_to_hosts, disconnect_from_hosts
+from rpc_cache import rpc_cache
+from concurrency import limiter
+from event_log import set_context
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -11,9 +15,45 @@ def main():
     parser.add_argument('--actions', nargs='+',
                         choices=['interfaces', 'bgp', 'ospf', 'ldp', 'rsvp', 'mpls',
                                  'ping', 'bgp_verification', 'ospf_verification',
-                                 'backup', 'baseline', 'route_monitor'],
+                                 'backup', 'baseline', 'route_monitor', 'interface_monitor', 'render_check', 'logs', 'run'],
                         help='Actions to perform')
+    parser.add_argument('--backup-transport', choices=['rpc', 'archive', 'stream'], default='rpc',
+                        help="How 'backup' fetches configs: text over NETCONF, the compressed config archive over "
+                             "SFTP/SCP, or text over NETCONF streamed unparsed into .cfg.gz files")
+    parser.add_argument('--no-rpc-cache', action='store_true',
+                        help='Always fetch fresh RPC replies instead of sharing them between actions')
+    parser.add_argument('--force-push', action='store_true',
+                        help='Push to every device even if its rendered and running config are unchanged since the last push')
+    parser.add_argument('--change',
+                        help='Change number (e.g. CHG0123456); only act on the hosts in changes/<CHG>/<CHG>_CI.yml')
+    parser.add_argument('--location', nargs='+', help='Only hosts at these inventory locations')
+    parser.add_argument('--device-type', nargs='+', choices=['router', 'switch', 'firewall'],
+                        help='Only hosts of these device types')
+    parser.add_argument('--vendor', nargs='+', help='Only hosts of these vendors')
+    parser.add_argument('--command', help="CLI command for the 'run' action, e.g. 'show chassis alarms'")
+    parser.add_argument('--rpc', help="RPC for the 'run' action, e.g. get-alarm-information")
+    parser.add_argument('--rpc-args', type=json.loads, default={},
+                        help='RPC arguments as JSON, e.g. \'{"interface_name": "xe-0/0/0"}\'')
+    parser.add_argument('--format', choices=['text', 'xml', 'json'], default='text',
+                        help="Output format requested from the device by 'run'")
+    parser.add_argument('--syslog-port', type=int,
+                        help="UDP port on which route_monitor listens for routing events (0 disables; default from hosts_data.yml or 5514)")
+    parser.add_argument('--large-tables', action='store_true',
+                        help='route_monitor: stream tables as XML and split large ones into prefix ranges')
+    parser.add_argument('--table-sessions', type=int, default=4,
+                        help='Sessions per device used for chunked table retrieval (default: 4)')
+    parser.add_argument('--group', action='store_true', help="Collapse identical 'run' outputs across devices")
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Parse, diff and serialize in this many worker processes '
+                             '(baseline, route_monitor, interface_monitor; default: off)')
+    parser.add_argument('--poll-interval', type=int, default=60,
+                        help='Seconds between interface_monitor counter polls (default: 60)')
     args = parser.parse_args()
+    if 'run' in args.actions and not (args.command or args.rpc):
+        parser.error("the 'run' action needs --command or --rpc")
+
+    if args.no_rpc_cache:
+        rpc_cache.enabled = False
 
     inventory_file = os.path.join(SCRIPT_DIR, "../data/inventory.yml")
     config_file = os.path.join(SCRIPT_DIR, "../data/hosts_data.yml")
@@ -26,20 +66,72 @@ def main():
     username = merged_data.get('username')
     password = merged_data.get('password')
     hosts = merged_data.get('hosts', [])
+    change_number = 'CHG0123456'  # Commit comment used when no change is given
+    if args.change:
+        from change_targets import load_change_targets
+        change_number = args.change.strip().upper()
+        try:
+            hosts, unresolved = load_change_targets(change_number, hosts)
+        except FileNotFoundError as error:
+            print(f"Error: {error}")
+            return
+        for entry in unresolved:
+            print(f"Warning: {entry.get('host_name') or entry.get('host_ip')} from {change_number} "
+                  "is not in inventory.yml/hosts_data.yml; skipping")
+        if not hosts:
+            print(f"No hosts in scope for {change_number}. Exiting.")
+            return
+        print(f"{len(hosts)} hosts in scope for {change_number}")
+        set_context(change=change_number)  # Tag every logged event with the change
+    if args.location or args.device_type or args.vendor:
+        from adhoc_runner import select_hosts
+        hosts = select_hosts(hosts, args.location, args.device_type, args.vendor)
+        if not hosts:
+            print("No hosts match the location/device type/vendor filter. Exiting.")
+            return
+        print(f"{len(hosts)} hosts match the inventory filter")
     host_ips = [host['ip_address'] for host in hosts]
     interval = merged_data.get('interval', 300)  # Default to 300s if missing
 
+    # Worker processes for parsing, diffing and serialization, shared by the actions that use them
+    executor = None
+    if args.processes and any(action in ['baseline', 'route_monitor', 'interface_monitor'] for action in args.actions):
+        from hybrid_executor import HybridExecutor
+        executor = HybridExecutor(args.processes)
+
+    # Offline render and lint of every template; no device sessions are opened
+    if 'render_check' in args.actions:
+        from render_check import render_fleet, print_summary
+        print_summary(render_fleet(hosts))
+
+    # Pre-validate the configs about to be pushed and leave out hosts whose configs fail locally
+    push_templates = (['interface_template.j2'] if 'interfaces' in args.actions else []) + \
+        [f"{action}_template.j2" for action in args.actions if action in ['bgp', 'ospf', 'ldp', 'rsvp', 'mpls']]
+    push_hosts, push_host_ips = hosts, host_ips
+    if push_templates:
+        from render_check import render_fleet, print_summary, failed_hosts
+        results = render_fleet(hosts, push_templates)
+        print_summary(results)
+        rejected = failed_hosts(results)
+        push_hosts = [host for host in hosts if host['ip_address'] not in rejected]
+        push_host_ips = [ip for ip in host_ips if ip not in rejected]
+        for host in hosts:
+            if host['ip_address'] in rejected:
+                print(f"Excluding {host['host_name']} from configuration actions: rendered config failed validation")
+
     # Configuration actions
     if 'interfaces' in args.actions:
         from interface_actions import configure_interfaces
         configure_interfaces(
             username=username,
             password=password,
-            host_ips=host_ips,
-            hosts=hosts,
+            host_ips=push_host_ips,
+            hosts=push_hosts,
             template_name='interface_template.j2',
             connect_to_hosts=connect_to_hosts,
-            disconnect_from_hosts=disconnect_from_hosts
+            disconnect_from_hosts=disconnect_from_hosts,
+            change_number=change_number,
+            force=args.force_push
         )
     if any(action in ['bgp', 'ospf', 'ldp', 'rsvp', 'mpls'] for action in args.actions):
         from routing_protocols import configure_routing
@@ -47,11 +139,13 @@ def main():
         configure_routing(
             username=username,
             password=password,
-            host_ips=host_ips,
-            hosts=hosts,
+            host_ips=push_host_ips,
+            hosts=push_hosts,
             connect_to_hosts=connect_to_hosts,
             disconnect_from_hosts=disconnect_from_hosts,
-            protocols=protocols
+            protocols=protocols,
+            change_number=change_number,
+            force=args.force_push
         )
     # Monitoring actions
     if any(action in ['ping', 'bgp_verification', 'ospf_verification'] for action in args.actions):
@@ -75,11 +169,40 @@ def main():
             host_ips=host_ips,
             hosts=hosts,
             connect_to_hosts=connect_to_hosts,
-            disconnect_from_hosts=disconnect_from_hosts
+            disconnect_from_hosts=disconnect_from_hosts,
+            transport=args.backup_transport
         )
     if 'baseline' in args.actions:
         from backup_actions import capture_device_baseline
         capture_device_baseline(
+            username=username,
+            password=password,
+            host_ips=host_ips,
+            hosts=hosts,
+            connect_to_hosts=connect_to_hosts,
+            disconnect_from_hosts=disconnect_from_hosts,
+            executor=executor
+        )
+    # Ad-hoc command, results streamed as each device answers
+    if 'run' in args.actions:
+        from adhoc_runner import run_adhoc
+        run_adhoc(
+            username=username,
+            password=password,
+            host_ips=host_ips,
+            hosts=hosts,
+            connect_to_hosts=connect_to_hosts,
+            disconnect_from_hosts=disconnect_from_hosts,
+            command=args.command,
+            rpc=args.rpc,
+            rpc_args=args.rpc_args,
+            output_format=args.format,
+            group=args.group
+        )
+    # Incremental syslog collection; only lines written since the last run are fetched
+    if 'logs' in args.actions:
+        from log_collector import collect_logs
+        collect_logs(
             username=username,
             password=password,
             host_ips=host_ips,
@@ -97,8 +220,38 @@ def main():
             hosts=hosts,
             connect_to_hosts=connect_to_hosts,
             disconnect_from_hosts=disconnect_from_hosts,
-            interval=interval
+            interval=interval,
+            syslog_port=args.syslog_port if args.syslog_port is not None else merged_data.get('syslog_port', 5514),
+            large_tables=args.large_tables,
+            table_sessions=args.table_sessions,
+            executor=executor
         )
+    # Interface counters: rates, utilization and CRC/discard spike alerts
+    if 'interface_monitor' in args.actions:
+        from interface_monitor import interface_monitor
+        interface_monitor(
+            username=username,
+            password=password,
+            host_ips=host_ips,
+            hosts=hosts,
+            connect_to_hosts=connect_to_hosts,
+            disconnect_from_hosts=disconnect_from_hosts,
+            interval=args.poll_interval,
+            executor=executor
+        )
+
+    if executor is not None:
+        stats = executor.stats()
+        print(f"Worker processes: {stats['tasks']} tasks, {stats['shared_bytes'] / 1e6:.1f} MB handed over "
+              f"through shared memory")
+        executor.close()
+    stats = rpc_cache.stats()
+    if stats['hits'] or stats['misses']:
+        print(f"RPC cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+    stats = limiter.stats()
+    if stats['completed']:
+        print(f"Concurrency: limit {stats['global_limit']}, {stats['overloads']} overload signals, "
+              f"{stats['cpu_throttles']} RE CPU throttles")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Scripts import each other by module name, as when run from scripts/
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../scripts')
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
@@ -0,0 +1,42 @@
+import os
+from datetime import datetime
+import pytest
+from change_diff import TOLERANCES, diff_host, find_baselines
+
+HOST = 'core-rtr-01'
+
+
+@pytest.fixture
+def baseline_dir(tmp_path):
+    """Baselines at 08:00, 10:00 and 12:00; the change window used below is 09:00-11:00."""
+    os.makedirs(tmp_path / HOST)
+    for stamp in ('20260101_080000', '20260101_100000', '20260101_120000'):
+        (tmp_path / HOST / f"{HOST}_{stamp}_baseline.json").write_text('{}')
+    return str(tmp_path)
+
+
+def _stamps(pair):
+    return tuple(os.path.basename(path).split('_', 1)[1][:15] if path else None for path in pair)
+
+
+START = datetime(2026, 1, 1, 9, 0)
+END = datetime(2026, 1, 1, 11, 0)
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (START, END, ('20260101_080000', '20260101_120000')),
+    (START, None, ('20260101_080000', '20260101_120000')),
+    (None, END, ('20260101_100000', '20260101_120000')),
+    (None, datetime(2026, 1, 1, 13, 0), ('20260101_120000', None)),    # Nothing captured after the change
+    (datetime(2026, 1, 1, 12, 0), None, ('20260101_120000', None)),    # Only the capture at start itself
+    (None, None, ('20260101_100000', '20260101_120000')),
+])
+def test_find_baselines(baseline_dir, start, end, expected):
+    assert _stamps(find_baselines(HOST, start, end, baseline_dir)) == expected
+
+
+def test_missing_post_change_baseline_fails(baseline_dir):
+    pre, post = find_baselines(HOST, None, datetime(2026, 1, 1, 13, 0), baseline_dir)
+    result = diff_host(({'host_name': HOST, 'host_ip': '192.0.2.1'}, pre, post, TOLERANCES))
+    assert result['passed'] is False
+    assert result['error'] == 'missing post-change baseline'
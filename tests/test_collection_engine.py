@@ -0,0 +1,11 @@
+from collection_engine import load_profiles, profile_matches, write_results
+
+
+def test_hosts_outside_a_profile_match_are_reported():
+    profile = load_profiles()['bgp_verification']
+    assert not profile_matches(profile, {'vendor': 'Cisco'})
+    records = [{'host_name': 'edge-asa-01', 'host_ip': '192.0.2.9', 'profiles': {}},
+               {'host_name': 'core-rtr-01', 'host_ip': '192.0.2.1', 'profiles': {}, 'error': 'timeout'}]
+    messages = []
+    assert write_results(records, 'bgp_verification', log=messages.append) == []
+    assert messages == ["Skipped bgp_verification for edge-asa-01: not selected by match {'vendor': ['Juniper']}"]
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('jnpr.junos')
+import collector_daemon
+from collector_daemon import SessionPool
+
+
+class FakeDevice:
+    def __init__(self, host_ip, user):
+        self._hostname = host_ip
+        self.user = user
+        self.connected = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    closed = []
+
+    def connect(username, password, host_ips):
+        return [FakeDevice(host_ips[0], username)]
+
+    def disconnect(connections):
+        for dev in connections:
+            dev.connected = False
+            closed.append((dev._hostname, dev.user))
+
+    monkeypatch.setattr(collector_daemon, 'connect_to_hosts', connect)
+    monkeypatch.setattr(collector_daemon, 'disconnect_from_hosts', disconnect)
+    pool = SessionPool('old', 'secret')
+    pool.closed = closed
+    return pool
+
+
+def test_new_credentials_leave_sessions_in_use_open_until_their_next_get(pool):
+    in_use = pool.get('192.0.2.1')
+    idle = pool.get('192.0.2.2')
+    pool.set_credentials('new', 'secret')
+    assert in_use.connected and idle.connected  # A worker may be mid-task on either
+    assert pool.closed == []
+
+    dev = pool.get('192.0.2.1')
+    assert (dev.user, in_use.connected) == ('new', False)
+    assert pool.get('192.0.2.1') is dev
+    pool.close_all()
+    assert sorted(pool.closed) == [('192.0.2.1', 'new'), ('192.0.2.1', 'old'), ('192.0.2.2', 'old')]
+
+
+def test_unchanged_credentials_keep_the_sessions(pool):
+    dev = pool.get('192.0.2.1')
+    pool.set_credentials('old', 'secret')
+    assert pool.get('192.0.2.1') is dev
+    assert pool.closed == []
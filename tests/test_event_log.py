@@ -0,0 +1,79 @@
+import json
+import logging
+import time
+from event_log import IndexedRotatingHandler, JsonLinesFormatter, query
+
+
+def _record(fields, created=None):
+    record = logging.LogRecord('network_events', logging.INFO, __file__, 0, 'rpc', None, None)
+    record.fields = fields
+    if created is not None:
+        record.created = created
+    return record
+
+
+def _handler(path, **kwargs):
+    handler = IndexedRotatingHandler(str(path), **kwargs)
+    handler.setFormatter(JsonLinesFormatter())
+    return handler
+
+
+def test_rotation_index_covers_events_of_earlier_runs(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    first = _handler(path)
+    first.emit(_record({'device': '192.0.2.1', 'change': 'CHG0000001'}, created=time.time() - 60))
+    first.close()
+
+    second = _handler(path)
+    second.emit(_record({'device': '192.0.2.2'}))
+    second.doRollover()
+    second.close()
+
+    entry = json.loads((tmp_path / 'events.index.jsonl').read_text().splitlines()[0])
+    assert entry['count'] == 2
+    assert entry['devices'] == ['192.0.2.1', '192.0.2.2']
+    assert entry['changes'] == ['CHG0000001']
+    assert entry['start'] < entry['end'] - 30
+
+
+def test_age_rotation_uses_first_event_in_file(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    first = _handler(path)
+    first.emit(_record({'device': '192.0.2.1'}, created=time.time() - 7200))
+    first.close()
+
+    second = _handler(path, max_age=3600)
+    assert second.shouldRollover(_record({}))
+    second.close()
+
+
+def test_process_follows_a_rotation_done_by_another(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    first = _handler(path)
+    second = _handler(path)
+    first.emit(_record({'device': '192.0.2.1'}))
+    second.emit(_record({'device': '192.0.2.2'}))
+    first.doRollover()
+    second.emit(_record({'device': '192.0.2.3'}))
+    first.close()
+    second.close()
+
+    entry = json.loads((tmp_path / 'events.index.jsonl').read_text().splitlines()[0])
+    assert entry['devices'] == ['192.0.2.1', '192.0.2.2']  # The other process's events are indexed too
+    active = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event['device'] for event in active] == ['192.0.2.3']  # Not lost in the removed file
+
+
+def test_query_by_host_name_searches_matching_archives(tmp_path):
+    handler = _handler(tmp_path / 'events.jsonl')
+    handler.emit(_record({'device': '192.0.2.1', 'host_name': 'core-rtr-01', 'event': 'backup'}))
+    handler.emit(_record({'device': '192.0.2.1', 'event': 'rpc'}))
+    handler.doRollover()
+    handler.emit(_record({'device': '192.0.2.2', 'host_name': 'edge-rtr-02', 'event': 'backup'}))
+    handler.close()
+
+    entry = json.loads((tmp_path / 'events.index.jsonl').read_text().splitlines()[0])
+    assert entry['devices'] == ['192.0.2.1', 'core-rtr-01']
+    assert [event['device'] for event in query(device='core-rtr-01', log_dir=str(tmp_path))] == ['192.0.2.1']
+    assert [event['event'] for event in query(device='192.0.2.1', log_dir=str(tmp_path))] == ['backup', 'rpc']
+    assert [event['device'] for event in query(device='edge-rtr-02', log_dir=str(tmp_path))] == ['192.0.2.2']
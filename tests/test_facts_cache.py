@@ -0,0 +1,56 @@
+import json
+import multiprocessing
+import pytest
+import facts_cache
+from facts_cache import invalidate, update_facts
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'facts_cache.json')
+    monkeypatch.setattr(facts_cache, 'FACTS_CACHE_FILE', path)
+    monkeypatch.setattr(facts_cache, '_cache', None)
+    return path
+
+
+def _facts(serial='S1', version='23.4R1'):
+    return {'hostname': 'rtr', 'model': 'mx204', 'version': version, 'serial_number': serial}
+
+
+def _saved(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_entries_saved_by_another_process_are_kept(cache_file):
+    update_facts('192.0.2.1', _facts())
+    other = _saved(cache_file)
+    other['192.0.2.2'] = dict(_facts('S2'), updated=0, changed=0)
+    with open(cache_file, 'w') as f:
+        json.dump(other, f)  # Written by another process after this one loaded the cache
+
+    update_facts('192.0.2.3', _facts('S3'))
+    assert set(_saved(cache_file)) == {'192.0.2.1', '192.0.2.2', '192.0.2.3'}
+
+
+def test_version_change_is_detected_against_the_saved_entry(cache_file):
+    assert update_facts('192.0.2.1', _facts()) is False
+    assert update_facts('192.0.2.1', _facts()) is False
+    assert update_facts('192.0.2.1', _facts(version='24.2R1')) is True
+    invalidate('192.0.2.1')
+    assert _saved(cache_file) == {}
+
+
+def _update_many(path, host_ip):
+    facts_cache.FACTS_CACHE_FILE = path
+    facts_cache._cache = None
+    for number in range(50):
+        update_facts(host_ip, _facts(f"S{number}"))
+
+
+def test_concurrent_processes_keep_every_host(cache_file):
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        pool.starmap(_update_many, [(cache_file, f"192.0.2.{i}") for i in range(4)])
+    saved = _saved(cache_file)
+    assert {host_ip: entry['serial_number'] for host_ip, entry in saved.items()} == \
+        {f"192.0.2.{i}": 'S49' for i in range(4)}
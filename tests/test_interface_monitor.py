@@ -0,0 +1,43 @@
+import numpy as np
+from interface_monitor import COUNTERS, COLUMN, CounterHistory, MIN_SPIKE_ERRORS, counter_delta
+
+
+def _delta(old, new):
+    return counter_delta(np.array([old], dtype=np.uint64), np.array([new], dtype=np.uint64))[0]
+
+
+def test_counter_delta_plain_increase():
+    assert _delta(100, 250) == 150
+
+
+def test_counter_delta_32bit_wrap():
+    assert _delta(2**32 - 10, 5) == 15
+
+
+def test_counter_delta_64bit_wrap():
+    assert _delta(2**64 - 5, 10) == 15
+
+
+def test_counter_delta_reset_counts_from_zero():
+    assert _delta(5_000_000_000, 100) == 100
+    assert _delta(500, 100) == 100
+
+
+def _poll(history, poll, crc):
+    counters = np.zeros((1, len(COUNTERS)), dtype=np.uint64)
+    counters[0, COLUMN['crc_errors']] = crc
+    rows = history.record('192.0.2.1', ['xe-0/0/0'], np.array([1e10]), counters, 1000.0 + 60 * poll)
+    return history.evaluate(rows)['new_spikes'][0, 0]
+
+
+def test_steady_error_rate_never_alerts():
+    history = CounterHistory(depth=4)
+    alerts = [_poll(history, poll, 100 * poll) for poll in range(8)]
+    assert not any(alerts)
+
+
+def test_spike_over_baseline_alerts_once():
+    history = CounterHistory(depth=4)
+    totals = [0, 1, 2, 3, 3 + 50 * MIN_SPIKE_ERRORS, 3 + 100 * MIN_SPIKE_ERRORS]
+    alerts = [_poll(history, poll, total) for poll, total in enumerate(totals)]
+    assert alerts == [False, False, False, False, True, False]
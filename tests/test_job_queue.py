@@ -0,0 +1,78 @@
+import time
+import pytest
+import job_queue
+from job_queue import JobQueue
+
+
+def _host(number):
+    return {'host_name': f"rtr-{number}", 'ip_address': f"192.0.2.{number}"}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+
+def test_claim_leases_jobs_in_order(queue):
+    queue.submit('b1', [('backup', _host(1), {}), ('backup', _host(2), {'fresh': True})])
+    first = queue.claim('w1')
+    second = queue.claim('w2')
+    assert (first['host_ip'], first['attempts']) == ('192.0.2.1', 1)
+    assert second['params'] == {'fresh': True}
+    assert queue.claim('w3') is None
+    assert queue.counts('b1') == {'leased': 2}
+
+
+def test_one_lease_per_device(queue):
+    queue.submit('b1', [('backup', _host(1), {}), ('baseline', _host(1), {}), ('backup', _host(2), {})])
+    assert queue.claim('w1')['action'] == 'backup'
+    assert queue.claim('w2')['host_ip'] == '192.0.2.2'  # The second job of device 1 waits
+    assert queue.claim('w3') is None
+
+
+def test_failed_job_is_requeued_after_a_delay_then_given_up(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, 'RETRY_DELAY', 0)
+    queue.submit('b1', [('backup', _host(1), {})], max_attempts=2)
+    job = queue.claim('w1')
+    assert queue.fail(job['id'], 'w1', 'timeout')
+    assert queue.counts('b1') == {'queued': 1}
+
+    job = queue.claim('w2')
+    assert job['attempts'] == 2
+    assert queue.fail(job['id'], 'w2', 'timeout again')
+    assert queue.counts('b1') == {'failed': 1}
+    assert queue.claim('w3') is None
+
+
+def test_failed_job_waits_before_the_next_claim(queue):
+    queue.submit('b1', [('backup', _host(1), {})])
+    job = queue.claim('w1')
+    queue.fail(job['id'], 'w1', 'timeout')
+    assert queue.claim('w2') is None  # RETRY_DELAY seconds away
+
+
+def test_expired_lease_is_claimed_by_another_worker(queue):
+    queue.submit('b1', [('backup', _host(1), {})])
+    job = queue.claim('w1', lease=-1)
+    reclaimed = queue.claim('w2')
+    assert (reclaimed['id'], reclaimed['attempts']) == (job['id'], 2)
+    assert queue.heartbeat('w1', {job['id']}) == {job['id']}  # w1 learns it lost the lease
+
+
+def test_complete_after_lost_lease_is_discarded(queue):
+    queue.submit('b1', [('backup', _host(1), {})])
+    job = queue.claim('w1', lease=-1)
+    queue.claim('w2')
+    assert not queue.complete(job['id'], 'w1', {'config': 'stale'})
+    assert not queue.fail(job['id'], 'w1', 'late error')
+    assert queue.complete(job['id'], 'w2', {'config': 'fresh'})
+    assert queue.counts('b1') == {'done': 1}
+
+
+def test_lease_lost_on_final_attempt_fails_the_job(queue):
+    queue.submit('b1', [('backup', _host(1), {})], max_attempts=1)
+    queue.claim('w1', lease=-1)
+    time.sleep(0.01)
+    assert queue.claim('w2') is None
+    assert queue.counts('b1') == {'failed': 1}
+    assert queue.unmerged('b1')[0]['error'] == 'lease expired on final attempt (worker lost)'
@@ -0,0 +1,91 @@
+import json
+from xml.etree import ElementTree
+import pytest
+import push_ledger
+from push_ledger import config_hash, config_version, forget, is_unchanged, record_push
+
+COMMIT_REPLY = """<commit-information>
+  <commit-history>
+    <sequence-number>0</sequence-number>
+    <user>{user}</user>
+    <client>cli</client>
+    <date-time seconds="{seconds}">2026-01-01 10:00:00 UTC</date-time>
+  </commit-history>
+  <commit-history>
+    <sequence-number>1</sequence-number>
+    <user>older</user>
+    <client>netconf</client>
+    <date-time seconds="1">2025-12-31 10:00:00 UTC</date-time>
+  </commit-history>
+</commit-information>"""
+
+
+class FakeRpc:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def get_commit_information(self):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return ElementTree.fromstring(self.reply)
+
+
+class FakeDevice:
+    hostname = '192.0.2.1'
+
+    def __init__(self, reply):
+        self.rpc = FakeRpc(reply)
+
+
+def _device(user='netops', seconds=1767261600):
+    return FakeDevice(COMMIT_REPLY.format(user=user, seconds=seconds))
+
+
+@pytest.fixture(autouse=True)
+def ledger_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'push_ledger.json')
+    monkeypatch.setattr(push_ledger, 'PUSH_LEDGER_FILE', path)
+    monkeypatch.setattr(push_ledger, '_ledger', None)
+    return path
+
+
+RENDERED = config_hash("set interfaces ge-0/0/0 description uplink\n")
+
+
+def test_same_hash_and_version_is_skipped():
+    record_push('192.0.2.1', 'interface_template.j2', RENDERED, config_version(_device()), 'CHG0000001')
+    assert is_unchanged('192.0.2.1', 'interface_template.j2', RENDERED, config_version(_device()))
+    # Whitespace-only differences render to the same hash
+    assert config_hash("  set interfaces ge-0/0/0 description uplink\n\n") == RENDERED
+
+
+def test_new_commit_on_the_device_is_pushed_again():
+    record_push('192.0.2.1', 'interface_template.j2', RENDERED, config_version(_device()))
+    changed = config_version(_device(seconds=1767265200))
+    assert not is_unchanged('192.0.2.1', 'interface_template.j2', RENDERED, changed)
+    assert not is_unchanged('192.0.2.1', 'interface_template.j2', RENDERED, config_version(_device(user='other')))
+
+
+def test_changed_render_is_pushed_again():
+    version = config_version(_device())
+    record_push('192.0.2.1', 'interface_template.j2', RENDERED, version)
+    assert not is_unchanged('192.0.2.1', 'interface_template.j2', config_hash("set system host-name r1"), version)
+
+
+def test_unknown_version_is_pushed():
+    record_push('192.0.2.1', 'interface_template.j2', RENDERED, None)
+    assert config_version(FakeDevice(RuntimeError('rpc timeout'))) is None
+    assert config_version(FakeDevice('<commit-information/>')) is None
+    assert not is_unchanged('192.0.2.1', 'interface_template.j2', RENDERED, None)
+
+
+def test_forget_clears_the_entry(ledger_file):
+    version = config_version(_device())
+    record_push('192.0.2.1', 'interface_template.j2', RENDERED, version)
+    record_push('192.0.2.2', 'interface_template.j2', RENDERED, version)
+    forget('192.0.2.1')
+    assert not is_unchanged('192.0.2.1', 'interface_template.j2', RENDERED, version)
+    assert is_unchanged('192.0.2.2', 'interface_template.j2', RENDERED, version)
+    forget()
+    with open(ledger_file) as f:
+        assert json.load(f) == {}
@@ -0,0 +1,54 @@
+import os
+import pytest
+from render_check import SCRIPT_DIR, lint_set_commands, render_host, template_names
+
+
+@pytest.mark.parametrize('config, errors, warnings', [
+    ("set system host-name r1\ndelete interfaces ge-0/0/1", [], []),
+    ("# comment\n\nset system host-name r1", [], []),
+    ("show interfaces terse", ["line 1: not a set/delete command: show interfaces terse"], []),
+    ('set interfaces ge-0/0/0 description "uplink', ['line 1: unbalanced quotes: set interfaces ge-0/0/0 description "uplink'], []),
+    ("set interfaces ge-0/0/0 description None",
+     ["line 1: empty or None value (missing variable?): set interfaces ge-0/0/0 description None"], []),
+    ('set interfaces ge-0/0/0 description ""',
+     ['line 1: empty or None value (missing variable?): set interfaces ge-0/0/0 description ""'], []),
+    ("set interfaces  unit 0 family inet",
+     ["line 1: empty or None value (missing variable?): set interfaces  unit 0 family inet"], []),
+    ("set system host-name r1\nset system host-name r1", [], ["line 2: duplicate of line 1: set system host-name r1"]),
+    ("set system host-name r1\nset system host-name r2",
+     ["line 2: conflicts with line 1: system host-name is 'r1' and 'r2'"], []),
+    ("set protocols ospf area 0 interface ge-0/0/0 metric 10\nset protocols ospf area 0 interface ge-0/0/1 metric 20",
+     [], []),
+    ("set protocols ldp interface ge-0/0/0\ndelete protocols ldp",
+     ["line 2: deletes what line 1 sets: delete protocols ldp"], []),
+    ("delete protocols ldp\nset protocols ldp interface ge-0/0/0", [], []),  # Replace idiom
+])
+def test_lint_rules(config, errors, warnings):
+    assert lint_set_commands(config) == (errors, warnings)
+
+
+def test_templates_apply_only_to_hosts_defining_their_variables():
+    pytest.importorskip('jinja2')
+    host = {'host_name': 'r1', 'ip_address': '192.0.2.1',
+            'ospf': {'area': '0.0.0.0', 'interfaces': [{'name': 'ge-0/0/0', 'metric': 10}]}}
+    rendered = render_host((host, template_names(), None))['results']
+    assert [result['template'] for result in rendered] == ['ospf_template.j2']
+    assert (rendered[0]['errors'], rendered[0]['lines']) == ([], 2)
+
+    incomplete = dict(host, ospf={'interfaces': []})
+    rendered = render_host((incomplete, template_names(), None))['results']
+    assert rendered[0]['errors'] == ["undefined variable: 'dict object' has no attribute 'area'"]
+
+    bare = {'host_name': 'r2', 'ip_address': '192.0.2.2'}
+    assert render_host((bare, template_names(), None))['results'] == []
+
+
+def test_repo_inventory_renders_cleanly():
+    pytest.importorskip('jinja2')
+    from utils import merge_host_data
+    merged = merge_host_data(os.path.join(SCRIPT_DIR, '../data/inventory.yml'),
+                             os.path.join(SCRIPT_DIR, '../data/hosts_data.yml'))
+    results = [render_host((host, template_names(), None)) for host in merged['hosts']]
+    configs = [result for host in results for result in host['results']]
+    assert len(configs) == 9
+    assert [result for result in configs if result['errors']] == []
@@ -0,0 +1,108 @@
+import os
+import json
+import threading
+import multiprocessing
+import pytest
+import resilience
+from concurrency import AdaptiveLimiter
+from resilience import CircuitBreakers, CircuitOpenError, guarded_poll, retry
+
+
+class Timeout(Exception):
+    pass
+
+
+def test_backoff_sleep_gives_the_slot_to_another_device():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+    other_ran = threading.Event()
+
+    def other():
+        with limiter.slot('192.0.2.2'):
+            other_ran.set()
+
+    def sleep(seconds):
+        threading.Thread(target=other).start()
+        limiter.pause(0.2)
+        assert other_ran.is_set(), 'the waiting device never got the slot'
+
+    attempts = []
+
+    def operation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Timeout()
+        return 'ok'
+
+    with limiter.slot('192.0.2.1'):
+        assert retry(operation, base_delay=0, sleep=sleep) == 'ok'
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_retry_raises_non_transient_errors_at_once():
+    calls = []
+
+    def operation():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        retry(operation, sleep=lambda seconds: None)
+    assert len(calls) == 1
+
+
+class FakeDevice:
+    def __init__(self):
+        self._hostname = '192.0.2.1'
+        self.connected = True
+        self.opens = 0
+
+    def open(self):
+        self.opens += 1
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+
+def test_open_circuit_skips_polls_until_the_probe_reconnects(tmp_path, monkeypatch):
+    breakers = CircuitBreakers(str(tmp_path / 'breakers.json'), failure_threshold=2, open_seconds=60)
+    monkeypatch.setattr(resilience, 'breakers', breakers)
+    dev = FakeDevice()
+
+    def timing_out(dev):
+        raise Timeout()
+
+    for _ in range(2):
+        with pytest.raises(Timeout):
+            guarded_poll(dev, timing_out)
+    with pytest.raises(CircuitOpenError):
+        guarded_poll(dev, lambda dev: 'polled')
+
+    breakers._state[dev._hostname]['retry_at'] = 0  # Probe due
+    assert guarded_poll(dev, lambda dev: 'polled') == 'polled'
+    assert dev.opens == 1
+    assert breakers.open_devices() == {}
+
+
+def test_dead_session_is_reopened_before_the_poll(tmp_path, monkeypatch):
+    monkeypatch.setattr(resilience, 'breakers', CircuitBreakers(str(tmp_path / 'breakers.json')))
+    dev = FakeDevice()
+    dev.connected = False
+    assert guarded_poll(dev, lambda dev: dev.connected) is True
+    assert dev.opens == 1
+
+
+def _record_failures(path, device, count):
+    breakers = CircuitBreakers(path, failure_threshold=10 ** 9)
+    for _ in range(count):
+        breakers.record_failure(device, Timeout())
+
+
+def test_breaker_updates_from_many_processes_are_all_kept(tmp_path):
+    path = str(tmp_path / 'breakers.json')
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        pool.starmap(_record_failures, [(path, f"192.0.2.{i}", 100) for i in range(4)])
+    with open(path) as f:
+        state = json.load(f)
+    assert {device: entry['failures'] for device, entry in state.items()} == {f"192.0.2.{i}": 100 for i in range(4)}
+    assert sorted(os.listdir(tmp_path)) == ['breakers.json', 'breakers.json.lock']  # No temp files left behind
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import numpy as np
+from route_analytics import HALF_LIFE, PENALTY_PER_FLAP, FlapAnalyzer
+from route_table import ROUTE_DTYPE, RouteTable
+
+START = datetime(2026, 1, 1, 12, 0)
+EMPTY = RouteTable()
+
+
+def _table(*prefixes):
+    return RouteTable.from_entries([(prefix, 'BGP', '192.0.2.1') for prefix in prefixes])
+
+
+def _alerts(records, kind):
+    return [record['destination'] for record in records if record.get('type') == kind]
+
+
+def _flap(analyzer, table, minutes, device='rtr-1'):
+    """Withdraw and re-learn table once per entry in minutes; return every record."""
+    records = []
+    for minute in minutes:
+        records += analyzer.process(device, 'inet.0', START + timedelta(minutes=minute), EMPTY, table)
+        records += analyzer.process(device, 'inet.0', START + timedelta(minutes=minute, seconds=30), table, EMPTY)
+    return records
+
+
+def test_flapping_prefix_is_suppressed_then_reused(tmp_path):
+    analyzer = FlapAnalyzer(log_file=str(tmp_path / 'route_changes.log'))
+    records = _flap(analyzer, _table('10.1.0.0/16'), [0, 1])
+    assert _alerts(records, 'dampening_suppress') == ['10.1.0.0/16']
+
+    records = analyzer.process('rtr-1', 'inet.0', START + timedelta(hours=1), EMPTY, EMPTY)
+    assert _alerts(records, 'dampening_reuse') == ['10.1.0.0/16']
+
+
+def test_flap_alert_once_per_threshold_within_the_window(tmp_path):
+    analyzer = FlapAnalyzer(flap_threshold=4, log_file=str(tmp_path / 'route_changes.log'))
+    records = _flap(analyzer, _table('10.1.0.0/16', '2001:db8::/32'), [0, 1, 2, 3])
+    assert sorted(_alerts(records, 'flap')) == ['10.1.0.0/16', '10.1.0.0/16', '2001:db8::/32', '2001:db8::/32']
+
+    analyzer = FlapAnalyzer(flap_threshold=4, window=60, log_file=str(tmp_path / 'route_changes.log'))
+    assert _alerts(_flap(analyzer, _table('10.1.0.0/16'), [0, 10, 20, 30]), 'flap') == []
+
+
+def test_devices_and_tables_keep_separate_penalties(tmp_path):
+    analyzer = FlapAnalyzer(log_file=str(tmp_path / 'route_changes.log'))
+    table = _table('10.1.0.0/16')
+    analyzer.process('rtr-1', 'inet.0', START, table, EMPTY)
+    analyzer.process('rtr-1', 'inet.0', START + timedelta(seconds=HALF_LIFE), table, EMPTY)
+    analyzer.process('rtr-2', 'inet.0', START, table, EMPTY)
+    key = table._row_keys(prefix_only=True)[0].tobytes()
+    now = (START + timedelta(seconds=HALF_LIFE)).timestamp()
+    assert analyzer.decayed_penalty('rtr-1', 'inet.0', key, now) == PENALTY_PER_FLAP * 1.5
+    assert analyzer.decayed_penalty('rtr-2', 'inet.0', key, now) == PENALTY_PER_FLAP / 2
+    assert analyzer.decayed_penalty('rtr-1', 'inet6.0', key, now) == 0.0
+
+
+def test_full_table_withdrawal_keeps_the_newest_prefixes(tmp_path):
+    routes = np.zeros(50000, dtype=ROUTE_DTYPE)
+    routes['family'], routes['plen'] = 2, 24
+    routes['hi'] = np.arange(len(routes), dtype=np.uint64) << np.uint64(40)
+    analyzer = FlapAnalyzer(churn_threshold=1000, max_prefixes=20000, log_file=str(tmp_path / 'route_changes.log'))
+    first = RouteTable(routes[:30000])
+    second = RouteTable(routes[30000:])
+
+    records = analyzer.process('rtr-1', 'inet.0', START, EMPTY, first)
+    assert [record.get('type') for record in records] == [None, 'churn']
+    analyzer.process('rtr-1', 'inet.0', START + timedelta(minutes=1), second, EMPTY)
+    assert len(analyzer._keys) == 20000
+    now = (START + timedelta(minutes=1)).timestamp()
+    keys = second._row_keys(prefix_only=True)
+    assert analyzer.decayed_penalty('rtr-1', 'inet.0', keys[-1].tobytes(), now) == PENALTY_PER_FLAP
+    assert analyzer.decayed_penalty('rtr-1', 'inet.0', first._row_keys(prefix_only=True)[0].tobytes(), now) == 0.0
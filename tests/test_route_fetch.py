@@ -0,0 +1,11 @@
+from route_fetch import plan_chunks
+
+
+def test_exact_lookups_only_cover_prefixes_shorter_than_the_ranges():
+    chunks = plan_chunks('inet.0', bits=3)
+    ranges = [chunk['destination'] for chunk in chunks if 'destination' in chunk]
+    exact = chunks[-1]['exact_destinations']
+    assert len(ranges) == 8 and all(prefix.endswith('/3') for prefix in ranges)
+    assert len(exact) == 1 + 2 + 4
+    assert not set(exact) & set(ranges)
+    assert '0.0.0.0/0' in exact
@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip('jnpr.junos')
+from route_monitor import PollScheduler
+
+
+def test_trigger_during_capture_keeps_its_reason_for_the_next_capture():
+    scheduler = PollScheduler(['192.0.2.1'], interval=60)
+    assert scheduler.wait_due() == {'192.0.2.1': None}
+
+    assert scheduler.trigger('192.0.2.1', 'BGP_NEIGHBOR_STATE_CHANGED', delay=0)
+    scheduler.done('192.0.2.1', changes=False)
+    assert scheduler.wait_due() == {'192.0.2.1': 'BGP_NEIGHBOR_STATE_CHANGED'}
+
+
+def test_running_device_is_not_handed_out_twice():
+    scheduler = PollScheduler(['192.0.2.1', '192.0.2.2'], interval=60)
+    assert set(scheduler.wait_due()) == {'192.0.2.1', '192.0.2.2'}
+    scheduler.trigger('192.0.2.1', 'UI_COMMIT', delay=0)
+    scheduler.trigger('192.0.2.2', 'UI_COMMIT', delay=0)
+    scheduler.done('192.0.2.2', changes=None)
+    assert scheduler.wait_due() == {'192.0.2.2': 'UI_COMMIT'}
+
+
+def test_failed_device_waits_for_its_circuit():
+    scheduler = PollScheduler(['192.0.2.1'], interval=60)
+    scheduler.wait_due()
+    assert scheduler.done('192.0.2.1', changes=None, not_before=600) == 600
@@ -0,0 +1,25 @@
+from route_table import ROUTE_DTYPE, RouteTable
+
+ENTRIES = [('10.0.0.0/8', 'BGP', '192.0.2.1'), ('10.1.0.0/16', 'OSPF', '192.0.2.2'), ('2001:db8::/32', 'Static', 'fe80::1')]
+
+
+def test_merge_keeps_route_dtype():
+    table = RouteTable.from_entries(ENTRIES)
+    assert RouteTable.merge([table]).routes.dtype == ROUTE_DTYPE
+
+
+def test_merged_table_diffs_clean_against_single_table():
+    table = RouteTable.from_entries(ENTRIES)
+    chunks = [RouteTable.from_entries(ENTRIES[:1]), RouteTable.from_entries(ENTRIES[1:])]
+    added, removed = table.diff(RouteTable.merge(chunks))
+    assert len(added) == 0 and len(removed) == 0
+    added, removed = RouteTable.merge(chunks).diff(table)
+    assert len(added) == 0 and len(removed) == 0
+
+
+def test_native_byte_order_rows_are_normalized():
+    table = RouteTable.from_entries(ENTRIES)
+    native = RouteTable(table.routes.astype(table.routes.dtype.newbyteorder('=')))
+    assert native.routes.dtype == ROUTE_DTYPE
+    added, removed = table.diff(native)
+    assert len(added) == 0 and len(removed) == 0